@@ -0,0 +1,56 @@
+"""
+Compare two benchmark result files scenario by scenario.
+
+Usage (from the repository root):
+    python -m benchmarks.compare benchmarks/results/before.json benchmarks/results/after.json
+"""
+import argparse
+import json
+
+
+def load(path):
+    with open(path) as f:
+        return {result['scenario']: result for result in json.load(f)['results']}
+
+
+def change(before, after):
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(before, after):
+    rows = []
+    for scenario in before:
+        if scenario not in after:
+            continue
+        old, new = before[scenario], after[scenario]
+        # Pipeline runs report frame rates, WebSocket load runs message rates
+        for group in ('fps', 'rates'):
+            for name, value in old.get(group, {}).items():
+                if name in new.get(group, {}):
+                    rows.append((scenario, f"{group}.{name}", value, new[group][name]))
+        for stage, stats in old['stages'].items():
+            if stage in new['stages']:
+                for key in ('p50_ms', 'p99_ms'):
+                    if key in stats and key in new['stages'][stage]:
+                        rows.append((scenario, f"{stage}.{key}", stats[key], new['stages'][stage][key]))
+        for key, value in old.get('resources', {}).items():
+            if key in new.get('resources', {}):
+                rows.append((scenario, key, value, new['resources'][key]))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('before', help='Baseline results JSON')
+    parser.add_argument('after', help='Results JSON to compare against the baseline')
+    args = parser.parse_args()
+
+    print(f"{'scenario':<16} {'metric':<24} {'before':>10} {'after':>10} {'change':>9}")
+    for scenario, metric, old, new in compare(load(args.before), load(args.after)):
+        print(f"{scenario:<16} {metric:<24} {old:>10.2f} {new:>10.2f} {change(old, new):>9}")
+
+
+if __name__ == "__main__":
+    main()
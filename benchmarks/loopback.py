@@ -0,0 +1,125 @@
+"""
+Local RTSP stand-ins for MediaMTX on the Pi.
+
+RtspSink accepts one publisher push with ffmpeg in listen mode, decodes and
+discards the stream, and counts frames from ffmpeg's progress output. MediaMtxServer runs
+a local MediaMTX so a receiver can pull what a test source publishes.
+"""
+import os
+import socket
+import subprocess
+import threading
+import time
+
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def wait_for_port(host, port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.settimeout(0.5)
+            if sock.connect_ex((host, port)) == 0:
+                return True
+        time.sleep(0.2)
+    return False
+
+
+class RtspSink:
+    """ffmpeg listening on an RTSP URL, counting the frames it receives"""
+    def __init__(self, ffmpeg_path, port=8560, path='bench'):
+        self.ffmpeg_path = ffmpeg_path
+        self.url = f"rtsp://127.0.0.1:{port}/{path}"
+        self.process = None
+        self.frames = 0
+        self.thread = None
+
+    def start(self):
+        # Decode to the null muxer so progress reports a frame count; the sink's own
+        # CPU is excluded from the measurements
+        cmd = [
+            self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-nostats', '-progress', 'pipe:1',
+            '-rtsp_flags', 'listen', '-rtsp_transport', 'tcp', '-i', self.url,
+            '-fps_mode', 'passthrough', '-f', 'null', '-',
+        ]
+        self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+        self.thread = threading.Thread(target=self.read_progress, name="rtsp-sink", daemon=True)
+        self.thread.start()
+        # The listener cannot be probed without consuming its single connection
+        time.sleep(1.0)
+        log.info(f"RTSP sink listening at {self.url}")
+
+    def read_progress(self):
+        for line in self.process.stdout:
+            if line.startswith('frame='):
+                self.frames = int(line.split('=', 1)[1])
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+
+class MediaMtxServer:
+    """A local MediaMTX instance, started only if nothing is listening already"""
+    def __init__(self, mediamtx_path, port=8554):
+        self.mediamtx_path = mediamtx_path
+        self.port = port
+        self.process = None
+
+    def start(self):
+        if wait_for_port('127.0.0.1', self.port, timeout=0.5):
+            log.info(f"Using MediaMTX already listening on port {self.port}")
+            return True
+        if not os.path.exists(self.mediamtx_path):
+            log.error(f"MediaMTX executable not found at {self.mediamtx_path}")
+            return False
+
+        self.process = subprocess.Popen(
+            [self.mediamtx_path],
+            cwd=os.path.dirname(self.mediamtx_path) or None,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        return wait_for_port('127.0.0.1', self.port)
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+
+class TestPatternPublisher:
+    """ffmpeg publishing a lavfi test pattern, as a stand-in for a Pi publisher"""
+    def __init__(self, ffmpeg_path, url, width, height, fps, bitrate='800k'):
+        self.cmd = [
+            ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-re',
+            '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate={fps}',
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency',
+            '-g', '10', '-b:v', bitrate, '-f', 'rtsp', '-rtsp_transport', 'tcp', url,
+        ]
+        self.process = None
+
+    def start(self):
+        self.process = subprocess.Popen(self.cmd)
+        # Give MediaMTX a moment to register the path before readers connect
+        time.sleep(1.0)
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
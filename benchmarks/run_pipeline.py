@@ -0,0 +1,347 @@
+"""
+Throughput and latency benchmarks for the capture -> overlay -> encode -> publish
+pipeline, runnable without a camera or a Pi.
+
+The publisher scenarios drive the real ZeroLatencyPublisher loop with a
+SyntheticCapture and push to a local RTSP sink. The receiver scenarios drive
+ZeroLatencyReceiver from a SyntheticCapture, or, with --mediamtx-path, from a
+local MediaMTX fed by an ffmpeg test pattern. Results are written as JSON so
+runs before and after a change can be compared with benchmarks.compare.
+
+Usage (from the repository root):
+    python -m benchmarks.run_pipeline publisher-720p --duration 20
+    python -m benchmarks.run_pipeline all --output benchmarks/results/before.json
+"""
+import argparse
+import json
+import os
+import platform
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import logging
+
+import zero_latency_publisher
+from live_feed.app.config import SceneConfig
+from zero_latency_publisher import ZeroLatencyPublisher
+from zero_latency_receiver import ZeroLatencyReceiver
+
+from benchmarks.loopback import MediaMtxServer, RtspSink, TestPatternPublisher
+from benchmarks.sampling import ResourceSampler, git_commit, percentile
+from benchmarks.synthetic_source import RESOLUTIONS, SyntheticCapture
+
+log = logging.getLogger(__name__)
+
+SCENARIOS = {}
+for _resolution in RESOLUTIONS:
+    SCENARIOS[f'publisher-{_resolution}'] = ('publisher', _resolution)
+    SCENARIOS[f'receiver-{_resolution}'] = ('receiver', _resolution)
+
+
+class StageTimer:
+    """Collects per-call durations for named pipeline stages"""
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.samples[stage].append(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.samples = defaultdict(list)
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def count(self, stage):
+        return len(self.samples.get(stage, ()))
+
+    def summary(self):
+        result = {}
+        for stage, values in self.samples.items():
+            ordered = sorted(values)
+            result[stage] = {
+                'count': len(ordered),
+                'mean_ms': sum(ordered) / len(ordered) * 1000,
+                'p50_ms': percentile(ordered, 0.50) * 1000,
+                'p99_ms': percentile(ordered, 0.99) * 1000,
+                'max_ms': ordered[-1] * 1000,
+            }
+        return result
+
+
+class TimedCapture:
+    """Wraps a capture object so every read() is recorded as the 'capture' stage"""
+    def __init__(self, cap, timer):
+        self.cap = cap
+        self.read = timer.wrap('capture', cap.read)
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+
+class BenchPublisher(ZeroLatencyPublisher):
+    """ZeroLatencyPublisher reading from a synthetic source and pushing to a local sink"""
+    def __init__(self, timer, source, sink_url, ffmpeg_path, fps, bitrate, pacing, encoder, idle_fps):
+        super().__init__('', ffmpeg_path, 0, source.width, source.height, fps, bitrate, sink_url, pacing=pacing,
+                         encoder=encoder, idle_fps=idle_fps)
+        self.timer = timer
+        self.source = source
+        self.rtsp_url = self.publish_url = sink_url
+        self.add_timestamp = timer.wrap('overlay', self.add_timestamp)
+
+    def start_mediamtx(self):
+        return True  # the RTSP sink stands in for MediaMTX
+
+    def setup_camera(self):
+        self.cap = TimedCapture(self.source, self.timer)
+        self.apply_camera_settings()
+
+    def setup_encoder(self):
+        super().setup_encoder()
+        self.encoder.write = self.timer.wrap('encode', self.encoder.write)
+
+
+class BenchReceiver(ZeroLatencyReceiver):
+    """ZeroLatencyReceiver with timed stages, reading from a synthetic source or RTSP"""
+    def __init__(self, timer, rtsp_url, source=None):
+        super().__init__(rtsp_url=rtsp_url, display_mode='headless')
+        self.timer = timer
+        self.source = source
+        self.extract_publisher_timestamp_simple = timer.wrap('latency_probe', self.extract_publisher_timestamp_simple)
+        self.add_receiver_overlay = timer.wrap('overlay', self.add_receiver_overlay)
+        self.process_frame = timer.wrap('process', self.process_frame)
+
+    def setup_rtsp_connection(self):
+        if self.source is None:
+            if not super().setup_rtsp_connection():
+                return False
+            self.cap = TimedCapture(self.cap, self.timer)
+        else:
+            self.cap = TimedCapture(self.source, self.timer)
+        return True
+
+
+def drain_status_queue(stop_event):
+    """Stand in for the WebSocket writer so per-frame status messages don't pile up"""
+    while not stop_event.is_set():
+        try:
+            zero_latency_publisher.to_async_queue.get(timeout=0.2)
+        except queue.Empty:
+            continue
+
+
+def measure(timer, warmup, duration, exclude_pids=(), on_start=None):
+    """Discard warm-up samples, then sample resources for the measured window"""
+    time.sleep(warmup)
+    timer.reset()
+    if on_start:
+        on_start()
+    sampler = ResourceSampler(exclude_pids)
+    sampler.start()
+    started = time.monotonic()
+    time.sleep(duration)
+    elapsed = time.monotonic() - started
+    return elapsed, sampler.stop()
+
+
+def run_publisher(args, resolution):
+    width, height = RESOLUTIONS[resolution]
+    timer = StageTimer()
+    sink = RtspSink(args.ffmpeg_path, port=args.sink_port)
+    sink.start()
+
+    # A one-frame cycle is a scene that never changes
+    source = SyntheticCapture(width, height, fps=args.source_fps, cycle=1 if args.scene == 'static' else 30)
+    publisher = BenchPublisher(timer, source, sink.url, args.ffmpeg_path, args.fps, args.bitrate, args.pacing, args.encoder,
+                               args.idle_fps)
+    stop_drain = threading.Event()
+    threading.Thread(target=drain_status_queue, args=(stop_drain,), daemon=True).start()
+    thread = threading.Thread(target=publisher.start, name="bench-publisher", daemon=True)
+    thread.start()
+
+    try:
+        window = {}
+        elapsed, resources = measure(timer, args.warmup, args.duration, exclude_pids=[sink.process.pid],
+                                     on_start=lambda: window.update(frames=sink.frames))
+        stages = timer.summary()
+        published = sink.frames - window['frames']
+    finally:
+        publisher.stop()
+        thread.join(timeout=10)
+        stop_drain.set()
+        sink.stop()
+
+    return {
+        'fps': {
+            'capture': timer.count('capture') / elapsed,
+            'encode': timer.count('encode') / elapsed,
+            'published': published / elapsed,
+        },
+        'stages': stages,
+        'resources': resources,
+        'pacing': {**publisher.pacer.stats(), 'skipped': publisher.scene.skipped},
+    }
+
+
+def run_receiver(args, resolution):
+    width, height = RESOLUTIONS[resolution]
+    timer = StageTimer()
+    server = test_source = None
+    exclude_pids = []
+
+    if args.mediamtx_path:
+        server = MediaMtxServer(args.mediamtx_path)
+        if not server.start():
+            raise RuntimeError("MediaMTX did not start")
+        url = f"rtsp://127.0.0.1:{server.port}/bench"
+        test_source = TestPatternPublisher(args.ffmpeg_path, url, width, height, args.fps, args.bitrate)
+        test_source.start()
+        exclude_pids.append(test_source.process.pid)
+        if server.process:
+            exclude_pids.append(server.process.pid)
+        receiver = BenchReceiver(timer, url)
+    else:
+        source = SyntheticCapture(width, height, fps=args.source_fps)
+        receiver = BenchReceiver(timer, 'rtsp://synthetic/bench', source=source)
+
+    thread = threading.Thread(target=receiver.start, name="bench-receiver", daemon=True)
+    thread.start()
+
+    try:
+        elapsed, resources = measure(timer, args.warmup, args.duration, exclude_pids)
+        stages = timer.summary()
+    finally:
+        # Clearing running lets the receive loop exit on its own before we release
+        receiver.running = False
+        thread.join(timeout=10)
+        if receiver.cap:
+            receiver.cap.release()
+        if test_source:
+            test_source.stop()
+        if server:
+            server.stop()
+
+    return {
+        'fps': {
+            'capture': timer.count('capture') / elapsed,
+            'processed': timer.count('process') / elapsed,
+        },
+        'stages': stages,
+        'pipeline': receiver.pipeline.stats(),
+        'resources': resources,
+        'source': 'rtsp' if args.mediamtx_path else 'synthetic',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Zero Latency pipeline benchmarks')
+    parser.add_argument('scenarios',
+                       nargs='*',
+                       default=['all'],
+                       help=f"Scenarios to run: all or any of {', '.join(SCENARIOS)}")
+    parser.add_argument('--ffmpeg-path', '-f',
+                       default='ffmpeg',
+                       help='Path to the ffmpeg executable (default: ffmpeg)')
+    parser.add_argument('--mediamtx-path', '-m',
+                       default=None,
+                       help='Run receiver scenarios over RTSP through a local MediaMTX')
+    parser.add_argument('--duration', '-d',
+                       type=float,
+                       default=15,
+                       help='Measured seconds per scenario (default: 15)')
+    parser.add_argument('--warmup',
+                       type=float,
+                       default=3,
+                       help='Seconds discarded before measuring (default: 3)')
+    parser.add_argument('--fps', '-fps',
+                       type=int,
+                       default=30,
+                       help='Target FPS (default: 30)')
+    parser.add_argument('--source-fps',
+                       type=int,
+                       default=30,
+                       help='Synthetic source rate, 0 for as fast as possible (default: 30)')
+    parser.add_argument('--bitrate', '-b',
+                       default='800k',
+                       help='Video bitrate (default: 800k)')
+    parser.add_argument('--pacing',
+                       choices=['drop', 'duplicate', 'off'],
+                       default='drop',
+                       help='Publisher frame pacing policy (default: drop)')
+    parser.add_argument('--encoder',
+                       choices=['auto', 'pyav', 'ffmpeg'],
+                       default='auto',
+                       help='Publisher encoder, as in zero_latency_publisher (default: auto)')
+    parser.add_argument('--scene',
+                       choices=['moving', 'static'],
+                       default='moving',
+                       help='Publisher source: a moving test pattern, or one that never changes (default: moving)')
+    parser.add_argument('--idle-fps',
+                       type=float,
+                       default=SceneConfig.IDLE_FPS,
+                       help=f'Publisher frame rate while the scene is static, 0 to encode every frame (default: {SceneConfig.IDLE_FPS:g})')
+    parser.add_argument('--sink-port',
+                       type=int,
+                       default=8560,
+                       help='Port for the local RTSP sink (default: 8560)')
+    parser.add_argument('--output', '-o',
+                       default=None,
+                       help='JSON results file (default: benchmarks/results/<timestamp>.json)')
+    args = parser.parse_args()
+
+    names = list(SCENARIOS) if 'all' in args.scenarios else args.scenarios
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    results = []
+    for name in names:
+        component, resolution = SCENARIOS[name]
+        log.info(f"Running {name} for {args.duration:.0f}s...")
+        runner = run_publisher if component == 'publisher' else run_receiver
+        result = runner(args, resolution)
+        result.update({'scenario': name, 'component': component, 'resolution': resolution})
+        results.append(result)
+        log.info(f"{name}: " + ", ".join(f"{k} {v:.1f} fps" for k, v in result['fps'].items()))
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'commit': git_commit(),
+        'settings': {
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'fps': args.fps,
+            'source_fps': args.source_fps,
+            'bitrate': args.bitrate,
+            'pacing': args.pacing,
+            'encoder': args.encoder,
+            'scene': args.scene,
+            'idle_fps': args.idle_fps,
+        },
+        'results': results,
+    }
+
+    output = args.output or os.path.join('benchmarks', 'results', datetime.now().strftime('%Y%m%d_%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    log.info(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measurement helpers shared by the benchmark runners.
+"""
+import subprocess
+import threading
+import time
+
+import logging
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+log = logging.getLogger(__name__)
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class ResourceSampler:
+    """Samples CPU time and RSS of a process (default: this one) and its children (minus excluded pids)"""
+    def __init__(self, exclude_pids=(), interval=0.5, pid=None):
+        self.exclude_pids = set(exclude_pids)
+        self.pid = pid
+        self.interval = interval
+        self.first_cpu = {}
+        self.last_cpu = {}
+        self.rss_samples = []
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.started = None
+
+    def processes(self):
+        root = psutil.Process(self.pid)
+        return [root] + [p for p in root.children(recursive=True) if p.pid not in self.exclude_pids]
+
+    def sample(self):
+        rss = 0
+        for proc in self.processes():
+            try:
+                times = proc.cpu_times()
+                rss += proc.memory_info().rss
+            except psutil.Error:
+                continue
+            cpu = times.user + times.system
+            self.first_cpu.setdefault(proc.pid, cpu)
+            self.last_cpu[proc.pid] = cpu
+        self.rss_samples.append(rss)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        if psutil is None:
+            log.warning("psutil not installed, CPU and RSS will not be reported")
+            return
+        self.started = time.monotonic()
+        self.sample()
+        self.thread = threading.Thread(target=self.run, name="resource-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return {}
+        self.stop_event.set()
+        self.thread.join()
+        self.sample()
+        elapsed = time.monotonic() - self.started
+        cpu_seconds = sum(self.last_cpu[pid] - self.first_cpu[pid] for pid in self.last_cpu)
+        return {
+            'cpu_percent': cpu_seconds / elapsed * 100,
+            'rss_mb_mean': sum(self.rss_samples) / len(self.rss_samples) / 2**20,
+            'rss_mb_peak': max(self.rss_samples) / 2**20,
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
@@ -0,0 +1,93 @@
+"""
+Synthetic frame source standing in for cv2.VideoCapture.
+
+Generates a moving test pattern (colour bars, a sweeping bar and a frame
+counter) so the publisher and receiver pipelines can be measured without a
+physical camera.
+"""
+import time
+
+import cv2
+import numpy as np
+
+RESOLUTIONS = {
+    '480p': (640, 480),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+}
+
+BAR_COLOURS = [
+    (255, 255, 255), (0, 255, 255), (255, 255, 0), (0, 255, 0),
+    (255, 0, 255), (0, 0, 255), (255, 0, 0), (0, 0, 0),
+]
+
+
+class SyntheticCapture:
+    """
+    Minimal cv2.VideoCapture look-alike producing test patterns.
+
+    A short cycle of frames is rendered up front so pattern generation does not
+    show up in the measurements; read() hands out a fresh copy each time, like a
+    real capture. With fps > 0 reads are paced to that rate on the monotonic
+    clock, otherwise frames are produced as fast as they are read.
+    """
+    def __init__(self, width=640, height=480, fps=30, cycle=30):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.opened = True
+        self.frame_count = 0
+        self.next_frame_time = None
+        self.properties = {
+            cv2.CAP_PROP_FRAME_WIDTH: width,
+            cv2.CAP_PROP_FRAME_HEIGHT: height,
+            cv2.CAP_PROP_FPS: fps,
+            cv2.CAP_PROP_BRIGHTNESS: 0.5,
+        }
+        self.frames = [self.render(i, cycle) for i in range(cycle)]
+
+    def render(self, index, cycle):
+        frame = np.zeros((self.height, self.width, 3), np.uint8)
+        bar_width = self.width // len(BAR_COLOURS)
+        for i, colour in enumerate(BAR_COLOURS):
+            frame[:, i * bar_width:(i + 1) * bar_width] = colour
+
+        # A sweeping bar so consecutive frames differ
+        x = index * self.width // cycle
+        frame[:, x:x + bar_width // 2] = (128, 128, 128)
+        cv2.putText(frame, f"SYNTH {index:03d}", (10, self.height - 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2)
+        return frame
+
+    def read(self):
+        if not self.opened:
+            return False, None
+
+        if self.fps > 0:
+            now = time.monotonic()
+            if self.next_frame_time is None:
+                self.next_frame_time = now
+            delay = self.next_frame_time - now
+            if delay > 0:
+                time.sleep(delay)
+            self.next_frame_time += 1.0 / self.fps
+
+        frame = self.frames[self.frame_count % len(self.frames)].copy()
+        self.frame_count += 1
+        return True, frame
+
+    def isOpened(self):
+        return self.opened
+
+    def set(self, prop, value):
+        self.properties[prop] = value
+        return True
+
+    def get(self, prop):
+        return self.properties.get(prop, 0.0)
+
+    def getBackendName(self):
+        return "SYNTHETIC"
+
+    def release(self):
+        self.opened = False
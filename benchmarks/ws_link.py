@@ -0,0 +1,379 @@
+"""
+Control-plane recovery of the publisher's WebSocket link across link blips.
+
+Runs the real zero_latency_publisher.WebSocketHandler against a stand-in for
+Django's /ws/camera/ endpoint, through a local TCP proxy that breaks the link
+on a schedule:
+
+- stall: the proxy stops forwarding in both directions for --blip seconds,
+  like a VPN path that silently drops packets; bytes are held, not lost, as
+  TCP would retransmit them. Short stalls should be ridden out, long ones
+  detected by the heartbeat and reconnected;
+- reset: every proxied connection is aborted and new ones are refused for
+  --blip seconds, like a server restart or a NAT/VPN reconnect.
+
+The stand-in sends a CameraSettingsCommand every --command-interval to the
+current connection and the publisher side acks it through send_acks, as the
+capture thread would. Per blip it reports when the publisher noticed the
+link was down (detected), when it was connected again (reconnected), and
+when the first command sent after the blip came back acked (recovery), all
+relative to the end of the blip for the last two.
+
+Usage (from the repository root):
+    python -m benchmarks.ws_link
+    python -m benchmarks.ws_link --mode reset --blip 2 --blips 10
+    python -m benchmarks.ws_link --mode stall --blip 0.3 0.8 3 -o benchmarks/results/link.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import threading
+import time
+from datetime import datetime
+import logging
+
+import websockets
+
+from benchmarks.sampling import git_commit, percentile
+from live_feed.messages import envelope, messages_pb2
+import zero_latency_publisher
+from zero_latency_publisher import ZeroLatencyPublisher
+
+log = logging.getLogger(__name__)
+
+CAMERA_ID = 'link-cam'
+
+
+class StandInPublisher:
+    """The WebSocket-facing side of ZeroLatencyPublisher: a status snapshot, and immediate acks"""
+    def __init__(self, camera_id):
+        self.camera_id = camera_id
+        self.status_snapshot = messages_pb2.CameraStatus(camera_id=camera_id, isConnected=True, fps=30.0).SerializeToString()
+
+    def update_camera_setting(self, setting, value, request_id=0):
+        ZeroLatencyPublisher.send_acks(self, [ZeroLatencyPublisher.settings_ack(request_id, setting, value, value, True)])
+
+
+class LinkEvents:
+    """Stands in for store_forward to timestamp the publisher's own view of the link"""
+    def __init__(self):
+        self.changes = []  # (perf_counter, up)
+
+    def set_upstream(self, up):
+        self.changes.append((time.perf_counter(), up))
+
+    def first(self, up, after):
+        return next((t for t, state in self.changes if state == up and t >= after), None)
+
+
+class LinkProxy:
+    """TCP proxy between the publisher and the stand-in server that can stall or reset the link"""
+    def __init__(self, port, target_port):
+        self.port = port
+        self.target_port = target_port
+        self.flowing = asyncio.Event()
+        self.flowing.set()
+        self.refusing = False
+        self.connections = set()
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', self.port)
+
+    async def stop(self):
+        self.server.close()
+        for writers in list(self.connections):
+            for writer in writers:
+                writer.transport.abort()
+
+    async def handle(self, client_reader, client_writer):
+        if self.refusing:
+            client_writer.transport.abort()
+            return
+        try:
+            server_reader, server_writer = await asyncio.open_connection('127.0.0.1', self.target_port)
+        except OSError:
+            client_writer.transport.abort()
+            return
+        writers = (client_writer, server_writer)
+        self.connections.add(writers)
+        pipes = [asyncio.create_task(self.pipe(client_reader, server_writer)),
+                 asyncio.create_task(self.pipe(server_reader, client_writer))]
+        try:
+            await asyncio.wait(pipes, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pipes:
+                task.cancel()
+            for writer in writers:
+                writer.transport.abort()
+            self.connections.discard(writers)
+
+    async def pipe(self, reader, writer):
+        # Reading continues while stalled, so the sender sees no backpressure, only silence
+        held = asyncio.Queue()
+        async def forward():
+            while True:
+                data = await held.get()
+                await self.flowing.wait()
+                writer.write(data)
+                await writer.drain()
+        forwarder = asyncio.create_task(forward())
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                held.put_nowait(data)
+            # Deliver what was held before passing the close on
+            while not held.empty() and not forwarder.done():
+                await asyncio.sleep(0.01)
+        except ConnectionError:
+            pass
+        finally:
+            forwarder.cancel()
+
+    async def blip(self, mode, seconds):
+        if mode == 'stall':
+            self.flowing.clear()
+            await asyncio.sleep(seconds)
+            self.flowing.set()
+        else:
+            self.refusing = True
+            for writers in list(self.connections):
+                for writer in writers:
+                    writer.transport.abort()
+            await asyncio.sleep(seconds)
+            self.refusing = False
+
+
+class StandInServer:
+    """Plays Django's side of /ws/camera/: sends commands to the newest connection and times the acks"""
+    def __init__(self, port, interval):
+        self.port = port
+        self.interval = interval
+        self.request_ids = itertools.count(1)
+        self.sent = {}       # request_id -> perf_counter at send
+        self.acked = {}      # request_id -> perf_counter at ack
+        self.connected = []  # (perf_counter, first message was a status snapshot)
+        self.current = None
+        self.sequence = None  # envelopes sent on the current connection
+        self.server = None
+        self.sender = None
+
+    async def start(self):
+        self.server = await websockets.serve(self.handle, '127.0.0.1', self.port, ping_interval=None)
+        self.sender = asyncio.create_task(self.send_commands())
+
+    async def stop(self):
+        self.sender.cancel()
+        self.server.close()
+
+    async def handle(self, ws):
+        self.current = ws
+        self.sequence = itertools.count(1)
+        first = True
+        try:
+            async for message in ws:
+                now = time.perf_counter()
+                frame = envelope.unpack(message)
+                if first:
+                    self.connected.append((now, frame.messages[0].HasField('status')))
+                    first = False
+                for control in frame.messages:
+                    if control.HasField('ack'):
+                        self.acked.setdefault(control.ack.request_id, now)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            if self.current is ws:
+                self.current = None
+
+    async def send_commands(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            ws = self.current
+            if ws is None:
+                continue
+            request_id = next(self.request_ids)
+            command = messages_pb2.CameraSettingsCommand(camera_id=CAMERA_ID, setting='brightness',
+                                                         value=request_id % 100, request_id=request_id)
+            frame = envelope.pack(CAMERA_ID, next(self.sequence), [messages_pb2.ControlMessage(command=command)])
+            self.sent[request_id] = time.perf_counter()
+            try:
+                # Never let a stalled link hold up the schedule
+                await asyncio.wait_for(ws.send(frame), self.interval)
+            except (asyncio.TimeoutError, websockets.ConnectionClosed):
+                pass
+
+
+def run_publisher_link(uri):
+    """Run the publisher's WebSocketHandler on its own thread and event loop, as the publisher does"""
+    loop = asyncio.new_event_loop()
+    stop_event = asyncio.Event()
+    thread = threading.Thread(target=loop.run_until_complete,
+                              args=(zero_latency_publisher.WebSocketHandler(stop_event, uri),),
+                              name="publisher-link", daemon=True)
+    thread.start()
+
+    def stop():
+        loop.call_soon_threadsafe(stop_event.set)
+        thread.join(timeout=5)
+    return stop
+
+
+def summary(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {'count': 0}
+    return {
+        'count': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p50_ms': percentile(ordered, 0.50) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+async def run_blips(args, blip_seconds, events, proxy, server):
+    """Blip the link args.blips times, letting it settle in between"""
+    blips = []
+    for _ in range(args.blips):
+        await asyncio.sleep(args.settle)
+        started = time.perf_counter()
+        await proxy.blip(args.mode, blip_seconds)
+        ended = time.perf_counter()
+
+        # Wait for the first command sent after the blip to be acked
+        deadline = ended + args.settle
+        recovered = None
+        while recovered is None and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+            after = [request_id for request_id, sent in server.sent.items() if sent >= ended]
+            recovered = next((server.acked[request_id] for request_id in after if request_id in server.acked), None)
+
+        detected = events.first(False, started)
+        reconnected = events.first(True, started)
+        blips.append({
+            'detected_s': detected - started if detected else None,
+            'reconnected_s': reconnected - ended if reconnected else None,
+            'recovery_s': recovered - ended if recovered else None,
+        })
+    return blips
+
+
+async def run_link(args):
+    events = LinkEvents()
+    zero_latency_publisher.store_forward = events
+    zero_latency_publisher.publishers[CAMERA_ID] = StandInPublisher(CAMERA_ID)
+
+    server = StandInServer(args.port + 1, args.command_interval)
+    proxy = LinkProxy(args.port, server.port)
+    await server.start()
+    await proxy.start()
+    stop_link = run_publisher_link(f"ws://127.0.0.1:{proxy.port}/ws/camera/")
+    try:
+        while not server.connected:
+            await asyncio.sleep(0.05)
+        results = []
+        for blip_seconds in args.blip:
+            first_request = len(server.sent)
+            connections = len(server.connected)
+            blips = await run_blips(args, blip_seconds, events, proxy, server)
+            sent = list(server.sent)[first_request:]
+            lost = sum(1 for request_id in sent if request_id not in server.acked)
+            reconnects = server.connected[connections:]
+            results.append({
+                'scenario': f'link-{args.mode}-{blip_seconds:g}s',
+                'component': 'websocket',
+                'stages': {
+                    'detected': summary([b['detected_s'] for b in blips if b['detected_s'] is not None]),
+                    'reconnected': summary([b['reconnected_s'] for b in blips if b['reconnected_s'] is not None]),
+                    'recovery': summary([b['recovery_s'] for b in blips if b['recovery_s'] is not None]),
+                },
+                'blips': blips,
+                'commands': {'sent': len(sent), 'lost': lost},
+                'reconnects': len(reconnects),
+                'snapshot_on_reconnect': sum(1 for _, snapshot in reconnects if snapshot),
+            })
+            log.info(f"{results[-1]['scenario']}: {len(reconnects)} reconnects, {lost}/{len(sent)} commands lost")
+        return results
+    finally:
+        await asyncio.to_thread(stop_link)
+        await proxy.stop()
+        await server.stop()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    parser = argparse.ArgumentParser(description='Control-plane recovery of the publisher WebSocket link')
+    parser.add_argument('--mode',
+                       choices=['stall', 'reset'],
+                       default='stall',
+                       help='stall: hold all traffic during a blip; reset: abort connections and refuse new ones (default: stall)')
+    parser.add_argument('--blip',
+                       type=float,
+                       nargs='+',
+                       default=[0.3, 3.0],
+                       help='Blip lengths in seconds, one scenario each (default: 0.3 3)')
+    parser.add_argument('--blips',
+                       type=int,
+                       default=5,
+                       help='Blips per scenario (default: 5)')
+    parser.add_argument('--settle',
+                       type=float,
+                       default=4.0,
+                       help='Seconds between blips, and the longest wait for recovery (default: 4)')
+    parser.add_argument('--command-interval',
+                       type=float,
+                       default=0.05,
+                       help='Seconds between commands from the stand-in server (default: 0.05)')
+    parser.add_argument('--port',
+                       type=int,
+                       default=9110,
+                       help='Proxy port; the stand-in server listens on the next one (default: 9110)')
+    parser.add_argument('--verbose', '-v',
+                       action='store_true',
+                       help="Show the publisher's link log")
+    parser.add_argument('--output', '-o',
+                       default=None,
+                       help='JSON results file (default: benchmarks/results/<timestamp>.json)')
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.getLogger('zero_latency_publisher').setLevel(logging.WARNING)
+
+    results = asyncio.run(run_link(args))
+    for result in results:
+        for stage, stats in result['stages'].items():
+            if stats['count']:
+                log.info(f"{result['scenario']} {stage}: p50 {stats['p50_ms']:.0f} ms, max {stats['max_ms']:.0f} ms "
+                         f"({stats['count']}/{len(result['blips'])} blips)")
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'commit': git_commit(),
+        'settings': {
+            'mode': args.mode,
+            'blips': args.blips,
+            'settle_s': args.settle,
+            'command_interval_s': args.command_interval,
+            'link': {name: getattr(zero_latency_publisher.LinkConfig, name)
+                     for name in dir(zero_latency_publisher.LinkConfig) if name.isupper()},
+        },
+        'results': results,
+    }
+
+    output = args.output or os.path.join('benchmarks', 'results', datetime.now().strftime('%Y%m%d_%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    log.info(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""
+Load generator for the Django WebSocket tier (/ws/camera/, CameraSettingsConsumer).
+
+Starts daphne on a local port, or targets a running server with --url, and
+opens thousands of asyncio clients against it:
+
+- simulated Pis, one camera each, send CameraStatus protobufs at --status-rate
+  and acknowledge the setting commands addressed to their camera, as
+  zero_latency_publisher does;
+- simulated browsers subscribe to one camera's status topic and to
+  'commands', and send camera_setting JSON at --command-rate.
+
+All clients share one clock, so fan-out latency (Pi send -> browser receive)
+is measured directly: each status carries a per-camera sequence number in
+frames_dropped. Command round trip is browser send -> camera_setting_ack.
+Results use the run_pipeline JSON layout, so two runs can be compared with
+benchmarks.compare.
+
+Usage (from the repository root):
+    python -m benchmarks.ws_load --pis 20 --browsers 1000 --duration 30
+    python -m benchmarks.ws_load --pis 50 --browsers 5000 --status-rate 1 --command-rate 0.05 -o benchmarks/results/ws.json
+    python -m benchmarks.ws_load --url ws://127.0.0.1:9000/ws/camera/ --pis 5 --browsers 200
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import logging
+
+import websockets
+
+from benchmarks.loopback import wait_for_port
+from benchmarks.sampling import ResourceSampler, git_commit, percentile
+from live_feed.messages import envelope, messages_pb2
+
+log = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETTINGS = ('brightness', 'contrast', 'exposure', 'gain', 'white_balance')
+
+
+class DaphneServer:
+    """The live_feed ASGI application under daphne, on a local port"""
+    def __init__(self, port=9100, log_path=None):
+        self.port = port
+        self.url = f"ws://127.0.0.1:{port}/ws/camera/"
+        self.log_path = log_path
+        self.process = None
+
+    def start(self):
+        output = open(self.log_path, 'w') if self.log_path else subprocess.DEVNULL
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'daphne', '-b', '127.0.0.1', '-p', str(self.port), 'live_feed.asgi:application'],
+            cwd=os.path.join(ROOT, 'live_feed'),
+            stdout=output,
+            stderr=subprocess.STDOUT,
+        )
+        if not wait_for_port('127.0.0.1', self.port, timeout=20):
+            raise RuntimeError(f"daphne did not start on port {self.port}")
+        log.info(f"daphne listening at {self.url} (pid {self.process.pid})")
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+
+class LoadStats:
+    """Counters and latency samples for the measured window"""
+    def __init__(self):
+        self.status_sent_at = defaultdict(dict)  # camera_id -> seq -> perf_counter at send
+        self.reset()
+
+    def reset(self):
+        self.sent = Counter()
+        self.received = Counter()
+        self.status_sent = Counter()   # camera_id -> statuses sent in the window
+        self.viewers = Counter()       # camera_id -> connected browsers subscribed to it
+        self.fanout = []
+        self.command_rtt = []
+        self.command_status = Counter()
+        self.clients = Counter()
+
+    def summary(self, samples):
+        ordered = sorted(samples)
+        if not ordered:
+            return {'count': 0}
+        return {
+            'count': len(ordered),
+            'mean_ms': sum(ordered) / len(ordered) * 1000,
+            'p50_ms': percentile(ordered, 0.50) * 1000,
+            'p95_ms': percentile(ordered, 0.95) * 1000,
+            'p99_ms': percentile(ordered, 0.99) * 1000,
+            'max_ms': ordered[-1] * 1000,
+        }
+
+
+class SimulatedPi:
+    """A publisher: one camera's CameraStatus stream, acking the commands for that camera"""
+    def __init__(self, index, stats, rate):
+        self.camera_id = f"load-cam-{index:04d}"
+        self.stats = stats
+        self.rate = rate
+        self.seq = itertools.count(1)
+        self.frames = itertools.count(1)
+        self.status = messages_pb2.CameraStatus(camera_id=self.camera_id, isConnected=True, fps=30.0, brightness=50)
+
+    async def run(self, url, stop):
+        async with websockets.connect(url, ping_interval=None, max_size=None) as ws:
+            self.stats.clients['pis_connected'] += 1
+            sender = asyncio.create_task(self.send_status(ws, stop))
+            try:
+                async for message in ws:
+                    for control in envelope.unpack(message).messages:
+                        cmd = control.command
+                        self.stats.received['pi_command'] += 1
+                        if cmd.camera_id == self.camera_id and cmd.request_id:
+                            await ws.send(self.ack_bytes(cmd))
+            finally:
+                sender.cancel()
+
+    def ack_bytes(self, cmd):
+        ack = messages_pb2.CameraSettingsAck(request_id=cmd.request_id, setting=cmd.setting,
+                                             requested=cmd.value, actual=cmd.value, applied=True)
+        self.stats.sent['pi_ack'] += 1
+        return envelope.pack(self.camera_id, next(self.frames), [messages_pb2.ControlMessage(ack=ack)])
+
+    def status_bytes(self):
+        seq = next(self.seq)
+        self.status.frames_dropped = seq
+        self.stats.sent['pi_status'] += 1
+        self.stats.status_sent[self.camera_id] += 1
+        self.stats.status_sent_at[self.camera_id][seq] = time.perf_counter()
+        return envelope.pack(self.camera_id, next(self.frames), [messages_pb2.ControlMessage(status=self.status)])
+
+    async def send_status(self, ws, stop):
+        await asyncio.sleep(random.random() / self.rate)  # spread Pis across the interval
+        while not stop.is_set():
+            await ws.send(self.status_bytes())
+            await asyncio.sleep(1 / self.rate)
+
+
+class SimulatedBrowser:
+    """A dashboard tab: one camera's status topic plus 'commands', sending setting changes"""
+    def __init__(self, camera_id, stats, command_rate):
+        self.camera_id = camera_id
+        self.stats = stats
+        self.command_rate = command_rate
+        self.request_ids = itertools.count(1)
+        self.pending = {}  # request_id -> perf_counter at send
+
+    async def run(self, url, stop):
+        async with websockets.connect(url, ping_interval=None, max_size=None) as ws:
+            await ws.send(json.dumps({'type': 'subscribe', 'topics': [f'status:{self.camera_id}', 'commands']}))
+            self.stats.clients['browsers_connected'] += 1
+            self.stats.viewers[self.camera_id] += 1
+            sender = asyncio.create_task(self.send_commands(ws, stop)) if self.command_rate > 0 else None
+            try:
+                async for message in ws:
+                    self.handle(json.loads(message), time.perf_counter())
+            finally:
+                self.stats.viewers[self.camera_id] -= 1
+                if sender:
+                    sender.cancel()
+
+    def handle(self, message, now):
+        kind = message.get('type')
+        self.stats.received[f'browser_{kind}'] += 1
+        if kind == 'camera_status':
+            sent_at = self.stats.status_sent_at[message['camera_id']].get(message['frames_dropped'])
+            if sent_at is not None:
+                self.stats.fanout.append(now - sent_at)
+        elif kind == 'camera_setting_ack' and message.get('request_id') is not None:
+            sent_at = self.pending.pop(message['request_id'], None)
+            self.stats.command_status[message['status']] += 1
+            if sent_at is not None and message['status'] == 'applied':
+                self.stats.command_rtt.append(now - sent_at)
+
+    async def send_commands(self, ws, stop):
+        while not stop.is_set():
+            # Poisson arrivals, so browsers do not fire in lockstep
+            await asyncio.sleep(random.expovariate(self.command_rate))
+            request_id = next(self.request_ids)
+            self.pending[request_id] = time.perf_counter()
+            await ws.send(json.dumps({
+                'type': 'camera_setting',
+                'camera_id': self.camera_id,
+                'setting': random.choice(SETTINGS),
+                'value': random.randint(0, 100),
+                'request_id': request_id,
+            }))
+            self.stats.sent['browser_command'] += 1
+
+
+async def run_client(client, url, stats, stop):
+    try:
+        await client.run(url, stop)
+    except asyncio.CancelledError:
+        raise
+    except (OSError, websockets.WebSocketException) as e:
+        stats.clients['failed' if not stop.is_set() else 'closed'] += 1
+        log.debug(f"Client failed: {e}")
+
+
+def raise_fd_limit():
+    """Thousands of sockets need more descriptors than the usual soft limit"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def run_load(args, url, server_pid):
+    stats = LoadStats()
+    stop = asyncio.Event()
+    pis = [SimulatedPi(i, stats, args.status_rate) for i in range(args.pis)]
+    browsers = [SimulatedBrowser(pis[i % len(pis)].camera_id, stats, args.command_rate) for i in range(args.browsers)]
+
+    # Pis first, so every browser's camera is live by the time it subscribes
+    tasks = []
+    for client in pis + browsers:
+        tasks.append(asyncio.create_task(run_client(client, url, stats, stop)))
+        await asyncio.sleep(1 / args.ramp)
+    log.info(f"{len(tasks)} clients started, warming up for {args.warmup:.0f}s")
+    await asyncio.sleep(args.warmup)
+
+    viewers = stats.viewers.copy()
+    clients = stats.clients.copy()
+    stats.reset()
+    stats.viewers.update(viewers)
+    stats.clients.update(clients)
+    server = ResourceSampler(pid=server_pid) if server_pid else None
+    generator = ResourceSampler(exclude_pids=[server_pid] if server_pid else [])
+    for sampler in filter(None, (server, generator)):
+        sampler.start()
+    started = time.monotonic()
+    await asyncio.sleep(args.duration)
+    elapsed = time.monotonic() - started
+    # Sample before tearing down, so connection shutdown is not measured
+    resources = {**(await asyncio.to_thread(server.stop) if server else {})}
+    client_resources = await asyncio.to_thread(generator.stop)
+    # Browsers per camera times what that camera sent: what full delivery would have been
+    expected = sum(stats.status_sent[camera_id] * count for camera_id, count in stats.viewers.items())
+    delivered = stats.received['browser_camera_status']
+
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    return {
+        'scenario': f'ws-load-{args.pis}x{args.browsers}',
+        'component': 'websocket',
+        'rates': {
+            'pi_status_sent': stats.sent['pi_status'] / elapsed,
+            'status_delivered': delivered / elapsed,
+            'commands_sent': stats.sent['browser_command'] / elapsed,
+            'acks_received': sum(stats.command_status.values()) / elapsed,
+            'messages_in': sum(stats.sent.values()) / elapsed,
+            'messages_out': sum(stats.received.values()) / elapsed,
+        },
+        'stages': {
+            'fanout': stats.summary(stats.fanout),
+            'command_rtt': stats.summary(stats.command_rtt),
+        },
+        'resources': resources,
+        'client_resources': client_resources,
+        'delivery_ratio': delivered / expected if expected else None,
+        'commands': dict(stats.command_status),
+        'clients': dict(stats.clients),
+        'received': dict(stats.received),
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    parser = argparse.ArgumentParser(description='Load generator for the /ws/camera/ WebSocket tier')
+    parser.add_argument('--url',
+                       default=None,
+                       help='Target a running server, e.g. ws://127.0.0.1:9000/ws/camera/ (default: start daphne locally)')
+    parser.add_argument('--port',
+                       type=int,
+                       default=9100,
+                       help='Port for the local daphne (default: 9100)')
+    parser.add_argument('--server-log',
+                       default=None,
+                       help='Write the local daphne output to this file (default: discarded)')
+    parser.add_argument('--pis',
+                       type=int,
+                       default=10,
+                       help='Simulated publishers, one camera each (default: 10)')
+    parser.add_argument('--browsers',
+                       type=int,
+                       default=500,
+                       help='Simulated browsers, spread evenly over the cameras (default: 500)')
+    parser.add_argument('--status-rate',
+                       type=float,
+                       default=1.0,
+                       help='CameraStatus messages per second per Pi (default: 1, as the publisher sends)')
+    parser.add_argument('--command-rate',
+                       type=float,
+                       default=0.01,
+                       help='camera_setting messages per second per browser, 0 to disable (default: 0.01)')
+    parser.add_argument('--ramp',
+                       type=float,
+                       default=200,
+                       help='New connections per second while starting up (default: 200)')
+    parser.add_argument('--duration', '-d',
+                       type=float,
+                       default=20,
+                       help='Measured seconds (default: 20)')
+    parser.add_argument('--warmup',
+                       type=float,
+                       default=3,
+                       help='Seconds after the last client connects that are discarded (default: 3)')
+    parser.add_argument('--output', '-o',
+                       default=None,
+                       help='JSON results file (default: benchmarks/results/<timestamp>.json)')
+    args = parser.parse_args()
+    if args.pis < 1:
+        parser.error('--pis must be at least 1')
+
+    raise_fd_limit()
+    server = None
+    url = args.url
+    if url is None:
+        server = DaphneServer(args.port, args.server_log)
+        server.start()
+        url = server.url
+
+    try:
+        result = asyncio.run(run_load(args, url, server.process.pid if server else None))
+    finally:
+        if server:
+            server.stop()
+
+    log.info(f"{result['scenario']}: " + ", ".join(f"{k} {v:.1f}/s" for k, v in result['rates'].items()))
+    for stage, stats in result['stages'].items():
+        if stats['count']:
+            log.info(f"{stage}: p50 {stats['p50_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms, max {stats['max_ms']:.1f} ms")
+    if result['resources']:
+        log.info(f"server: {result['resources']['cpu_percent']:.0f}% CPU, {result['resources']['rss_mb_peak']:.0f} MB peak RSS")
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'commit': git_commit(),
+        'settings': {
+            'url': url,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'pis': args.pis,
+            'browsers': args.browsers,
+            'status_rate': args.status_rate,
+            'command_rate': args.command_rate,
+        },
+        'results': [result],
+    }
+
+    output = args.output or os.path.join('benchmarks', 'results', datetime.now().strftime('%Y%m%d_%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    log.info(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Shared-memory frame bus for local consumers of a publisher's camera.
+
+The publisher's capture loop copies every captured frame (before the overlay
+is drawn) into a ring of N slots in a multiprocessing.shared_memory segment
+named after the camera. Other processes on the Pi (snapshotter, motion
+detector, local recorder) attach by name and map the slots as NumPy views:
+no pickling, no second decode, no contention for the camera device.
+
+Layout, all little-endian:
+    header  (64 bytes)  magic, version, slots, height, width, channels, slot_size, latest sequence
+    slot i  (64 bytes)  seqlock counter, frame sequence, capture time (monotonic), wall time
+            + frame     height * width * channels bytes, uint8, BGR
+
+Each slot is guarded by a seqlock: the writer makes the counter odd before
+copying a frame in and even again afterwards. A reader checks the counter
+before and after using the slot; an odd or changed counter means the frame
+was torn and is skipped. The writer never waits for readers, and a reader
+that falls more than N frames behind jumps to the newest frame.
+
+Reader usage:
+    bus = FrameBusReader('zl_zerolatency')
+    while True:
+        frame = bus.next_frame(timeout=1.0)
+        if frame is None:
+            continue
+        process(frame.image)              # zero-copy view into the ring
+        if not bus.still_valid(frame):    # overwritten while we used it
+            continue
+
+A view stays valid for about N frame intervals. Readers that work on a
+frame for longer should pass copy=True, which copies it out and validates
+the copy.
+"""
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import logging
+
+log = logging.getLogger(__name__)
+
+MAGIC = 0x5A4C4642  # 'ZLFB'
+VERSION = 1
+HEADER = struct.Struct('<IIIIIIQQ')  # magic, version, slots, height, width, channels, slot_size, latest
+HEADER_SIZE = 64
+SLOT_HEADER_SIZE = 64                # seqlock, frame seq (uint64); capture time, wall time (float64)
+LATEST_OFFSET = struct.calcsize('<IIIIIIQ')
+
+
+def bus_name(camera_id):
+    """Shared memory name of a camera's frame bus"""
+    return f"zl_{camera_id}"
+
+
+class Frame:
+    """A frame read from the bus; image is a view into shared memory unless copied"""
+    __slots__ = ('seq', 'capture_time', 'wall_time', 'image', 'slot', 'lock')
+
+    def __init__(self, seq, capture_time, wall_time, image, slot, lock):
+        self.seq = seq
+        self.capture_time = capture_time
+        self.wall_time = wall_time
+        self.image = image
+        self.slot = slot
+        self.lock = lock  # seqlock value the frame was read under
+
+
+class RingLayout:
+    """NumPy views over the header, slot headers and frame slots of a bus segment"""
+    def __init__(self, buf, slots, height, width, channels):
+        self.slots = slots
+        self.shape = (height, width, channels)
+        self.frame_size = height * width * channels
+        self.slot_size = SLOT_HEADER_SIZE + self.frame_size
+        self.latest = np.ndarray((1,), dtype='<u8', buffer=buf, offset=LATEST_OFFSET)
+        self.locks = []
+        self.seqs = []
+        self.times = []
+        self.images = []
+        for slot in range(slots):
+            offset = HEADER_SIZE + slot * self.slot_size
+            self.locks.append(np.ndarray((1,), dtype='<u8', buffer=buf, offset=offset))
+            self.seqs.append(np.ndarray((1,), dtype='<u8', buffer=buf, offset=offset + 8))
+            self.times.append(np.ndarray((2,), dtype='<f8', buffer=buf, offset=offset + 16))
+            self.images.append(np.ndarray(self.shape, dtype=np.uint8, buffer=buf, offset=offset + SLOT_HEADER_SIZE))
+
+    @staticmethod
+    def size(slots, height, width, channels):
+        return HEADER_SIZE + slots * (SLOT_HEADER_SIZE + height * width * channels)
+
+
+class FrameBus:
+    """
+    Writer side, owned by the capture thread.
+
+    The segment is created on the first frame, sized from the frame itself,
+    since cameras do not always honour the requested resolution.
+    """
+    def __init__(self, name, slots=4):
+        self.name = name
+        self.slots = slots
+        self.shm = None
+        self.ring = None
+        self.seq = 0
+
+    def create(self, shape):
+        height, width = shape[:2]
+        channels = shape[2] if len(shape) > 2 else 1
+        size = RingLayout.size(self.slots, height, width, channels)
+        try:
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a publisher that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=self.name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        self.ring = RingLayout(self.shm.buf, self.slots, height, width, channels)
+        HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, self.slots, height, width, channels, self.ring.slot_size, 0)
+        log.info(f"Frame bus '{self.name}': {self.slots} slots of {width}x{height}x{channels} ({size / 2**20:.1f} MB)")
+
+    def publish(self, frame, capture_time):
+        """Copy a frame into the next slot; never blocks on readers"""
+        if self.ring is None:
+            self.create(frame.shape)
+        elif frame.shape != self.ring.shape[:frame.ndim]:
+            log.warning(f"Frame bus '{self.name}': frame size changed to {frame.shape}, recreating")
+            self.close()
+            self.create(frame.shape)
+
+        self.seq += 1
+        slot = self.seq % self.slots
+        lock = self.ring.locks[slot]
+        lock[0] += 1                     # odd: slot is being written
+        np.copyto(self.ring.images[slot], frame.reshape(self.ring.shape))
+        self.ring.seqs[slot][0] = self.seq
+        self.ring.times[slot][:] = (capture_time, time.time())
+        lock[0] += 1                     # even: slot is consistent again
+        self.ring.latest[0] = self.seq
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.ring = None  # drop the views before closing the mapping
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        self.shm = None
+
+
+def attach(name):
+    """Open an existing segment without letting this process's resource tracker unlink it at exit"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+
+class FrameBusReader:
+    """Reader side; any number of processes can read the same bus"""
+    def __init__(self, name, poll_interval=0.002):
+        self.name = name
+        self.poll_interval = poll_interval
+        self.shm = attach(name)
+        magic, version, slots, height, width, channels, _, _ = HEADER.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.shm.close()
+            raise ValueError(f"'{name}' is not a version {VERSION} frame bus")
+        self.ring = RingLayout(self.shm.buf, slots, height, width, channels)
+        self.last_seq = 0
+        self.skipped = 0  # frames published that this reader never saw
+        self.torn = 0     # reads discarded because the writer overwrote the slot meanwhile
+
+    @property
+    def shape(self):
+        return self.ring.shape
+
+    def latest_seq(self):
+        return int(self.ring.latest[0])
+
+    def read(self, seq, copy=False):
+        """Frame seq if it is still in the ring and not being written, else None"""
+        slot = seq % self.ring.slots
+        lock = int(self.ring.locks[slot][0])
+        if lock & 1 or int(self.ring.seqs[slot][0]) != seq:
+            return None
+        capture_time, wall_time = (float(t) for t in self.ring.times[slot])
+        image = self.ring.images[slot].copy() if copy else self.ring.images[slot]
+        frame = Frame(seq, capture_time, wall_time, image, slot, lock)
+        if not self.still_valid(frame):
+            self.torn += 1
+            return None
+        return frame
+
+    def still_valid(self, frame):
+        """Whether the writer has left frame's slot untouched since it was read"""
+        return int(self.ring.locks[frame.slot][0]) == frame.lock
+
+    def latest(self, copy=False):
+        """The newest complete frame, or None"""
+        seq = self.latest_seq()
+        return self.read(seq, copy) if seq else None
+
+    def next_frame(self, timeout=None, copy=False):
+        """
+        The next frame after the last one returned, waiting up to timeout
+        seconds. A reader that has fallen a whole ring behind skips to the
+        newest frame.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            latest = self.latest_seq()
+            if latest > self.last_seq:
+                seq = self.last_seq + 1
+                if latest - seq >= self.ring.slots - 1:
+                    seq = latest  # the older slots are about to be overwritten
+                frame = self.read(seq, copy)
+                if frame is None and seq != latest:
+                    seq = latest
+                    frame = self.read(seq, copy)
+                if frame is not None:
+                    self.skipped += seq - self.last_seq - 1 if self.last_seq else 0
+                    self.last_seq = seq
+                    return frame
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def close(self):
+        self.ring = None
+        self.shm.close()
+
+
+def main():
+    """Tail a camera's frame bus and report the rate this reader keeps up with"""
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    parser = argparse.ArgumentParser(description='Read frames from a publisher frame bus')
+    parser.add_argument('camera_id', help='Camera id (MediaMTX path) of the publisher')
+    parser.add_argument('--work-ms',
+                       type=float,
+                       default=0,
+                       help='Simulated processing time per frame, to see a slow reader skip (default: 0)')
+    args = parser.parse_args()
+
+    while True:
+        try:
+            bus = FrameBusReader(bus_name(args.camera_id))
+            break
+        except FileNotFoundError:
+            # The publisher creates the bus on its first captured frame
+            log.info(f"Waiting for frame bus '{bus_name(args.camera_id)}'...")
+            time.sleep(1.0)
+    log.info(f"Reading {bus.shape[1]}x{bus.shape[0]} frames from '{bus.name}'")
+    frames, started = 0, time.monotonic()
+    try:
+        while True:
+            frame = bus.next_frame(timeout=1.0)
+            if frame is None:
+                continue
+            time.sleep(args.work_ms / 1000)
+            if bus.still_valid(frame):
+                frames += 1
+            elapsed = time.monotonic() - started
+            if elapsed >= 2.0:
+                age_ms = (time.monotonic() - frame.capture_time) * 1000
+                log.info(f"{frames / elapsed:.1f} fps, frame age {age_ms:.1f} ms, skipped {bus.skipped}, torn {bus.torn}")
+                frames, started = 0, time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .models import Camera
+
+
+@admin.register(Camera)
+class CameraAdmin(admin.ModelAdmin):
+    list_display = ('camera_id', 'name', 'host', 'stream_path', 'sub_stream_path', 'enabled', 'position')
+    list_editable = ('enabled', 'position')
+    search_fields = ('camera_id', 'name', 'host')
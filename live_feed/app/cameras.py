@@ -0,0 +1,138 @@
+"""
+Camera registry backed by the Camera table.
+
+The table is read once into a dict of camera_id -> camera, with every stream
+URL precomputed, so lookups on the request path are a dict access. Saving or
+deleting a Camera in this process drops the cache immediately; edits made by
+other processes (manage.py shell, a second worker) are picked up once the
+cache is NetworkConfig.CAMERA_REGISTRY_MAX_AGE seconds old.
+
+With RelayConfig.ENABLED the viewer-facing URLs point at the server-side
+relay (see relay.py) rather than the camera's Pi; each rendition keeps the
+Pi URL the relay pulls from as source_url.
+"""
+import threading
+import time
+
+from channels.db import database_sync_to_async
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from .config import NetworkConfig, RelayConfig
+from .models import Camera
+
+
+def relay_path(camera_id, rendition):
+    """Path the relay serves a camera rendition on; camera ids are unique where Pi stream paths need not be"""
+    return camera_id if rendition == 'main' else f'{camera_id}{NetworkConfig.SUB_STREAM_SUFFIX}'
+
+
+def camera_entry(camera):
+    """JSON-ready description of a Camera, as served by /api/cameras/"""
+    path = camera.stream_path or camera.camera_id
+    source_paths = {'main': path}
+    if camera.sub_stream_path:
+        source_paths['sub'] = camera.sub_stream_path
+    if RelayConfig.ENABLED:
+        host, rtsp_port, webrtc_port, api_port = (RelayConfig.HOST, RelayConfig.RTSP_PORT,
+                                                  RelayConfig.WEBRTC_PORT, RelayConfig.API_PORT)
+    else:
+        host, rtsp_port, webrtc_port, api_port = camera.host, camera.rtsp_port, camera.webrtc_port, camera.api_port
+    rtsp_base = f'rtsp://{host}:{rtsp_port}'
+    webrtc_base = f'http://{host}:{webrtc_port}'
+    renditions = {}
+    for rendition, source_path in source_paths.items():
+        served = relay_path(camera.camera_id, rendition) if RelayConfig.ENABLED else source_path
+        renditions[rendition] = {
+            'path': served,
+            'rtsp_url': f'{rtsp_base}/{served}',
+            'webrtc_url': f'{webrtc_base}/{served}/whep',
+            'source_path': source_path,
+            'source_url': f'rtsp://{camera.host}:{camera.rtsp_port}/{source_path}',
+        }
+    return {
+        'camera_id': camera.camera_id,
+        'name': camera.name or camera.camera_id,
+        'host': camera.host,
+        'rtsp_port': camera.rtsp_port,
+        'relayed': RelayConfig.ENABLED,
+        'api_url': f'http://{host}:{api_port}',  # the MediaMTX viewers read from
+        'stream_path': path,
+        'hls_url': None,  # HLS disabled - WebRTC preferred
+        'rtsp_url': renditions['main']['rtsp_url'],
+        'webrtc_url': renditions['main']['webrtc_url'],
+        'sub_rtsp_url': renditions.get('sub', {}).get('rtsp_url'),
+        'sub_webrtc_url': renditions.get('sub', {}).get('webrtc_url'),
+        'renditions': renditions,
+        'snapshot_url': reverse('camera_snapshot', args=[camera.camera_id]),
+        'has_audio': bool(camera.capabilities.get('audio', False)),
+        'controls': list(camera.capabilities.get('controls', [])),
+        'capabilities': camera.capabilities,
+    }
+
+
+def stream_rendition(cameras, stream):
+    """(camera_id, rendition) served on a MediaMTX path (the relay's or the Pi's), or None if no registered camera uses it"""
+    for camera in cameras.values():
+        for rendition, entry in camera['renditions'].items():
+            if stream in (entry['path'], entry['source_path']):
+                return camera['camera_id'], rendition
+    return None
+
+
+class CameraRegistry:
+    """In-process cache of the enabled cameras, in dashboard order"""
+    def __init__(self, max_age=None):
+        self.max_age = max_age or NetworkConfig.CAMERA_REGISTRY_MAX_AGE
+        self.lock = threading.Lock()
+        self.cameras = None     # camera_id -> entry
+        self.loaded_at = 0.0
+
+    def cached(self):
+        """The cached entries, or None if they need to be (re)read"""
+        cameras = self.cameras
+        if cameras is not None and time.monotonic() - self.loaded_at < self.max_age:
+            return cameras
+        return None
+
+    def load(self):
+        """Camera entries by camera_id, reading the table if the cache is empty or stale"""
+        cameras = self.cached()
+        if cameras is not None:
+            return cameras
+        with self.lock:
+            cameras = self.cached()
+            if cameras is None:
+                cameras = {camera.camera_id: camera_entry(camera) for camera in Camera.objects.filter(enabled=True)}
+                self.cameras, self.loaded_at = cameras, time.monotonic()
+            return cameras
+
+    async def aload(self):
+        """load() for async code; only touches the database when the cache needs a reload"""
+        cameras = self.cached()
+        if cameras is not None:
+            return cameras
+        return await database_sync_to_async(self.load)()
+
+    def get(self, camera_id):
+        return self.load().get(camera_id)
+
+    def default(self):
+        """The first camera in dashboard order, or None if none are registered"""
+        return next(iter(self.load().values()), None)
+
+    def all(self):
+        return list(self.load().values())
+
+    def invalidate(self):
+        self.cameras = None
+
+
+camera_registry = CameraRegistry()
+
+
+@receiver(post_save, sender=Camera)
+@receiver(post_delete, sender=Camera)
+def invalidate_camera_registry(**kwargs):
+    camera_registry.invalidate()
@@ -0,0 +1,165 @@
+"""
+Camera setting commands in flight between browsers and publishers.
+
+Every command forwarded to a publisher gets a request_id, which the
+publisher echoes in a CameraSettingsAck together with the value it read
+back from the camera. At most one command per (camera, setting) is in
+flight: commands arriving meanwhile wait, and a newer one replaces a
+waiting one, so dragging a slider sends the publisher one value per round
+trip rather than one per input event. The time from forwarding a command
+to its ack is recorded in per-setting latency histograms.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from .config import CommandConfig
+
+
+class Command:
+    """One camera setting change requested by a browser"""
+    def __init__(self, camera_id, setting, value, origin, client_request_id=None):
+        self.camera_id = camera_id
+        self.setting = setting
+        self.value = value
+        self.origin = origin                        # channel name of the requesting socket
+        self.client_request_id = client_request_id  # the browser's own id, echoed back to it
+        self.request_id = 0                         # wire id, assigned when forwarded
+        self.sent_at = None
+
+    @property
+    def key(self):
+        return (self.camera_id, self.setting)
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of round-trip times in milliseconds"""
+    def __init__(self, bounds=None):
+        self.bounds = tuple(bounds or CommandConfig.LATENCY_BUCKETS_MS)
+        self.counts = [0] * (len(self.bounds) + 1)  # last bucket counts everything above the top bound
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.counts[bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-quantile (the maximum for the overflow bucket)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return float(bound)
+        return round(self.max_ms, 1)
+
+    def snapshot(self):
+        return {
+            'buckets': [{'le': bound, 'count': count} for bound, count in zip(self.bounds + (None,), self.counts)],
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 1) if self.count else None,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': round(self.max_ms, 1),
+        }
+
+
+class CommandTracker:
+    """Commands in flight and waiting, per (camera, setting), plus their round-trip statistics"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        self.in_flight = {}   # request_id -> Command
+        self.busy = {}        # (camera_id, setting) -> request_id in flight
+        self.waiting = {}     # (camera_id, setting) -> Command to send once the in-flight one is answered
+        self.latency = defaultdict(LatencyHistogram)  # setting -> histogram
+        self.overall = LatencyHistogram()
+        self.counters = dict.fromkeys(('sent', 'applied', 'failed', 'superseded', 'timed_out'), 0)
+        self.task = None
+
+    def submit(self, command):
+        """
+        Offer a new command; returns (command to forward now or None, waiting command it replaced or None)
+        """
+        with self.lock:
+            if command.key not in self.busy:
+                return self.start(command), None
+            replaced = self.waiting.pop(command.key, None)
+            self.waiting[command.key] = command
+            if replaced:
+                self.counters['superseded'] += 1
+            return None, replaced
+
+    def start(self, command):
+        command.request_id = next(self.ids) % 0xFFFFFFFF + 1  # uint32 on the wire, never 0
+        command.sent_at = time.monotonic()
+        self.in_flight[command.request_id] = command
+        self.busy[command.key] = command.request_id
+        self.counters['sent'] += 1
+        return command
+
+    def finish(self, request_id):
+        """Retire an in-flight command; returns (command, next command to forward) or (None, None)"""
+        command = self.in_flight.pop(request_id, None)
+        if command is None:
+            return None, None
+        del self.busy[command.key]
+        following = self.waiting.pop(command.key, None)
+        return command, following and self.start(following)
+
+    def ack(self, request_id, applied, now=None):
+        """Record a publisher ack; returns (command, round trip ms, next command to forward)"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            command, following = self.finish(request_id)
+            if command is None:
+                return None, None, following
+            rtt_ms = (now - command.sent_at) * 1000
+            self.latency[command.setting].add(rtt_ms)
+            self.overall.add(rtt_ms)
+            self.counters['applied' if applied else 'failed'] += 1
+            return command, rtt_ms, following
+
+    def expire(self, now=None):
+        """Retire commands unanswered for ACK_TIMEOUT; returns [(lost command, next command to forward)]"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            lost = [request_id for request_id, command in self.in_flight.items()
+                    if now - command.sent_at >= CommandConfig.ACK_TIMEOUT]
+            self.counters['timed_out'] += len(lost)
+            return [self.finish(request_id) for request_id in lost]
+
+    async def run(self, on_expired):
+        while True:
+            await asyncio.sleep(CommandConfig.SWEEP_INTERVAL)
+            for command, following in self.expire():
+                await on_expired(command, following)
+
+    def ensure_started(self, on_expired):
+        """Start watching for lost commands on the running event loop, once"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run(on_expired))
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                **self.counters,
+                'in_flight': len(self.in_flight),
+                'waiting': len(self.waiting),
+                'ack_timeout_ms': CommandConfig.ACK_TIMEOUT * 1000,
+                'latency': self.overall.snapshot(),
+                'latency_by_setting': {setting: histogram.snapshot() for setting, histogram in self.latency.items()},
+            }
+
+
+command_tracker = CommandTracker()
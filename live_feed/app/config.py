@@ -3,6 +3,7 @@
 Centralized configuration for IP addresses, ports, and stream settings.
 This makes it easy to update network settings without hunting through multiple files.
 """
+from pathlib import Path
 
 # VPN Network Configuration
 class NetworkConfig:
@@ -15,21 +16,29 @@ class NetworkConfig:
     HLS_PORT = 8888
     WEBRTC_PORT = 8889
     WEBSOCKET_PORT = 9000
+    API_PORT = 9997              # MediaMTX control API (session lists)
     
     # Stream Configuration
     STREAM_NAME = "zerolatency"
+    SUB_STREAM_SUFFIX = "_sub"   # Low-resolution preview rendition published next to each stream
+    HAS_AUDIO = False            # The publisher sends video only; players skip the audio transceiver
     
     # Connection Settings
     CONNECTION_TIMEOUT = 2  # seconds
+    CAMERA_REGISTRY_MAX_AGE = 30  # seconds before the cached camera registry rereads the Camera table
     
     @classmethod
     def get_stream_urls(cls):
         """Generate all stream URLs based on current configuration"""
+        if RelayConfig.ENABLED:
+            return RelayConfig.get_stream_urls()
         return {
             # 'hls_url': f'http://{cls.PI_VPN_IP}:{cls.HLS_PORT}/{cls.STREAM_NAME}/index.m3u8',  # HLS disabled
             'hls_url': None,  # HLS disabled - WebRTC preferred
             'rtsp_url': f'rtsp://{cls.PI_VPN_IP}:{cls.RTSP_PORT}/{cls.STREAM_NAME}',
-            'webrtc_url': f'http://{cls.PI_VPN_IP}:{cls.WEBRTC_PORT}/{cls.STREAM_NAME}/whep'
+            'webrtc_url': f'http://{cls.PI_VPN_IP}:{cls.WEBRTC_PORT}/{cls.STREAM_NAME}/whep',
+            'sub_rtsp_url': f'rtsp://{cls.PI_VPN_IP}:{cls.RTSP_PORT}/{cls.STREAM_NAME}{cls.SUB_STREAM_SUFFIX}',
+            'sub_webrtc_url': f'http://{cls.PI_VPN_IP}:{cls.WEBRTC_PORT}/{cls.STREAM_NAME}{cls.SUB_STREAM_SUFFIX}/whep'
         }
     
     @classmethod
@@ -37,6 +46,164 @@ class NetworkConfig:
         """Get address for checking if MediaMTX is running"""
         return (cls.PI_VPN_IP, cls.RTSP_PORT)
 
+# Recording storage and playback
+class RecordingConfig:
+    # Segment files live under RECORDINGS_ROOT/<camera_id>/<YYYYmmdd_HHMMSS>.<ext>
+    RECORDINGS_ROOT = Path(__file__).resolve().parent.parent / 'recordings'
+    SEGMENT_EXTENSIONS = ('.mp4', '.mkv', '.ts')
+    SEGMENT_TIME_FORMAT = '%Y%m%d_%H%M%S'
+
+    # Used to probe segment duration; falls back to OpenCV if missing
+    FFPROBE_PATH = 'ffprobe'
+
+    # Lazily generated thumbnails, least recently used evicted beyond the limit
+    THUMBNAIL_DIR = RECORDINGS_ROOT / '.thumbnails'
+    THUMBNAIL_CACHE_MAX = 2000
+    THUMBNAIL_WIDTH = 320
+
+    # Listing page size
+    PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 500
+
+    # Segmented recorder: MPEG-TS segments can be cut and joined at any keyframe byte offset
+    FFMPEG_PATH = 'ffmpeg'
+    SEGMENT_SECONDS = 60
+
+    # Time-indexed playback
+    PLAYBACK_MAX_GAP = 2.0        # seconds between segments still treated as continuous
+    PLAYBACK_MAX_DURATION = 3600  # seconds streamed per playback request
+
+    # Segments uploaded by publishers after an upstream outage (see store_forward.py)
+    UPLOAD_MAX_BYTES = 512 * 2**20
+
+# Live camera snapshots served to dashboard tiles (see snapshots.py)
+class SnapshotConfig:
+    TTL = 5.0                     # seconds a snapshot is served from memory, as long as dashboard tiles wait between refreshes
+    RETRY_AFTER = 5.0             # seconds before asking again a publisher that did not answer
+    STALE_MAX = 60.0              # an older snapshot stands in for a missing answer up to this age
+    REPLY_TIMEOUT = 1.5           # seconds to wait for the publisher's CameraSnapshot
+    WIDTH = 640                   # the publisher scales wider frames down before encoding
+    JPEG_QUALITY = 75
+
+# Publisher-side store-and-forward while the VPN is down (see store_forward.py)
+class StoreForwardConfig:
+    SPOOL_DIR = Path.home() / '.zero_latency' / 'spool'  # <camera_id>/<UTC YYYYmmdd_HHMMSS>.ts
+    SPOOL_BUDGET_MB = 2048        # oldest spooled segments are deleted beyond this
+    SEGMENT_SECONDS = 60
+    OUTAGE_GRACE = 10             # seconds the WebSocket must be down before spooling starts
+    UPLOAD_KBPS = 1000            # backlog upload rate cap, well below the uplink the live stream needs
+    UPLOAD_RETRY = 30             # seconds to wait after a failed upload
+
+# Publisher -> Django WebSocket link (zero_latency_publisher.WebSocketHandler)
+class LinkConfig:
+    PING_INTERVAL = 1.0           # seconds between WebSocket pings
+    PING_TIMEOUT = 1.0            # a pong later than this marks the link dead
+    SEND_TIMEOUT = 1.0            # a send stuck this long behind a full socket buffer marks the link dead
+    BATCH_WINDOW = 0.05           # statuses queued within this long of each other share one envelope; acks go at once
+    CLOSE_TIMEOUT = 0.5           # seconds granted to the closing handshake of a dead link
+    TCP_USER_TIMEOUT_MS = 3000    # the kernel drops the connection when sent data stays unacknowledged this long (Linux)
+    RECONNECT_FIRST = 0.1         # upper bound of the jittered first retry, seconds
+    RECONNECT_MAX = 5.0           # upper bound of later retries; doubles from RECONNECT_FIRST up to this
+    RECONNECT_RESET_AFTER = 5.0   # a link that stayed up this long starts over at RECONNECT_FIRST
+
+# Publisher encoder GOP and keyframes on demand (zero_latency_publisher.py, keyframes.py)
+class KeyframeConfig:
+    GOP_SECONDS = 4.0             # keyframe interval of the in-process encoder, which takes keyframe requests
+    PIPE_GOP_SECONDS = 1.0        # keyframe interval of the ffmpeg subprocess encoder, which cannot
+    REQUEST_MIN_INTERVAL = 1.0    # Django merges keyframe requests for one stream closer together than this
+
+# Static-scene frame skipping in the publisher (zero_latency_publisher.py)
+class SceneConfig:
+    IDLE_FPS = 2.0                # encoded frame rate while the scene is static; 0 encodes every paced frame
+    CHANGE_THRESHOLD = 2.0        # mean absolute grey-level difference (0-255) that counts as a change
+    DECIMATION = 8                # the detector compares every Nth pixel of every Nth row
+    STATIC_AFTER = 1.0            # seconds without a change before the frame rate drops
+
+# Receiver frame pipeline (receiver_pipeline.py)
+class PipelineConfig:
+    QUEUE_SIZE = 2                # frames waiting per stage; a frame that finds the queue full is dropped for that stage
+    DEFAULT_BUDGET_MS = 10        # per-call time budget of a stage registered without one
+    CORE_BUDGET_MS = 4            # receive-loop work per frame beyond which optional stages are shed
+    REVIEW_INTERVAL = 1.0         # seconds between shedding decisions
+    OVERRUN_SHARE = 0.1           # share of calls over budget that marks a stage overloaded
+    RESTORE_AFTER = 3             # reviews without trouble before a shed stage gets twice the frames again
+    MAX_SHED = 4                  # an optional stage is shed to at most 1 in 2**MAX_SHED of its frames
+    TIMING_WINDOW = 300           # calls per stage kept for the mean and p99
+
+# Receiver metrics reporting (receiver_metrics.py, /api/metrics/receiver/)
+class ReceiverMetricsConfig:
+    SAMPLE_SECONDS = 5            # the receiver folds its frames into one sample per interval
+    BATCH_SECONDS = 30            # samples are uploaded together this often
+    MAX_BATCH = 360               # samples per upload, so a backlog goes in several requests
+    BUFFER_MAX = 2880             # samples kept while the server is unreachable (4 h); the oldest are dropped beyond this
+    UPLOAD_TIMEOUT = 5            # seconds per upload request
+    RETRY_MAX = 300               # failed uploads back off from BATCH_SECONDS up to this
+    SAMPLE_RETENTION = 2 * 24 * 3600  # seconds the server keeps raw samples to refold late batches into rollups
+
+# Stream metrics rollups
+class MetricsConfig:
+    ROLLUP_SECONDS = 60               # one stored point per camera per minute
+    DEFAULT_WINDOW = 24 * 3600        # history returned when no since= cursor is given
+    MAX_WINDOW = 30 * 24 * 3600       # oldest history a single query may reach back
+    LIVE_PUSH_INTERVAL = 5            # seconds between partial-bucket pushes over /ws/camera/
+
+# Live viewer accounting
+class ViewerConfig:
+    # Where reader sessions come from besides dashboard sockets:
+    # 'mediamtx' polls the control API, 'stub' uses viewers.stub_sessions, None disables polling
+    SESSION_SOURCE = 'mediamtx'
+    MEDIAMTX_API_URL = None       # None polls the MediaMTX API of every registered camera's host
+    MEDIAMTX_SESSION_ENDPOINTS = {
+        'webrtc': '/v3/webrtcsessions/list',
+        'rtsp': '/v3/rtspsessions/list',
+    }
+    POLL_INTERVAL = 2             # seconds between session list polls
+    POLL_TIMEOUT = 1              # seconds per API request
+    EGRESS_PUSH_DELTA = 0.1       # relative egress change per stream worth pushing to browsers
+    # Sub-stream hints: switch viewers once the serving uplink's budget (the Pi's, or the relay's) or a stream's audience is exceeded
+    EGRESS_BUDGET_KBPS = 8000
+    SUB_STREAM_VIEWERS = 4
+
+# Server-side media relay (relay.py, manage.py run_relay)
+class RelayConfig:
+    ENABLED = False               # hand viewers relay URLs; the relay pulls one copy of each rendition from its Pi
+    HOST = NetworkConfig.WINDOWS_VPN_IP  # where viewers reach the relay's MediaMTX
+    RTSP_PORT = 8554
+    WEBRTC_PORT = 8889
+    API_PORT = 9997               # viewer accounting polls this instead of the Pis while the relay is on
+    MEDIAMTX_PATH = 'mediamtx'
+    CONFIG_PATH = Path(__file__).resolve().parent.parent / 'relay' / 'mediamtx.yml'  # generated, rewritten on camera changes
+    ON_DEMAND = True              # pull a rendition only while someone reads it; False keeps every pull open
+    CLOSE_AFTER = 10              # seconds an on-demand pull stays open after its last reader leaves
+    RELOAD_INTERVAL = 30          # seconds between checks of the Camera table for changes to relay
+
+    @classmethod
+    def get_stream_urls(cls):
+        """Relay URLs of the default stream; the relay names paths after the camera id"""
+        path = NetworkConfig.STREAM_NAME
+        sub = f'{path}{NetworkConfig.SUB_STREAM_SUFFIX}'
+        return {
+            'hls_url': None,  # HLS disabled - WebRTC preferred
+            'rtsp_url': f'rtsp://{cls.HOST}:{cls.RTSP_PORT}/{path}',
+            'webrtc_url': f'http://{cls.HOST}:{cls.WEBRTC_PORT}/{path}/whep',
+            'sub_rtsp_url': f'rtsp://{cls.HOST}:{cls.RTSP_PORT}/{sub}',
+            'sub_webrtc_url': f'http://{cls.HOST}:{cls.WEBRTC_PORT}/{sub}/whep'
+        }
+
+# Per-socket send queues for browsers on /ws/camera/
+class SendQueueConfig:
+    MAX_PENDING = 64              # keyed (last value wins) messages queued per socket; oldest dropped beyond this
+    MAX_RELIABLE = 256            # undroppable messages queued per socket; the socket is closed beyond this
+    HIGH_WATER = 48               # queued messages at which a socket counts as saturated
+    SEND_STALL_SECONDS = 2        # a single send taking this long also counts as saturated
+    SATURATED_SECONDS = 10        # sockets saturated for this long are disconnected
+
+# Camera setting commands and their acknowledgements
+class CommandConfig:
+    ACK_TIMEOUT = 1.5             # seconds before an unacknowledged command counts as lost
+    SWEEP_INTERVAL = 0.25         # seconds between checks for lost commands
+    LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000)  # round-trip histogram upper bounds
+
 # Development/Fallback Configuration
 class DevConfig:
     # Fallback to localhost for development
@@ -49,7 +216,9 @@ class DevConfig:
             # 'hls_url': f'http://{cls.LOCALHOST}:{NetworkConfig.HLS_PORT}/{NetworkConfig.STREAM_NAME}/index.m3u8',  # HLS disabled
             'hls_url': None,  # HLS disabled - WebRTC preferred
             'rtsp_url': f'rtsp://{cls.LOCALHOST}:{NetworkConfig.RTSP_PORT}/{NetworkConfig.STREAM_NAME}',
-            'webrtc_url': f'http://{cls.LOCALHOST}:{NetworkConfig.WEBRTC_PORT}/{NetworkConfig.STREAM_NAME}/whep'
+            'webrtc_url': f'http://{cls.LOCALHOST}:{NetworkConfig.WEBRTC_PORT}/{NetworkConfig.STREAM_NAME}/whep',
+            'sub_rtsp_url': f'rtsp://{cls.LOCALHOST}:{NetworkConfig.RTSP_PORT}/{NetworkConfig.STREAM_NAME}{NetworkConfig.SUB_STREAM_SUFFIX}',
+            'sub_webrtc_url': f'http://{cls.LOCALHOST}:{NetworkConfig.WEBRTC_PORT}/{NetworkConfig.STREAM_NAME}{NetworkConfig.SUB_STREAM_SUFFIX}/whep'
         }
 
 # Default to production network config
@@ -1,6 +1,17 @@
+import hashlib
+import itertools
 import json
+import re
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from messages import messages_pb2
+from messages import envelope, messages_pb2
+from .cameras import camera_registry
+from .commands import Command, command_tracker
+from .keyframes import keyframe_requests
+from .metrics import metrics_aggregator, rollup_point, save_rollups
+from .outbound import OutboundQueue
+from .snapshots import snapshot_cache
+from .viewers import viewer_poller, viewer_registry
 import logging
 
 logging.basicConfig(
@@ -9,21 +20,125 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__) 
 
+# Topics a socket can subscribe to. Per-camera topics are '<kind>:<camera_id>',
+# or '<kind>:*' for every camera; the others take no camera id.
+CAMERA_TOPICS = ('status', 'metrics')
+GLOBAL_TOPICS = ('commands', 'viewers')
+MAX_SUBSCRIPTIONS = 64
+GROUP_NAME = re.compile(r'^[a-zA-Z0-9\-_.]{1,90}$')
+
+
+def valid_topic(topic):
+    if not isinstance(topic, str):
+        return False
+    kind, _, camera_id = topic.partition(':')
+    return bool(camera_id) if kind in CAMERA_TOPICS else (kind in GLOBAL_TOPICS and topic == kind)
+
+
+def topic_group(topic):
+    """Channel layer group for a topic; names the layer does not accept (e.g. 'status:*') are hashed"""
+    name = topic.replace(':', '.')
+    if not GROUP_NAME.match(name):
+        name = hashlib.sha1(topic.encode()).hexdigest()
+    return f"topic.{name}"
+
+
 class CameraSettingsConsumer(AsyncWebsocketConsumer):
-    group_name = "camera_group"
+    """
+    /ws/camera/ for publishers and browsers alike.
+
+    Publishers and Django exchange protobuf Envelopes: publishers send
+    CameraStatus and CameraSettingsAck messages and receive
+    CameraSettingsCommands, and KeyframeRequests when a viewer joins; they
+    answer SnapshotRequests with a CameraSnapshot of their latest frame.
+    Browsers subscribe to topics and only receive messages for those, each
+    tagged with its topic; every topic is its own channel layer group, so a
+    broadcast costs one send per subscribed socket. Messages to browsers go
+    through an OutboundQueue, so a slow browser only delays itself.
+    """
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.is_pi_connection = False  # Track if this is Pi or browser
+        self.topics = set()  # Topics this connection is subscribed to
+        self.outbox = None  # Send queue (browsers only)
+        self.closing = False
+        self.camera_ids = set()  # Cameras reported over this connection (Pi only)
+        self.sequence = itertools.count(1)  # Envelopes sent to the Pi
+        self.received = envelope.SequenceTracker()  # Envelopes received from the Pi
+        self.watching = set()  # Viewer session ids registered by this connection (browsers only)
 
     async def connect(self):
         # Accept the WebSocket connection
         await self.accept()
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        client = self.scope.get('client') or ('', 0)
+        self.outbox = OutboundQueue(self.send_text, f"{client[0]}:{client[1]}")
+        self.outbox.start(self.channel_name)
+        if viewer_poller:
+            viewer_poller.ensure_started(self.publish_viewers, self.request_keyframes)
+        command_tracker.ensure_started(self.command_expired)
         log.info("WebSocket connected - Camera control ready")
                 
     async def disconnect(self, close_code):
         log.info(f"WebSocket disconnected with code: {close_code}")
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        if self.outbox:
+            self.outbox.stop(self.channel_name)
+        if self.camera_ids:
+            # Store what the departing publisher reported in the current minute
+            await self.publish_rollups(metrics_aggregator.flush(self.camera_ids), partial=False)
+        if self.watching:
+            for session_id in self.watching:
+                viewer_registry.leave('dashboard', session_id)
+            self.watching.clear()
+            await self.publish_viewers()
+        for topic in self.topics:
+            await self.channel_layer.group_discard(topic_group(topic), self.channel_name)
+        self.topics.clear()
+
+    async def send_text(self, text):
+        await self.send(text_data=text)
+
+    async def send_latest(self, key, message):
+        """Queue a browser message that supersedes any queued message with the same key"""
+        if self.outbox and not self.outbox.put_latest(key, json.dumps(message)):
+            await self.drop_saturated()
+
+    async def send_reliable(self, message):
+        """Queue a browser message that must not be dropped"""
+        if self.outbox and not self.outbox.put_reliable(json.dumps(message)):
+            await self.drop_saturated()
+
+    async def drop_saturated(self):
+        """Disconnect a browser that has not kept up; it reconnects and resyncs"""
+        if self.closing:
+            return
+        self.closing = True
+        log.warning(f"Disconnecting saturated viewer: {self.outbox.stats()}")
+        await self.close(code=1013)  # Try Again Later
+
+    async def subscribe(self, topics):
+        for topic in topics:
+            if topic in self.topics:
+                continue
+            if not valid_topic(topic) or len(self.topics) >= MAX_SUBSCRIPTIONS:
+                log.warning(f"Rejected subscription to {topic!r}")
+                continue
+            self.topics.add(topic)
+            await self.channel_layer.group_add(topic_group(topic), self.channel_name)
+
+    async def unsubscribe(self, topics):
+        for topic in topics:
+            if topic in self.topics:
+                self.topics.discard(topic)
+                await self.channel_layer.group_discard(topic_group(topic), self.channel_name)
+
+    async def publish(self, topic, event):
+        """Send event to the sockets subscribed to topic"""
+        await self.channel_layer.group_send(topic_group(topic), {**event, 'topic': topic})
+
+    async def publish_camera(self, kind, camera_id, event):
+        """Send a per-camera event to subscribers of that camera and of every camera"""
+        await self.publish(f"{kind}:{camera_id}", event)
+        await self.publish(f"{kind}:*", event)
 
 
     async def connection_status(self, event):
@@ -31,23 +146,38 @@ class CameraSettingsConsumer(AsyncWebsocketConsumer):
             return
 
         isConnected = event['isConnected']
-        await self.send(text_data=json.dumps({
+        await self.send_latest(f"{event['topic']}/connection_status", {
             'type': 'connection_status',
+            'topic': event['topic'],
             'isConnected': isConnected,
-        }))
+        })
 
     async def receive(self, text_data=None, bytes_data=None):
         # Handle protobuf messages from Pi
         if bytes_data:
             try:
-                # Mark this connection as coming from Pi
-                self.is_pi_connection = True
+                # Mark this connection as coming from Pi; publishers always take commands
+                if not self.is_pi_connection:
+                    self.is_pi_connection = True
+                    self.outbox.stop(self.channel_name)
+                    self.outbox = None
+                    await self.subscribe(['commands'])
 
-                cam_data = messages_pb2.CameraStatus()
-                cam_data.ParseFromString(bytes_data)
+                frame = envelope.unpack(bytes_data)
+                if self.received.check(frame.sequence):
+                    log.warning(f"Missed {self.received.lost} envelopes from camera '{frame.camera_id}' on this connection")
 
-                # Send camera status to ALL browser clients (but not back to Pi)
-                await self.broadcast_camera_status(cam_data)
+                for message in frame.messages:
+                    payload = message.WhichOneof('payload')
+                    if payload == 'status':
+                        # Send camera status to ALL browser clients (but not back to Pi)
+                        await self.broadcast_camera_status(message.status)
+                        await self.record_metrics(message.status)
+                    elif payload == 'ack':
+                        await self.handle_ack(message.ack)
+                    elif payload == 'snapshot':
+                        snapshot_cache.deliver(message.snapshot.camera_id, message.snapshot.jpeg,
+                                               message.snapshot.captured_at)
 
             except Exception as e:
                 log.error(f"Error parsing protobuf: {e}")
@@ -62,78 +192,311 @@ class CameraSettingsConsumer(AsyncWebsocketConsumer):
                     # Forward camera setting command to Pi only
                     setting = data.get('setting')
                     value = data.get('value')
-                    await self.send_setting_to_pi(setting, value)
+                    camera_id = data.get('camera_id', '')
+                    await self.send_setting_to_pi(setting, value, camera_id, data.get('request_id'))
+
+                elif message_type == 'subscribe':
+                    await self.subscribe(data.get('topics', []))
+
+                elif message_type == 'unsubscribe':
+                    await self.unsubscribe(data.get('topics', []))
+
+                elif message_type in ('watch', 'unwatch'):
+                    await self.update_watching(message_type, data.get('view', ''), data.get('stream', ''))
 
             except Exception as e:
                 log.error(f"Error handling JSON message: {e}")
 
         
     async def broadcast_camera_status(self, cam_data):
-        """Broadcast camera status to all browser clients via channel layer"""
-        await self.channel_layer.group_send(
-            self.group_name,
+        """Broadcast camera status to browsers subscribed to the camera's status topic"""
+        await self.publish_camera(
+            'status',
+            cam_data.camera_id,
             {
                 'type': 'camera_status_update',
+                'camera_id': cam_data.camera_id,
                 'isConnected': cam_data.isConnected,
                 'brightness': cam_data.brightness,
+                'contrast': cam_data.contrast,
+                'exposure': cam_data.exposure,
+                'gain': cam_data.gain,
+                'white_balance': cam_data.white_balance,
                 'fps': cam_data.fps,
+                'jitter_ms': cam_data.jitter_ms,
+                'frames_dropped': cam_data.frames_dropped,
+                'frames_duplicated': cam_data.frames_duplicated,
+            }
+        )
+
+    async def record_metrics(self, cam_data):
+        """Fold a status sample into the per-minute rollups, storing and pushing closed buckets"""
+        if cam_data.camera_id not in self.camera_ids:
+            self.camera_ids.add(cam_data.camera_id)
+            if cam_data.camera_id not in await camera_registry.aload():
+                log.warning(f"Camera '{cam_data.camera_id}' is not in the camera registry; add it to stream it from the dashboard")
+        closed, partial = metrics_aggregator.add(cam_data.camera_id, cam_data)
+        if closed:
+            await self.publish_rollups(closed, partial=False)
+        if partial:
+            await self.publish_rollups([partial], partial=True)
+
+    async def publish_rollups(self, rows, partial):
+        if not rows:
+            return
+        if not partial:
+            try:
+                await database_sync_to_async(save_rollups)(rows)
+            except Exception as e:
+                log.error(f"Error saving metrics rollups: {e}")
+        for row in rows:
+            await self.publish_camera(
+                'metrics',
+                row.camera_id,
+                {
+                    'type': 'metrics_update',
+                    'camera_id': row.camera_id,
+                    'point': rollup_point(row),
+                    'partial': partial,
+                }
+            )
+
+    async def metrics_update(self, event):
+        """Handler for metrics_update group messages - pushes one rollup point to browsers"""
+        if not self.is_pi_connection:
+            # Keyed by bucket and source: a queued preview is replaced by a newer one or by the closed point,
+            # while publisher and receiver points for one bucket carry different series and both go out
+            key = f"{event['topic']}/metrics/{event['camera_id']}/{event['point']['t']}/{event.get('source', 'publisher')}"
+            await self.send_latest(key, {
+                'type': 'metrics',
+                'topic': event['topic'],
+                'camera_id': event['camera_id'],
+                'point': event['point'],
+                # A partial point previews the open bucket and is replaced by later pushes
+                'partial': event['partial'],
+            })
+
+    async def update_watching(self, action, view, stream):
+        """Register or drop one player (view) on this socket as a viewer of stream"""
+        session_id = f"{self.channel_name}/{view}"
+        if action == 'watch' and stream:
+            self.watching.add(session_id)
+            changed = viewer_registry.join('dashboard', session_id, stream)
+            if changed:
+                await self.request_keyframes([stream])
+        else:
+            self.watching.discard(session_id)
+            changed = viewer_registry.leave('dashboard', session_id)
+        if changed:
+            await self.publish_viewers()
+
+    async def request_keyframes(self, streams):
+        """Ask the publishers of streams that just gained a viewer for an IDR"""
+        for camera_id, rendition in keyframe_requests.due(await camera_registry.aload(), streams):
+            await self.publish(
+                'commands',
+                {
+                    'type': 'forward_keyframe_request',
+                    'camera_id': camera_id,
+                    'rendition': rendition,
+                }
+            )
+
+    async def forward_keyframe_request(self, event):
+        """Handler for forward_keyframe_request - sends a KeyframeRequest to publishers; browsers ignore it"""
+        if self.is_pi_connection:
+            request = messages_pb2.KeyframeRequest(camera_id=event['camera_id'], rendition=event['rendition'])
+            frame = envelope.pack(event['camera_id'], next(self.sequence), [messages_pb2.ControlMessage(keyframe=request)])
+            await self.send(bytes_data=frame)
+
+    async def forward_snapshot_request(self, event):
+        """Handler for forward_snapshot_request - asks publishers for their latest frame; browsers ignore it"""
+        if self.is_pi_connection:
+            request = messages_pb2.SnapshotRequest(camera_id=event['camera_id'], width=event['width'])
+            frame = envelope.pack(event['camera_id'], next(self.sequence), [messages_pb2.ControlMessage(snapshot_request=request)])
+            await self.send(bytes_data=frame)
+
+    async def publish_viewers(self, snapshot=None):
+        await self.publish(
+            'viewers',
+            {
+                'type': 'viewer_update',
+                'snapshot': snapshot or viewer_registry.snapshot(),
             }
         )
 
+    async def viewer_update(self, event):
+        """Handler for viewer_update group messages - pushes viewer counts and egress to browsers"""
+        if not self.is_pi_connection:
+            await self.send_latest(f"{event['topic']}/viewers", {'type': 'viewers', 'topic': event['topic'], **event['snapshot']})
+
     async def camera_status_update(self, event):
         """Handler for camera_status_update group messages - sends JSON to browser"""
         # Only send to browser clients, not to Pi
         if not self.is_pi_connection:
-            # Send camera status with FPS
-            await self.send(text_data=json.dumps({
+            # Send camera status with FPS; only the newest status per camera matters
+            await self.send_latest(f"{event['topic']}/camera_status/{event['camera_id']}", {
                 'type': 'camera_status',
+                'topic': event['topic'],
+                'camera_id': event['camera_id'],
                 'isConnected': event['isConnected'],
                 'brightness': event['brightness'],
+                'contrast': event['contrast'],
+                'exposure': event['exposure'],
+                'gain': event['gain'],
+                'white_balance': event['white_balance'],
                 'fps': event['fps'],
-            }))
+                'jitter_ms': event['jitter_ms'],
+                'frames_dropped': event['frames_dropped'],
+                'frames_duplicated': event['frames_duplicated'],
+            })
 
             # Also send connection_status for backward compatibility
-            await self.send(text_data=json.dumps({
+            await self.send_latest(f"{event['topic']}/connection_status", {
                 'type': 'connection_status',
+                'topic': event['topic'],
                 'isConnected': event['isConnected'],
-            }))
+            })
+
+    async def send_setting_to_pi(self, setting: str, value: int, camera_id: str = '', request_id=None):
+        """Send camera setting command to Pi via channel layer, or queue it behind one already in flight"""
+        # An empty camera_id means the registry's default camera; the command then names it
+        # explicitly, so no other Pi applies it and tracking is keyed by the real camera
+        cameras = await camera_registry.aload()
+        camera = cameras.get(camera_id) if camera_id else next(iter(cameras.values()), None)
+        if camera:
+            camera_id = camera['camera_id']
+        command = Command(camera_id, setting, value, self.channel_name, request_id)
+        if camera and camera['controls'] and setting not in camera['controls']:
+            log.warning(f"Camera '{camera['camera_id']}' has no '{setting}' control; command dropped")
+            await self.answer_command(command, 'rejected')
+            return
 
-    async def send_setting_to_pi(self, setting: str, value: int):
-        """Send camera setting command to Pi via channel layer"""
+        command, replaced = command_tracker.submit(command)
+        if replaced:
+            await self.answer_command(replaced, 'superseded')
+        if command:
+            await self.dispatch_command(command)
+
+    async def dispatch_command(self, command):
         try:
-            # Broadcast to all connections
-            await self.channel_layer.group_send(
-                self.group_name,
+            # Publishers and browsers subscribed to 'commands'
+            await self.publish(
+                'commands',
                 {
                     'type': 'forward_setting_to_pi',
-                    'setting': setting,
-                    'value': value,
+                    'setting': command.setting,
+                    'value': command.value,
+                    'camera_id': command.camera_id,
+                    'request_id': command.request_id,
+                    'origin': command.origin,
                 }
             )
-            log.info(f"Broadcasting setting command: {setting} = {value}")
+            log.info(f"Broadcasting setting command #{command.request_id}: {command.setting} = {command.value} (camera '{command.camera_id}')")
 
         except Exception as e:
             log.error(f"Error sending setting to Pi: {e}")
 
     async def forward_setting_to_pi(self, event):
-        """Handler for forward_setting_to_pi - sends protobuf to Pi only"""
-        # Only send to Pi connection, not to browsers
+        """Handler for forward_setting_to_pi - sends protobuf to Pi, JSON to other subscribed browsers"""
         if self.is_pi_connection:
             try:
                 cmd = messages_pb2.CameraSettingsCommand()
                 cmd.setting = event['setting']
                 cmd.value = event['value']
+                cmd.camera_id = event.get('camera_id', '')
+                cmd.request_id = event.get('request_id', 0)
 
-                await self.send(bytes_data=cmd.SerializeToString())
+                frame = envelope.pack(cmd.camera_id, next(self.sequence), [messages_pb2.ControlMessage(command=cmd)])
+                await self.send(bytes_data=frame)
                 log.info(f"Forwarded to Pi: {event['setting']} = {event['value']}")
 
             except Exception as e:
                 log.error(f"Error forwarding to Pi: {e}")
 
+        elif event.get('origin') != self.channel_name:
+            # Other tabs see the change before the Pi reports it back
+            await self.send_reliable({
+                'type': 'camera_setting',
+                'topic': event['topic'],
+                'setting': event['setting'],
+                'value': event['value'],
+                'camera_id': event['camera_id'],
+            })
+
+    async def handle_ack(self, ack):
+        """Answer the command a publisher acknowledged and forward any that waited on it"""
+        command, rtt_ms, following = command_tracker.ack(ack.request_id, ack.applied)
+        if command is None:
+            return  # already timed out, or sent before a server restart
+        log.info(f"Ack #{ack.request_id}: {ack.setting} requested={ack.requested} actual={ack.actual} ({rtt_ms:.0f} ms)")
+        await self.answer_command(command, 'applied' if ack.applied else 'failed', ack.actual, rtt_ms)
+        if following:
+            await self.dispatch_command(following)
+
+    async def command_expired(self, command, following):
+        """Called by the command tracker for a command the publisher never acknowledged"""
+        log.warning(f"No ack for setting command #{command.request_id} ({command.setting} = {command.value})")
+        await self.answer_command(command, 'timeout')
+        if following:
+            await self.dispatch_command(following)
+
+    async def answer_command(self, command, status, actual=None, rtt_ms=None):
+        """
+        Tell the requesting socket how its command ended, and the other
+        'commands' subscribers which value the camera actually took
+        """
+        event = {
+            'type': 'camera_setting_ack',
+            'topic': 'commands',
+            'status': status,  # applied, failed, rejected, superseded or timeout
+            'setting': command.setting,
+            'value': command.value,
+            'actual': actual,
+            'camera_id': command.camera_id,
+            'request_id': command.client_request_id,
+            'latency_ms': None if rtt_ms is None else round(rtt_ms, 1),
+            'origin': command.origin,
+        }
+        try:
+            await self.channel_layer.send(command.origin, {**event, 'direct': True})
+            if actual is not None:
+                await self.publish('commands', event)
+        except Exception as e:
+            log.error(f"Error sending setting ack: {e}")
+
+    async def camera_setting_ack(self, event):
+        """Handler for camera_setting_ack - reconciles browser sliders with the value the camera took"""
+        if self.is_pi_connection:
+            return
+        if event.get('direct'):
+            # The requesting tab gets the full outcome of its own command
+            await self.send_reliable({
+                'type': 'camera_setting_ack',
+                'topic': event['topic'],
+                'status': event['status'],
+                'setting': event['setting'],
+                'value': event['value'],
+                'actual': event['actual'],
+                'camera_id': event['camera_id'],
+                'request_id': event['request_id'],
+                'latency_ms': event['latency_ms'],
+            })
+        elif event['origin'] != self.channel_name:
+            # Other tabs only learn the resulting value
+            await self.send_latest(f"{event['topic']}/camera_setting_ack/{event['camera_id']}/{event['setting']}", {
+                'type': 'camera_setting_ack',
+                'topic': event['topic'],
+                'status': event['status'],
+                'setting': event['setting'],
+                'actual': event['actual'],
+                'camera_id': event['camera_id'],
+            })
+
     async def send_connection_status(self, connected: bool):
         """Send connection status to dashboard"""
-        await self.channel_layer.group_send(
-            self.group_name,
+        await self.publish(
+            'status:*',
             {
                 'type': 'connection_status',
                 'isConnected': connected,
@@ -0,0 +1,40 @@
+"""
+Keyframe-on-demand requests to publishers.
+
+Publishers that encode in-process use a long GOP, so a viewer joining
+mid-GOP would wait up to KeyframeConfig.GOP_SECONDS for its first decodable
+frame. Whenever a stream gains a viewer (a dashboard tile announces it, or a
+new MediaMTX reader session shows up, such as a reconnecting receiver) its
+publisher is asked for an IDR right away. Requests for the same rendition
+closer together than REQUEST_MIN_INTERVAL are merged, so a grid of tiles
+joining at once costs one IDR.
+"""
+import threading
+import time
+
+from .cameras import stream_rendition
+from .config import KeyframeConfig
+
+
+class KeyframeRequests:
+    """Decides which viewer joins are worth an IDR"""
+    def __init__(self, min_interval=None):
+        self.min_interval = min_interval or KeyframeConfig.REQUEST_MIN_INTERVAL
+        self.lock = threading.Lock()
+        self.requested = {}  # (camera_id, rendition) -> monotonic time of the last request
+
+    def due(self, cameras, streams):
+        """The (camera_id, rendition) pairs to request an IDR for, given the streams that just gained viewers"""
+        now = time.monotonic()
+        targets = []
+        with self.lock:
+            for stream in streams:
+                target = stream_rendition(cameras, stream)
+                if target is None or now - self.requested.get(target, float('-inf')) < self.min_interval:
+                    continue
+                self.requested[target] = now
+                targets.append(target)
+        return targets
+
+
+keyframe_requests = KeyframeRequests()
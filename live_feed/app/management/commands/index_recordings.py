@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.config import RecordingConfig
+from app.recordings import index_recordings
+
+
+class Command(BaseCommand):
+    help = "Index recorded segment files into the database (only new or changed files are probed)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', default=None,
+                            help=f"Recordings directory (default: {RecordingConfig.RECORDINGS_ROOT})")
+        parser.add_argument('--watch', type=float, default=0,
+                            help="Re-index every N seconds instead of exiting")
+
+    def handle(self, *args, **options):
+        while True:
+            counts = index_recordings(options['root'])
+            self.stdout.write(f"added {counts['added']}, updated {counts['updated']}, removed {counts['removed']}")
+            if not options['watch']:
+                break
+            time.sleep(options['watch'])
@@ -0,0 +1,52 @@
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.cameras import camera_registry
+from app.config import RecordingConfig
+from app.recordings import SegmentRecorder, index_recordings
+
+
+class Command(BaseCommand):
+    help = "Record camera streams into time-named MPEG-TS segments and index them as they complete"
+
+    def add_arguments(self, parser):
+        parser.add_argument('cameras', nargs='*', metavar='CAMERA[=RTSP_URL]',
+                            help="Registered camera to record, or any camera id with its RTSP URL "
+                                 "(default: every registered camera)")
+        parser.add_argument('--root', default=None,
+                            help=f"Recordings directory (default: {RecordingConfig.RECORDINGS_ROOT})")
+        parser.add_argument('--segment-seconds', type=int, default=RecordingConfig.SEGMENT_SECONDS,
+                            help="Target segment length; segments are cut at the next keyframe")
+
+    def handle(self, *args, **options):
+        recorders = []
+        for spec in options['cameras'] or list(camera_registry.load()):
+            camera_id, _, url = spec.partition('=')
+            if not camera_id:
+                raise CommandError(f"Invalid camera spec: {spec}")
+            if not url:
+                camera = camera_registry.get(camera_id)
+                if camera is None:
+                    raise CommandError(f"Camera '{camera_id}' is not registered; pass {camera_id}=RTSP_URL")
+                url = camera['rtsp_url']
+            recorders.append(SegmentRecorder(camera_id, url, options['root'], options['segment_seconds']))
+        if not recorders:
+            raise CommandError("No cameras registered")
+
+        # One full pass to pick up anything written while no recorder ran; from here on
+        # each recorder indexes just the segments it finishes
+        index_recordings(options['root'])
+
+        threads = [threading.Thread(target=recorder.run, daemon=True) for recorder in recorders]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping recorders...")
+            for recorder in recorders:
+                recorder.stop()
+            for thread in threads:
+                thread.join(timeout=5)
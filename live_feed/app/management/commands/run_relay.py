@@ -0,0 +1,43 @@
+import shutil
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.cameras import camera_registry
+from app.config import RelayConfig
+from app.relay import RelayServer
+
+
+class Command(BaseCommand):
+    help = "Run the server-side MediaMTX relay that pulls each camera stream from its Pi once for every viewer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--config', default=None,
+                            help=f"Generated MediaMTX config (default: {RelayConfig.CONFIG_PATH})")
+        parser.add_argument('--mediamtx', default=RelayConfig.MEDIAMTX_PATH,
+                            help="MediaMTX executable")
+        parser.add_argument('--write-config', action='store_true',
+                            help="Write the config and exit, for a MediaMTX run by a service manager; "
+                                 "rerun after changing cameras")
+
+    def handle(self, *args, **options):
+        relay = RelayServer(options['config'], options['mediamtx'])
+        if not camera_registry.all():
+            raise CommandError("No cameras registered")
+        if options['write_config']:
+            relay.write_config()
+            self.stdout.write(f"Wrote {relay.config_path}")
+            return
+        if shutil.which(relay.mediamtx_path) is None:
+            raise CommandError(f"MediaMTX not found: {relay.mediamtx_path}")
+        if not RelayConfig.ENABLED:
+            self.stderr.write("RelayConfig.ENABLED is off: viewers keep reading from the Pis until it is turned on")
+
+        thread = threading.Thread(target=relay.run, daemon=True)
+        thread.start()
+        try:
+            thread.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping relay...")
+            relay.stop()
+            thread.join(timeout=5)
@@ -0,0 +1,374 @@
+"""
+Per-minute rollups of the stream metrics cameras report over /ws/camera/.
+
+Publishers send a CameraStatus with every frame. MetricsAggregator folds those
+samples into one in-memory bucket per camera and MetricsConfig.ROLLUP_SECONDS;
+closed buckets are written as MetricsRollup rows, so readers only ever touch
+pre-aggregated data.
+
+Receivers upload batches of their own samples to /api/metrics/receiver/.
+Those are stored as StreamMetrics rows and folded into the receiver columns
+of the same buckets, so publisher and receiver series line up per minute.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+from itertools import groupby
+
+from django.db import connection
+from django.db.models import Avg, Max
+
+from .config import MetricsConfig, ReceiverMetricsConfig
+from .models import MetricsRollup, StreamMetrics
+
+# API/WebSocket series name -> MetricsRollup column, for the series publishers report
+SERIES_FIELDS = {
+    'fps': 'fps_avg',
+    'fps_min': 'fps_min',
+    'latency_ms': 'latency_avg',
+    'latency_max_ms': 'latency_max',
+    'jitter_ms': 'jitter_avg',
+    'dropped': 'frames_dropped',
+    'duplicated': 'frames_duplicated',
+    'cpu': 'cpu_avg',
+    'bitrate_kbps': 'bitrate_avg',
+}
+
+# ... and for the series receivers report
+RECEIVER_SERIES_FIELDS = {
+    'receiver_fps': 'receiver_fps_avg',
+    'receiver_latency_ms': 'receiver_latency_avg',
+    'receiver_latency_max_ms': 'receiver_latency_max',
+}
+
+QUERY_FIELDS = {**SERIES_FIELDS, **RECEIVER_SERIES_FIELDS}
+
+
+DAY = 24 * 3600
+
+
+def bucket_start(timestamp):
+    return int(timestamp // MetricsConfig.ROLLUP_SECONDS * MetricsConfig.ROLLUP_SECONDS)
+
+
+class RollupBucket:
+    """Running sums for one camera over one rollup interval"""
+    __slots__ = ('camera_id', 'bucket', 'samples', 'fps_sum', 'fps_min', 'latency_sum', 'latency_max',
+                 'jitter_sum', 'cpu_sum', 'bitrate_sum', 'dropped', 'duplicated')
+
+    def __init__(self, camera_id, bucket):
+        self.camera_id = camera_id
+        self.bucket = bucket
+        self.samples = 0
+        self.fps_sum = self.latency_sum = self.jitter_sum = self.cpu_sum = self.bitrate_sum = 0.0
+        self.fps_min = float('inf')
+        self.latency_max = 0.0
+        self.dropped = self.duplicated = 0
+
+    def add(self, status, dropped, duplicated):
+        self.samples += 1
+        self.fps_sum += status.fps
+        self.fps_min = min(self.fps_min, status.fps)
+        self.latency_sum += status.latency_ms
+        self.latency_max = max(self.latency_max, status.latency_ms)
+        self.jitter_sum += status.jitter_ms
+        self.cpu_sum += status.cpu_percent
+        self.bitrate_sum += status.bitrate_kbps
+        self.dropped += dropped
+        self.duplicated += duplicated
+
+    def row(self):
+        # Rounded once here so reads can serialize stored values as they are
+        n = self.samples or 1
+        return MetricsRollup(
+            camera_id=self.camera_id,
+            bucket=self.bucket,
+            samples=self.samples,
+            fps_avg=round(self.fps_sum / n, 2),
+            fps_min=round(self.fps_min, 2) if self.samples else 0.0,
+            latency_avg=round(self.latency_sum / n, 2),
+            latency_max=round(self.latency_max, 2),
+            jitter_avg=round(self.jitter_sum / n, 2),
+            frames_dropped=self.dropped,
+            frames_duplicated=self.duplicated,
+            cpu_avg=round(self.cpu_sum / n, 1),
+            bitrate_avg=round(self.bitrate_sum / n, 1),
+        )
+
+
+def rollup_point(row, fields=SERIES_FIELDS):
+    """JSON point for a MetricsRollup, as pushed over the WebSocket; carries only the given series"""
+    point = {name: getattr(row, field) for name, field in fields.items()}
+    point['t'] = row.bucket
+    return point
+
+
+class MetricsAggregator:
+    """
+    Folds per-frame CameraStatus samples into per-camera rollup buckets.
+
+    add() returns the buckets that closed (ready to store) and, at most every
+    LIVE_PUSH_INTERVAL seconds per camera, the still-open bucket as a preview.
+    The pacing counters in CameraStatus are cumulative; they are turned into
+    per-bucket deltas here, treating a decrease as a publisher restart.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}      # camera_id -> RollupBucket
+        self.counters = {}     # camera_id -> (frames_dropped, frames_duplicated) last seen
+        self.last_push = {}    # camera_id -> monotonic time of last partial push
+
+    def add(self, camera_id, status, now=None):
+        now = time.time() if now is None else now
+        start = bucket_start(now)
+        with self.lock:
+            closed = self.close_before(start)
+
+            last_dropped, last_duplicated = self.counters.get(camera_id, (status.frames_dropped, status.frames_duplicated))
+            dropped = status.frames_dropped - last_dropped
+            duplicated = status.frames_duplicated - last_duplicated
+            self.counters[camera_id] = (status.frames_dropped, status.frames_duplicated)
+
+            bucket = self.buckets.get(camera_id)
+            if bucket is None:
+                bucket = self.buckets[camera_id] = RollupBucket(camera_id, start)
+            bucket.add(status,
+                       dropped if dropped >= 0 else status.frames_dropped,
+                       duplicated if duplicated >= 0 else status.frames_duplicated)
+
+            partial = None
+            tick = time.monotonic()
+            if tick - self.last_push.get(camera_id, 0) >= MetricsConfig.LIVE_PUSH_INTERVAL:
+                self.last_push[camera_id] = tick
+                partial = bucket.row()
+        return closed, partial
+
+    def close_before(self, start):
+        """Remove and return rows for every bucket that began before start"""
+        closed = [bucket.row() for bucket in self.buckets.values() if bucket.bucket < start]
+        for row in closed:
+            del self.buckets[row.camera_id]
+        return closed
+
+    def flush(self, camera_ids=None):
+        """Close the open buckets for camera_ids (all cameras if None), e.g. when a publisher disconnects"""
+        with self.lock:
+            ids = list(self.buckets) if camera_ids is None else [c for c in camera_ids if c in self.buckets]
+            rows = [self.buckets.pop(camera_id).row() for camera_id in ids]
+            for camera_id in ids:
+                self.counters.pop(camera_id, None)
+        return rows
+
+
+def save_rollups(rows):
+    """Store closed buckets; a bucket reopened after a restart replaces the stored one"""
+    MetricsRollup.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['camera_id', 'bucket'],
+        update_fields=['samples', *SERIES_FIELDS.values()],
+    )
+    # The first bucket of a day is the last one of the day before's window, which it completes:
+    # drop any copy a query cached just ahead of it, then warm (also once per process)
+    completed = {row.bucket - DAY for row in rows if row.bucket % DAY == 0}
+    if completed:
+        block_cache.evict(completed)
+    if completed or block_warmer is None:
+        start_warming()
+
+
+def save_receiver_samples(camera_id, samples):
+    """
+    Store a receiver's batch of (epoch ms, fps, latency ms, frame number)
+    samples and refold the rollup buckets it touches.
+
+    Each touched bucket is recomputed from every receiver sample stored for
+    it, so batches that arrive late, out of order or from several receivers
+    of one camera all end up in the same averages. Only the receiver columns
+    of a rollup are written; the publisher's belong to save_rollups().
+    Cached days holding a refolded bucket are evicted from block_cache.
+    Returns the refolded rows.
+    """
+    StreamMetrics.objects.bulk_create([
+        StreamMetrics(
+            camera_id=camera_id,
+            component='receiver',
+            timestamp=datetime.fromtimestamp(t / 1000, dt_timezone.utc),
+            timestamp_ms=t,
+            receiver_fps=fps,
+            latency_ms=latency_ms,
+            frame_number=frame_number,
+        )
+        for t, fps, latency_ms, frame_number in samples
+    ])
+
+    rows = []
+    for bucket in sorted({bucket_start(t / 1000) for t, *_ in samples}):
+        stats = StreamMetrics.objects.filter(
+            camera_id=camera_id, component='receiver',
+            timestamp_ms__gte=bucket * 1000, timestamp_ms__lt=(bucket + MetricsConfig.ROLLUP_SECONDS) * 1000,
+        ).aggregate(fps=Avg('receiver_fps'), latency=Avg('latency_ms'), latency_max=Max('latency_ms'))
+        rows.append(MetricsRollup(
+            camera_id=camera_id,
+            bucket=bucket,
+            receiver_fps_avg=round(stats['fps'], 2),
+            receiver_latency_avg=round(stats['latency'], 2),
+            receiver_latency_max=round(stats['latency_max'], 2),
+        ))
+    MetricsRollup.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['camera_id', 'bucket'],
+        update_fields=list(RECEIVER_SERIES_FIELDS.values()),
+    )
+    # Cached days hold since < bucket <= since + DAY, so key them the same way
+    block_cache.evict({(row.bucket - 1) // DAY * DAY for row in rows})
+
+    # Raw samples are only kept for refolding late batches
+    cutoff = (time.time() - ReceiverMetricsConfig.SAMPLE_RETENTION) * 1000
+    StreamMetrics.objects.filter(camera_id=camera_id, component='receiver', timestamp_ms__lt=cutoff).delete()
+    return rows
+
+
+def fetch_columns(since, until, camera_id, names):
+    """
+    Rollups with since < bucket <= until as serialized columns per camera.
+
+    Returns {camera_id: ({'t': '[...]', 'fps': '[...]', ...}, last bucket)}.
+    Fetch cost grows with rows x columns, so only the requested series are
+    selected; rows are read in (camera_id, bucket) order, which is the unique
+    index, and transposed with zip() without building model instances.
+    """
+    rows = MetricsRollup.objects.filter(bucket__gt=since)
+    if until is not None:
+        rows = rows.filter(bucket__lte=until)
+    if camera_id:
+        rows = rows.filter(camera_id=camera_id)
+    rows = rows.order_by('camera_id', 'bucket').values_list(
+        'camera_id', 'bucket', *(QUERY_FIELDS[name] for name in names))
+
+    cameras = {}
+    for camera, camera_rows in groupby(rows.iterator(chunk_size=5000), key=lambda row: row[0]):
+        columns = list(zip(*camera_rows))[1:]
+        serialized = {name: json.dumps(column, separators=(',', ':')) for name, column in zip(['t', *names], columns)}
+        cameras[camera] = (serialized, columns[0][-1])
+    return cameras
+
+
+def column_block(columns, names):
+    """JSON block '{"t":[...],"fps":[...],...}' from serialized columns, carrying only the given series"""
+    return '{' + ','.join(f'"{name}":{columns[name]}' for name in ['t', *names]) + '}'
+
+
+class BlockCache:
+    """
+    Serialized columns of every series and camera for whole past days, keyed
+    by day start, least recently used evicted.
+
+    A day is only cached once every bucket in it has closed. Its publisher
+    columns are final from then on, but late receiver batches can refold
+    buckets up to ReceiverMetricsConfig.SAMPLE_RETENTION back, so
+    save_receiver_samples() evicts the days it touches. A load that overlaps
+    an eviction is returned but not kept, as it may predate the refold.
+    """
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, load):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            generation = self.generation
+        value = load()
+        with self.lock:
+            if generation == self.generation:
+                self.entries[key] = value
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return value
+
+    def evict(self, days):
+        """Drop the entries for the given day starts"""
+        with self.lock:
+            self.generation += 1
+            for day in days:
+                self.entries.pop(day, None)
+
+
+block_cache = BlockCache()
+block_warmer = None
+
+
+def load_day(day):
+    """Every series of every camera for the UTC day starting at day, through block_cache"""
+    return block_cache.get(day, lambda: fetch_columns(day, day + DAY, None, list(QUERY_FIELDS)))
+
+
+def warm_days():
+    """Load every final day a query may reach, newest first, so no query pays for reading it"""
+    try:
+        final = bucket_start(time.time())
+        oldest = (final - MetricsConfig.MAX_WINDOW) // DAY * DAY + DAY
+        day = (final - 1) // DAY * DAY - DAY
+        while day >= oldest:
+            load_day(day)
+            day -= DAY
+    finally:
+        connection.close()
+
+
+def start_warming():
+    """Warm block_cache on a background thread, unless a warm-up is already running"""
+    global block_warmer
+    if block_warmer is None or not block_warmer.is_alive():
+        block_warmer = threading.Thread(target=warm_days, daemon=True)
+        block_warmer.start()
+
+
+def query_series(since, until=None, camera_id=None, names=None):
+    """
+    Rollups with bucket > since, as JSON '{"<camera_id>": [block, ...], ...}'.
+
+    The range is split on UTC day boundaries. Complete past days come from
+    block_cache, which start_warming() fills ahead of time, so a 30-day
+    query only reads the database for its partial first and last days.
+    Returns (json, last bucket or None).
+    """
+    names = [name for name in (names or QUERY_FIELDS) if name in QUERY_FIELDS]
+    # Buckets before the current one have closed; a day whose last bucket has closed is final
+    final = bucket_start(time.time())
+    end = until if until is not None else final + MetricsConfig.ROLLUP_SECONDS
+
+    windows = []
+    lo = since
+    while lo < end:
+        hi = min((lo // DAY + 1) * DAY, end)
+        windows.append((lo, hi))
+        lo = hi
+    if until is None and windows:
+        windows[-1] = (windows[-1][0], None)
+
+    series = {}
+    last = None
+    for lo, hi in windows:
+        if hi is not None and lo % DAY == 0 and hi - lo == DAY and hi < final:
+            cameras = load_day(lo)
+            if camera_id:
+                cameras = {camera_id: cameras[camera_id]} if camera_id in cameras else {}
+        else:
+            cameras = fetch_columns(lo, hi, camera_id, names)
+        for camera, (columns, camera_last) in cameras.items():
+            series.setdefault(camera, []).append(column_block(columns, names))
+            last = max(last or 0, camera_last)
+
+    body = ','.join(f'{json.dumps(camera)}:[{",".join(blocks)}]' for camera, blocks in series.items())
+    return f'{{{body}}}', last
+
+
+metrics_aggregator = MetricsAggregator()
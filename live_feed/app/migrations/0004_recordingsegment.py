@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_streammetrics_component_streammetrics_timestamp_ms_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordingSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('camera_id', models.CharField(max_length=100)),
+                ('path', models.CharField(max_length=500, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('mtime', models.FloatField(default=0)),
+                ('duration', models.FloatField(default=0)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-start_time', '-id'],
+                'indexes': [models.Index(fields=['start_time', 'id'], name='app_recordi_start_t_ffc704_idx'), models.Index(fields=['camera_id', 'start_time'], name='app_recordi_camera__361d40_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_recordingsegment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recordingsegment',
+            name='keyframes',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
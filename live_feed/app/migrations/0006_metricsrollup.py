@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_recordingsegment_keyframes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('camera_id', models.CharField(max_length=100)),
+                ('bucket', models.BigIntegerField()),
+                ('samples', models.IntegerField(default=0)),
+                ('fps_avg', models.FloatField(default=0)),
+                ('fps_min', models.FloatField(default=0)),
+                ('latency_avg', models.FloatField(default=0)),
+                ('latency_max', models.FloatField(default=0)),
+                ('jitter_avg', models.FloatField(default=0)),
+                ('frames_dropped', models.IntegerField(default=0)),
+                ('frames_duplicated', models.IntegerField(default=0)),
+                ('cpu_avg', models.FloatField(default=0)),
+                ('bitrate_avg', models.FloatField(default=0)),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'indexes': [models.Index(fields=['bucket'], name='app_metrics_bucket_a31e61_idx')],
+                'constraints': [models.UniqueConstraint(fields=('camera_id', 'bucket'), name='unique_metrics_rollup_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:09
+
+from django.db import migrations, models
+
+from app.config import NetworkConfig
+
+
+def seed_default_camera(apps, schema_editor):
+    """Register the camera NetworkConfig used to hardcode, so existing setups keep working"""
+    Camera = apps.get_model('app', 'Camera')
+    Camera.objects.get_or_create(
+        camera_id=NetworkConfig.STREAM_NAME,
+        defaults={
+            'name': 'Camera 1',
+            'host': NetworkConfig.PI_VPN_IP,
+            'stream_path': NetworkConfig.STREAM_NAME,
+            'sub_stream_path': f'{NetworkConfig.STREAM_NAME}{NetworkConfig.SUB_STREAM_SUFFIX}',
+            'capabilities': {
+                'audio': NetworkConfig.HAS_AUDIO,
+                'controls': ['brightness', 'contrast', 'exposure', 'gain', 'white_balance'],
+            },
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_metricsrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Camera',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('camera_id', models.CharField(max_length=100, unique=True)),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('host', models.CharField(max_length=255)),
+                ('rtsp_port', models.PositiveIntegerField(default=8554)),
+                ('webrtc_port', models.PositiveIntegerField(default=8889)),
+                ('api_port', models.PositiveIntegerField(default=9997)),
+                ('stream_path', models.CharField(blank=True, max_length=200)),
+                ('sub_stream_path', models.CharField(blank=True, max_length=200)),
+                ('capabilities', models.JSONField(blank=True, default=dict)),
+                ('enabled', models.BooleanField(default=True)),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['position', 'camera_id'],
+            },
+        ),
+        migrations.RunPython(seed_default_camera, migrations.RunPython.noop),
+    ]
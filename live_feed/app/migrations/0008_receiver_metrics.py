@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_camera'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metricsrollup',
+            name='receiver_fps_avg',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='metricsrollup',
+            name='receiver_latency_avg',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='metricsrollup',
+            name='receiver_latency_max',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='streammetrics',
+            name='camera_id',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='streammetrics',
+            index=models.Index(fields=['camera_id', 'component', 'timestamp_ms'], name='app_streamm_camera__95c5f8_idx'),
+        ),
+    ]
@@ -1,2 +1,98 @@
-# Models for the live feed application
-# Currently using standalone publisher/receiver, so no models needed
\ No newline at end of file
+from django.db import models
+from django.utils import timezone
+
+from .config import NetworkConfig
+
+
+class StreamMetrics(models.Model):
+    """Point-in-time performance sample reported by the publisher or receiver"""
+    timestamp = models.DateTimeField(default=timezone.now)
+    timestamp_ms = models.BigIntegerField(default=0)
+    camera_id = models.CharField(max_length=100, blank=True, default='')
+    component = models.CharField(max_length=50, default='publisher')
+    publisher_fps = models.FloatField(default=0)
+    receiver_fps = models.FloatField(default=0)
+    latency_ms = models.FloatField(default=0)
+    frame_number = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['camera_id', 'component', 'timestamp_ms']),
+        ]
+
+
+class MetricsRollup(models.Model):
+    """Per-camera stream metrics aggregated over one MetricsConfig.ROLLUP_SECONDS bucket"""
+    camera_id = models.CharField(max_length=100)
+    bucket = models.BigIntegerField()  # bucket start, epoch seconds
+    samples = models.IntegerField(default=0)
+    fps_avg = models.FloatField(default=0)
+    fps_min = models.FloatField(default=0)
+    latency_avg = models.FloatField(default=0)  # ms
+    latency_max = models.FloatField(default=0)  # ms
+    jitter_avg = models.FloatField(default=0)  # ms
+    frames_dropped = models.IntegerField(default=0)  # within the bucket
+    frames_duplicated = models.IntegerField(default=0)  # within the bucket
+    cpu_avg = models.FloatField(default=0)  # %
+    bitrate_avg = models.FloatField(default=0)  # kbit/s
+    # From receivers' StreamMetrics samples; null while no receiver reported for the bucket
+    receiver_fps_avg = models.FloatField(null=True, blank=True)
+    receiver_latency_avg = models.FloatField(null=True, blank=True)  # ms
+    receiver_latency_max = models.FloatField(null=True, blank=True)  # ms
+
+    class Meta:
+        ordering = ['bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['camera_id', 'bucket'], name='unique_metrics_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket']),
+        ]
+
+
+class RecordingSegment(models.Model):
+    """One recorded segment file on disk, indexed so listings never touch the filesystem"""
+    camera_id = models.CharField(max_length=100)
+    path = models.CharField(max_length=500, unique=True)  # relative to RecordingConfig.RECORDINGS_ROOT
+    size = models.BigIntegerField(default=0)
+    mtime = models.FloatField(default=0)  # file mtime when indexed, to detect changes
+    duration = models.FloatField(default=0)  # seconds
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    # [[seconds from start_time, byte offset], ...] for each keyframe, ascending; MPEG-TS segments only
+    keyframes = models.JSONField(default=list, blank=True)
+    indexed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-start_time', '-id']
+        indexes = [
+            models.Index(fields=['start_time', 'id']),
+            models.Index(fields=['camera_id', 'start_time']),
+        ]
+
+    def __str__(self):
+        return f"{self.camera_id} {self.start_time:%Y-%m-%d %H:%M:%S} ({self.duration:.0f}s)"
+
+
+class Camera(models.Model):
+    """A camera published through MediaMTX on one of the Pis; resolved via app.cameras.camera_registry"""
+    camera_id = models.CharField(max_length=100, unique=True)  # CameraStatus.camera_id
+    name = models.CharField(max_length=100, blank=True)
+    host = models.CharField(max_length=255)  # MediaMTX host, e.g. the Pi's VPN IP
+    rtsp_port = models.PositiveIntegerField(default=NetworkConfig.RTSP_PORT)
+    webrtc_port = models.PositiveIntegerField(default=NetworkConfig.WEBRTC_PORT)
+    api_port = models.PositiveIntegerField(default=NetworkConfig.API_PORT)
+    stream_path = models.CharField(max_length=200, blank=True)  # main rendition; defaults to camera_id
+    sub_stream_path = models.CharField(max_length=200, blank=True)  # low-resolution rendition, blank if none
+    # e.g. {"audio": false, "controls": ["brightness", "contrast", ...]}
+    capabilities = models.JSONField(default=dict, blank=True)
+    enabled = models.BooleanField(default=True)
+    position = models.PositiveIntegerField(default=0)  # dashboard tile order
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['position', 'camera_id']
+
+    def __str__(self):
+        return self.name or self.camera_id
@@ -0,0 +1,110 @@
+"""
+Bounded outbound queues for browser sockets on /ws/camera/.
+
+Channel layer handlers only enqueue; a writer task per socket does the
+actual sends. A slow browser therefore never blocks its consumer from
+draining its channel layer inbox, which is what makes InMemoryChannelLayer
+drop or reject messages. Status, metrics and viewer updates are keyed, and
+a newer value replaces a queued one (last value wins). Command traffic is
+queued in order and never dropped. A socket whose queue stays saturated is
+disconnected so the browser can reconnect and resync.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+
+from .config import SendQueueConfig
+
+log = logging.getLogger(__name__)
+
+# channel_name -> OutboundQueue of every open browser socket in this process
+open_queues = {}
+
+
+class OutboundQueue:
+    """Send queue and writer task for one browser socket, with per-socket counters"""
+    def __init__(self, send, client=''):
+        self.send = send            # async callable(text)
+        self.client = client
+        self.latest = OrderedDict()  # key -> text, last value wins
+        self.reliable = deque()      # texts that must all be delivered, in order
+        self.wakeup = asyncio.Event()
+        self.sending_since = None    # monotonic start of the send in flight
+        self.saturated_since = None  # monotonic time the queue became saturated
+        self.sent = self.coalesced = self.dropped = 0
+        self.task = None
+
+    def start(self, channel_name):
+        open_queues[channel_name] = self
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self, channel_name):
+        open_queues.pop(channel_name, None)
+        if self.task:
+            self.task.cancel()
+
+    def depth(self):
+        return len(self.latest) + len(self.reliable)
+
+    def put_latest(self, key, text):
+        """Queue text under key, replacing a queued value with the same key; returns False if the socket should be dropped"""
+        if key in self.latest:
+            self.coalesced += 1
+        elif len(self.latest) >= SendQueueConfig.MAX_PENDING:
+            self.latest.popitem(last=False)
+            self.dropped += 1
+        self.latest[key] = text
+        self.wakeup.set()
+        return self.healthy()
+
+    def put_reliable(self, text):
+        """Queue text for guaranteed delivery; returns False if the socket should be dropped"""
+        if len(self.reliable) >= SendQueueConfig.MAX_RELIABLE:
+            return False
+        self.reliable.append(text)
+        self.wakeup.set()
+        return self.healthy()
+
+    def healthy(self):
+        """False once the queue has stayed saturated for SATURATED_SECONDS"""
+        now = time.monotonic()
+        saturated = (self.depth() >= SendQueueConfig.HIGH_WATER or
+                     (self.sending_since is not None and now - self.sending_since >= SendQueueConfig.SEND_STALL_SECONDS))
+        if not saturated:
+            self.saturated_since = None
+            return True
+        if self.saturated_since is None:
+            self.saturated_since = now
+        return now - self.saturated_since < SendQueueConfig.SATURATED_SECONDS
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.reliable or self.latest:
+                text = self.reliable.popleft() if self.reliable else self.latest.popitem(last=False)[1]
+                self.sending_since = time.monotonic()
+                try:
+                    await self.send(text)
+                except Exception as e:
+                    log.debug(f"Send to {self.client} failed: {e}")
+                    return
+                self.sending_since = None
+                self.sent += 1
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'client': self.client,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'depth': self.depth(),
+            'saturated_seconds': round(now - self.saturated_since, 1) if self.saturated_since else 0.0,
+        }
+
+
+def queue_stats():
+    """Per-socket send queue counters for every open browser socket"""
+    return [queue.stats() for queue in list(open_queues.values())]
@@ -0,0 +1,525 @@
+"""
+Recording segment index, byte-range file serving, thumbnail cache, the
+segmented recorder and time-indexed playback.
+
+Segments are indexed into RecordingSegment rows so listing and seeking never
+walk the recordings directory. Finished segments (from the recorder or an
+upload) are indexed one file at a time by index_segment(), at a cost that
+does not grow with the archive. index_recordings() reconciles the whole
+tree, at startup or on demand: it only probes files that are new or
+changed since the last pass, and removes rows for deleted files.
+
+MPEG-TS segments also get a keyframe table, so a wall-clock instant resolves
+to a segment and a byte offset with two index lookups and a bisect, and
+playback streams from that keyframe across consecutive segments.
+"""
+import json
+import logging
+import mimetypes
+import mmap
+import os
+import re
+import subprocess
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import cv2
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .config import RecordingConfig
+from .models import RecordingSegment
+
+log = logging.getLogger(__name__)
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+PTS_CLOCK = 90000
+
+
+def probe_duration(path):
+    """Segment duration in seconds via ffprobe, or OpenCV if ffprobe is unavailable"""
+    try:
+        result = subprocess.run(
+            [RecordingConfig.FFPROBE_PATH, '-v', 'error', '-show_entries', 'format=duration',
+             '-of', 'json', str(path)],
+            capture_output=True, text=True, timeout=10
+        )
+        return float(json.loads(result.stdout)['format']['duration'])
+    except FileNotFoundError:
+        pass
+    except (subprocess.TimeoutExpired, KeyError, ValueError):
+        return 0.0  # unreadable, e.g. a segment still being written
+
+    cap = cv2.VideoCapture(str(path))
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        return frames / fps if fps > 0 else 0.0
+    finally:
+        cap.release()
+
+
+def parse_start_time(name, mtime, duration):
+    """Start time from a <YYYYmmdd_HHMMSS> file name, else derived from mtime"""
+    try:
+        start = datetime.strptime(os.path.splitext(name)[0], RecordingConfig.SEGMENT_TIME_FORMAT)
+        return timezone.make_aware(start)
+    except ValueError:
+        return datetime.fromtimestamp(mtime - duration, tz=timezone.get_current_timezone())
+
+
+def is_transport_stream(path):
+    return str(path).lower().endswith('.ts')
+
+
+def read_pts(data, i):
+    return (((data[i] >> 1) & 0x07) << 30 | data[i + 1] << 22 | (data[i + 2] >> 1) << 15
+            | data[i + 3] << 7 | data[i + 4] >> 1)
+
+
+def scan_keyframes(path):
+    """
+    [[seconds, byte offset], ...] for each video keyframe in an MPEG-TS file.
+
+    A keyframe is a PES start flagged as a random access point in its adaptation
+    field, which is how ffmpeg's mpegts muxer marks IDR frames. Only packet
+    headers are inspected, so a minute of video scans in a few milliseconds.
+    """
+    keyframes = []
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < TS_PACKET_SIZE:
+            return keyframes
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            first_pts = None
+            video_pid = None
+            # A segment still being written may end in a partial packet
+            end = len(data) - TS_PACKET_SIZE + 1
+            for i in range(0, end, TS_PACKET_SIZE):
+                if data[i] != TS_SYNC_BYTE or not data[i + 1] & 0x40:
+                    continue  # resync is not attempted; ffmpeg output is packet aligned
+                pid = (data[i + 1] & 0x1F) << 8 | data[i + 2]
+                if video_pid is not None and pid != video_pid:
+                    continue
+
+                control = (data[i + 3] >> 4) & 0x3
+                payload = i + 4
+                random_access = False
+                if control & 0x2:
+                    length = data[payload]
+                    random_access = length > 0 and bool(data[payload + 1] & 0x40)
+                    payload += 1 + length
+                if not control & 0x1 or payload + 14 > i + TS_PACKET_SIZE:
+                    continue
+
+                # PES header: start code, video stream id, PTS present
+                if data[payload:payload + 3] != b'\x00\x00\x01' or not 0xE0 <= data[payload + 3] <= 0xEF:
+                    continue
+                if not data[payload + 7] & 0x80:
+                    continue
+                video_pid = pid
+                pts = read_pts(data, payload + 9)
+                if first_pts is None:
+                    first_pts = pts
+                if random_access:
+                    keyframes.append([round((pts - first_pts) / PTS_CLOCK, 3), i])
+    return keyframes
+
+
+def ts_header(path):
+    """The PAT/PMT packets that precede the first PES packet, prepended when joining mid-file"""
+    with open(path, 'rb') as f:
+        data = f.read(TS_PACKET_SIZE * 16)
+    for i in range(0, len(data) - TS_PACKET_SIZE + 1, TS_PACKET_SIZE):
+        control = (data[i + 3] >> 4) & 0x3
+        payload = i + 4 + (1 + data[i + 4] if control & 0x2 else 0)
+        if data[i + 1] & 0x40 and data[payload:payload + 3] == b'\x00\x00\x01':
+            return data[:i]
+    return b''
+
+
+def segment_path(root, path):
+    """Index key of a file under root: its relative path with forward slashes"""
+    return os.path.relpath(path, root).replace(os.sep, '/')
+
+
+def build_segment(root, camera_id, path, segment=None):
+    """Create or refresh a RecordingSegment for a segment file"""
+    stat = os.stat(path)
+    duration = probe_duration(path)
+    start = parse_start_time(os.path.basename(path), stat.st_mtime, duration)
+
+    segment = segment or RecordingSegment(path=segment_path(root, path))
+    segment.camera_id = camera_id
+    segment.size = stat.st_size
+    segment.mtime = stat.st_mtime
+    segment.duration = duration
+    segment.start_time = start
+    segment.end_time = start + timedelta(seconds=duration)
+    segment.keyframes = scan_keyframes(path) if is_transport_stream(path) else []
+    return segment
+
+
+def index_segment(path, root=None):
+    """
+    Index one finished segment file, such as the recorder's latest or an upload.
+
+    One probe and one row write, however large the archive; the full
+    index_recordings() pass is only needed to reconcile the tree.
+    """
+    root = str(root or RecordingConfig.RECORDINGS_ROOT)
+    relative = segment_path(root, path)
+    camera_id = relative.split('/')[0]
+    segment = build_segment(root, camera_id, path, RecordingSegment.objects.filter(path=relative).first())
+    segment.save()
+    return segment
+
+
+def iter_segment_files(root):
+    """Yield (camera_id, DirEntry) for segment files one level below root"""
+    with os.scandir(root) as cameras:
+        for camera in cameras:
+            if not camera.is_dir() or camera.name.startswith('.'):
+                continue
+            with os.scandir(camera.path) as files:
+                for entry in files:
+                    if entry.is_file() and entry.name.lower().endswith(RecordingConfig.SEGMENT_EXTENSIONS):
+                        yield camera.name, entry
+
+
+def index_recordings(root=None):
+    """
+    Bring the index in line with the files under root.
+
+    Unchanged files (same size and mtime) are skipped without probing, so a
+    pass over an already indexed tree costs one directory listing.
+    """
+    root = str(root or RecordingConfig.RECORDINGS_ROOT)
+    if not os.path.isdir(root):
+        return {'added': 0, 'updated': 0, 'removed': 0}
+
+    known = {path: (pk, size, mtime) for path, pk, size, mtime in
+             RecordingSegment.objects.values_list('path', 'id', 'size', 'mtime').iterator()}
+    seen = set()
+    added, updated = [], []
+
+    for camera_id, entry in iter_segment_files(root):
+        path = segment_path(root, entry.path)
+        seen.add(path)
+        row = known.get(path)
+        stat = entry.stat()
+        if row and row[1] == stat.st_size and row[2] == stat.st_mtime:
+            continue
+
+        if row:
+            updated.append(build_segment(root, camera_id, entry.path, RecordingSegment(id=row[0], path=path)))
+        else:
+            added.append(build_segment(root, camera_id, entry.path))
+
+    RecordingSegment.objects.bulk_create(added, batch_size=1000)
+    RecordingSegment.objects.bulk_update(
+        updated, ['camera_id', 'size', 'mtime', 'duration', 'start_time', 'end_time', 'keyframes'], batch_size=1000
+    )
+
+    removed = [known[path][0] for path in known.keys() - seen]
+    for i in range(0, len(removed), 1000):
+        RecordingSegment.objects.filter(id__in=removed[i:i + 1000]).delete()
+
+    if added or updated or removed:
+        log.info(f"Recordings index: {len(added)} added, {len(updated)} updated, {len(removed)} removed")
+    return {'added': len(added), 'updated': len(updated), 'removed': len(removed)}
+
+
+def segment_file(segment):
+    return os.path.join(RecordingConfig.RECORDINGS_ROOT, segment.path)
+
+
+def iter_file_range(path, start, length=None):
+    """Yield length bytes of path from start; None reads to the end of the file"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length if length is not None else float('inf')
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(request, path):
+    """
+    Serve a file honouring a single-range Range header with 206 Partial Content,
+    so the player can seek without downloading the whole segment.
+    """
+    size = os.path.getsize(path)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    match = RANGE_RE.match(request.headers.get('Range', '').strip())
+
+    if not match or not any(match.groups()):
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+
+    if start >= size or start > end:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    length = end - start + 1
+    response = StreamingHttpResponse(iter_file_range(path, start, length), status=206, content_type=content_type)
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+class ThumbnailCache:
+    """
+    Lazily generated JPEG thumbnails on disk, bounded by entry count.
+
+    Entries are keyed by segment id and mtime, so a rewritten segment gets a fresh
+    thumbnail. The least recently served entries are deleted when the cache
+    grows past its limit; the recency order is rebuilt from file mtimes on start.
+    """
+    def __init__(self, directory=None, max_entries=None):
+        self.directory = str(directory or RecordingConfig.THUMBNAIL_DIR)
+        self.max_entries = max_entries or RecordingConfig.THUMBNAIL_CACHE_MAX
+        self.entries = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with os.scandir(self.directory) as it:
+            files = sorted((entry.stat().st_mtime, entry.name) for entry in it if entry.name.endswith('.jpg'))
+        self.entries = OrderedDict((name, None) for _, name in files)
+
+    def get(self, segment):
+        """Path of the segment's thumbnail, generating it on first use; None if no frame could be read"""
+        name = f"{segment.id}_{int(segment.mtime)}.jpg"
+        path = os.path.join(self.directory, name)
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            if name in self.entries:
+                self.entries.move_to_end(name)
+                return path
+
+        data = self.render(segment)
+        if data is None:
+            return None
+
+        with self.lock:
+            with open(path, 'wb') as f:
+                f.write(data)
+            self.entries[name] = None
+            while len(self.entries) > self.max_entries:
+                old, _ = self.entries.popitem(last=False)
+                try:
+                    os.remove(os.path.join(self.directory, old))
+                except OSError:
+                    pass
+        return path
+
+    @staticmethod
+    def render(segment):
+        cap = cv2.VideoCapture(segment_file(segment))
+        try:
+            # A frame a little way in is more representative than the very first
+            cap.set(cv2.CAP_PROP_POS_MSEC, min(1000.0, segment.duration * 500))
+            ret, frame = cap.read()
+        finally:
+            cap.release()
+        if not ret:
+            return None
+
+        height, width = frame.shape[:2]
+        thumb_width = RecordingConfig.THUMBNAIL_WIDTH
+        thumb = cv2.resize(frame, (thumb_width, max(1, height * thumb_width // width)), interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode('.jpg', thumb, [cv2.IMWRITE_JPEG_QUALITY, 75])
+        return jpeg.tobytes() if ok else None
+
+
+thumbnail_cache = ThumbnailCache()
+
+
+def resolve_playback(camera_id, at):
+    """
+    Map a wall-clock instant to (segment, keyframe offset in seconds, byte offset).
+
+    The segment is one (camera_id, start_time) index seek and the keyframe a
+    bisect over its keyframe table, so the cost is O(log n) in both. An instant
+    that falls in a gap resolves to the start of the next recording; None if
+    there is nothing at or after it.
+    """
+    segments = RecordingSegment.objects.filter(camera_id=camera_id)
+    segment = segments.filter(start_time__lte=at).order_by('-start_time', '-id').first()
+    if segment is None or segment.end_time <= at:
+        segment = segments.filter(start_time__gt=at).order_by('start_time', 'id').first()
+        if segment is None:
+            return None
+        at = segment.start_time
+
+    offset = (at - segment.start_time).total_seconds()
+    i = bisect_right(segment.keyframes, offset, key=lambda keyframe: keyframe[0]) - 1
+    if i < 0:
+        return segment, 0.0, 0
+    seconds, byte_offset = segment.keyframes[i]
+    return segment, seconds, byte_offset
+
+
+def playback_segments(segment, max_duration=None):
+    """The segment plus the recordings that continue it without a gap, up to max_duration seconds"""
+    max_duration = min(max_duration or RecordingConfig.PLAYBACK_MAX_DURATION, RecordingConfig.PLAYBACK_MAX_DURATION)
+    following = (RecordingSegment.objects
+                 .filter(camera_id=segment.camera_id, start_time__gt=segment.start_time,
+                         start_time__lt=segment.start_time + timedelta(seconds=max_duration))
+                 .order_by('start_time', 'id'))
+
+    chain = [segment]
+    for candidate in following:
+        gap = (candidate.start_time - chain[-1].end_time).total_seconds()
+        if gap > RecordingConfig.PLAYBACK_MAX_GAP or not is_transport_stream(candidate.path):
+            break
+        chain.append(candidate)
+    return chain
+
+
+def iter_playback(chain, byte_offset):
+    """Stitch MPEG-TS segments into one stream, starting at a keyframe of the first"""
+    for i, segment in enumerate(chain):
+        path = segment_file(segment)
+        start = byte_offset if i == 0 else 0
+        try:
+            if start:
+                yield ts_header(path)
+            yield from iter_file_range(path, start)
+        except FileNotFoundError:
+            log.warning(f"Recording file missing during playback: {segment.path}")
+            return
+
+
+def remux_to_mp4(chunks):
+    """
+    Repackage an MPEG-TS byte stream as fragmented MP4 for the browser's <video>.
+
+    Stream copy only; ffmpeg rewrites the container without touching the frames.
+    """
+    proc = subprocess.Popen(
+        [RecordingConfig.FFMPEG_PATH, '-hide_banner', '-loglevel', 'error',
+         '-f', 'mpegts', '-i', 'pipe:0', '-c', 'copy',
+         '-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov+default_base_moof', 'pipe:1'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    )
+
+    def feed():
+        try:
+            for chunk in chunks:
+                proc.stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            pass  # reader went away
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    threading.Thread(target=feed, daemon=True).start()
+    try:
+        yield from iter(lambda: proc.stdout.read1(CHUNK_SIZE), b'')
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+class SegmentRecorder:
+    """
+    Record one camera's RTSP stream into fixed-length MPEG-TS segments.
+
+    ffmpeg copies the stream without re-encoding and cuts at the first keyframe
+    after each SEGMENT_SECONDS boundary, naming files by their wall-clock start.
+    Timestamps are not reset between segments, so consecutive files join into
+    one continuous stream. Each completed segment is indexed straight away,
+    on its own rather than by rescanning the recordings tree.
+    """
+    def __init__(self, camera_id, rtsp_url, root=None, segment_seconds=None):
+        self.camera_id = camera_id
+        self.rtsp_url = rtsp_url
+        self.root = str(root or RecordingConfig.RECORDINGS_ROOT)
+        self.segment_seconds = segment_seconds or RecordingConfig.SEGMENT_SECONDS
+        self.running = False
+        self.process = None
+
+    def command(self):
+        pattern = os.path.join(self.root, self.camera_id, f"{RecordingConfig.SEGMENT_TIME_FORMAT}.ts")
+        return [
+            RecordingConfig.FFMPEG_PATH, '-hide_banner', '-loglevel', 'error',
+            '-rtsp_transport', 'tcp', '-i', self.rtsp_url,
+            '-c', 'copy', '-f', 'segment',
+            '-segment_time', str(self.segment_seconds),
+            '-segment_format', 'mpegts',
+            '-strftime', '1',
+            # Completed segment names are written here, one per line
+            '-segment_list', 'pipe:1', '-segment_list_type', 'flat',
+            pattern,
+        ]
+
+    def run(self):
+        """Record until stop(), restarting ffmpeg with backoff if the stream drops"""
+        os.makedirs(os.path.join(self.root, self.camera_id), exist_ok=True)
+        # strftime file names use ffmpeg's local time; make it the zone parse_start_time() assumes
+        env = {**os.environ, 'TZ': settings.TIME_ZONE}
+        self.running = True
+        backoff = 1
+        while self.running:
+            started = time.monotonic()
+            log.info(f"Recording {self.camera_id} from {self.rtsp_url}")
+            self.process = subprocess.Popen(self.command(), stdout=subprocess.PIPE, text=True, env=env)
+            for line in self.process.stdout:
+                # ffmpeg lists each completed segment by its file name
+                if line.strip():
+                    self.index(os.path.basename(line.strip()))
+            self.process.wait()
+            self.index_last_segment()
+
+            if not self.running:
+                break
+            backoff = 1 if time.monotonic() - started > 60 else min(backoff * 2, 30)
+            log.warning(f"Recorder for {self.camera_id} exited ({self.process.returncode}), retrying in {backoff}s")
+            time.sleep(backoff)
+
+    def index(self, name):
+        path = os.path.join(self.root, self.camera_id, name)
+        try:
+            index_segment(path, self.root)
+        except OSError as e:
+            log.warning(f"Could not index {path}: {e}")
+
+    def index_last_segment(self):
+        """Index the final, possibly partial, segment, which ffmpeg may have exited without listing"""
+        directory = os.path.join(self.root, self.camera_id)
+        names = sorted(name for name in os.listdir(directory)
+                       if name.lower().endswith(RecordingConfig.SEGMENT_EXTENSIONS))
+        if names:
+            self.index(names[-1])
+
+    def stop(self):
+        self.running = False
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
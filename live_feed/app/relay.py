@@ -0,0 +1,127 @@
+"""
+Server-side media relay in front of the camera Pis.
+
+Without it every viewer's WHEP or RTSP session is served by MediaMTX on the
+camera's Pi, so each extra viewer costs another copy of the stream on the
+Pi's VPN uplink and more Pi CPU. In relay mode (RelayConfig.ENABLED) a
+MediaMTX instance on the server pulls each rendition from its Pi once and
+serves every viewer from there: camera entries, and with them
+/api/status/ and /api/cameras/, carry relay URLs, and viewer
+accounting polls the relay's API. Pi egress stays at one copy per rendition
+being watched however many viewers there are.
+
+The relay's config is generated from the camera registry with one path per
+rendition, named after the camera id (see cameras.relay_path) and sourced
+from the Pi over RTSP/TCP. Packets are forwarded as they come, never
+re-encoded. With ON_DEMAND a rendition is only pulled while someone reads
+it. manage.py run_relay writes the config, runs MediaMTX and rewrites the
+file when cameras change; MediaMTX reloads a changed config by itself.
+"""
+import json
+import logging
+import os
+import subprocess
+import time
+
+from .cameras import camera_registry, relay_path
+from .config import RelayConfig
+
+log = logging.getLogger(__name__)
+
+
+def relay_sources(cameras):
+    """Relay path -> Pi RTSP URL for every rendition of the given camera entries"""
+    return {
+        relay_path(camera['camera_id'], rendition): entry['source_url']
+        for camera in cameras
+        for rendition, entry in camera['renditions'].items()
+    }
+
+
+def mediamtx_config(cameras):
+    """MediaMTX config for a relay serving every rendition of the given camera entries"""
+    lines = [
+        "# Generated by manage.py run_relay from the Camera table; edits are overwritten",
+        "logLevel: info",
+        "api: yes",
+        f"apiAddress: :{RelayConfig.API_PORT}",
+        f"rtspAddress: :{RelayConfig.RTSP_PORT}",
+        f"webrtcAddress: :{RelayConfig.WEBRTC_PORT}",
+        "hls: no",
+        "rtmp: no",
+        "srt: no",
+        "paths:",
+    ]
+    for path, source in sorted(relay_sources(cameras).items()):
+        # JSON strings are valid YAML scalars
+        lines += [
+            f"  {json.dumps(path)}:",
+            f"    source: {json.dumps(source)}",
+            "    rtspTransport: tcp",  # UDP does not survive the VPN reliably
+        ]
+        if RelayConfig.ON_DEMAND:
+            lines += [
+                "    sourceOnDemand: yes",
+                f"    sourceOnDemandCloseAfter: {RelayConfig.CLOSE_AFTER}s",
+            ]
+    return "\n".join(lines) + "\n"
+
+
+class RelayServer:
+    """
+    Run MediaMTX as the relay and keep its config in step with the Camera table.
+
+    The config is rewritten only when the generated text changes, through a
+    temporary file and a rename so MediaMTX never reads half of it.
+    """
+    def __init__(self, config_path=None, mediamtx_path=None, reload_interval=None):
+        self.config_path = str(config_path or RelayConfig.CONFIG_PATH)
+        self.mediamtx_path = mediamtx_path or RelayConfig.MEDIAMTX_PATH
+        self.reload_interval = reload_interval or RelayConfig.RELOAD_INTERVAL
+        self.running = False
+        self.process = None
+
+    def write_config(self):
+        """Regenerate the config from the camera registry; True if the file changed"""
+        camera_registry.invalidate()
+        text = mediamtx_config(camera_registry.all())
+        try:
+            with open(self.config_path, encoding='utf-8') as f:
+                if f.read() == text:
+                    return False
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
+        temp_path = f"{self.config_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_path, self.config_path)
+        return True
+
+    def run(self):
+        """Relay until stop(), restarting MediaMTX with backoff if it exits"""
+        self.running = True
+        self.write_config()
+        backoff = 1
+        while self.running:
+            started = time.monotonic()
+            log.info(f"Starting relay with {self.config_path}")
+            self.process = subprocess.Popen([self.mediamtx_path, self.config_path])
+            while self.running:
+                try:
+                    self.process.wait(timeout=self.reload_interval)
+                    break
+                except subprocess.TimeoutExpired:
+                    if self.write_config():
+                        log.info("Camera changes written to the relay config")
+
+            if not self.running:
+                break
+            backoff = 1 if time.monotonic() - started > 60 else min(backoff * 2, 30)
+            log.warning(f"Relay exited ({self.process.returncode}), restarting in {backoff}s")
+            time.sleep(backoff)
+
+    def stop(self):
+        self.running = False
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
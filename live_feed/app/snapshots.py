@@ -0,0 +1,112 @@
+"""
+Live camera snapshots: the latest frame of a camera as a cached JPEG.
+
+A snapshot is the publisher's latest captured frame: Django sends it a
+SnapshotRequest over the control link and the publisher answers with a
+CameraSnapshot, JPEG-encoded at most SnapshotConfig.WIDTH wide. No stream is
+opened or decoded for it, so a snapshot never shows up as a MediaMTX reader,
+counts as a viewer or triggers a keyframe request.
+
+Each snapshot is served from memory for TTL seconds, so a hundred dashboard
+loads cost one request to the publisher. Requests that find a camera's
+snapshot expired wait for a single request instead of each starting their
+own. A camera whose publisher did not answer within REPLY_TIMEOUT is not
+asked again for RETRY_AFTER seconds; meanwhile its last snapshot is served
+if it is younger than STALE_MAX.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import defaultdict
+
+from .config import SnapshotConfig
+
+log = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """An encoded frame; immutable once built"""
+    def __init__(self, jpeg, taken_at=None):
+        self.jpeg = jpeg
+        self.etag = f'"{hashlib.md5(jpeg).hexdigest()}"'
+        self.taken_at = taken_at or time.time()  # for Last-Modified
+        self.grabbed = time.monotonic()          # for expiry
+
+    def age(self):
+        return time.monotonic() - self.grabbed
+
+
+class SnapshotCache:
+    """
+    Per-camera in-memory snapshots with single-flight refresh.
+
+    Used from the event loop only, where the publishers' sockets deliver the
+    answers: requests waiting on a snapshot never hold a worker thread.
+    """
+    def __init__(self, ttl=None):
+        self.ttl = ttl or SnapshotConfig.TTL
+        self.snapshots = {}  # camera_id -> Snapshot
+        self.failed = {}     # camera_id -> monotonic time of the last unanswered request
+        self.locks = defaultdict(asyncio.Lock)  # camera_id -> lock held while a request is in flight
+        self.replies = {}    # camera_id -> Future of the request in flight
+        self.grabs = 0
+
+    async def get(self, camera, request_snapshot):
+        """
+        The camera's snapshot, asking its publisher for a new one if it expired;
+        None if no frame could be had. request_snapshot(camera_id) sends the
+        SnapshotRequest; the answer comes back through deliver().
+        """
+        camera_id = camera['camera_id']
+        snapshot = self.snapshots.get(camera_id)
+        if snapshot and snapshot.age() < self.ttl:
+            return snapshot
+
+        async with self.locks[camera_id]:
+            # Another request may have fetched it while this one waited
+            snapshot = self.snapshots.get(camera_id)
+            if snapshot and snapshot.age() < self.ttl:
+                return snapshot
+            if time.monotonic() - self.failed.get(camera_id, float('-inf')) >= SnapshotConfig.RETRY_AFTER:
+                fresh = await self.grab(camera_id, request_snapshot)
+                self.grabs += 1
+                if fresh is not None:
+                    snapshot = fresh
+                    self.snapshots[camera_id] = snapshot
+                    self.failed.pop(camera_id, None)
+                    return snapshot
+                self.failed[camera_id] = time.monotonic()
+
+        if snapshot and snapshot.age() < SnapshotConfig.STALE_MAX:
+            return snapshot
+        return None
+
+    async def grab(self, camera_id, request_snapshot):
+        """Ask the camera's publisher for its latest frame and wait for the answer; None on timeout"""
+        reply = asyncio.get_running_loop().create_future()
+        self.replies[camera_id] = reply
+        try:
+            await request_snapshot(camera_id)
+            return await asyncio.wait_for(reply, SnapshotConfig.REPLY_TIMEOUT)
+        except asyncio.TimeoutError:
+            log.warning(f"No snapshot from the publisher of camera '{camera_id}'")
+            return None
+        finally:
+            if self.replies.get(camera_id) is reply:
+                del self.replies[camera_id]
+
+    def deliver(self, camera_id, jpeg, captured_at=None):
+        """Hand over a publisher's CameraSnapshot; called from the publisher's socket"""
+        if not jpeg:
+            return
+        snapshot = Snapshot(jpeg, captured_at)
+        reply = self.replies.get(camera_id)
+        if reply and not reply.done():
+            reply.set_result(snapshot)
+        else:
+            # Answer to a request that already timed out: still the newest frame there is
+            self.snapshots[camera_id] = snapshot
+
+
+snapshot_cache = SnapshotCache()
@@ -4,7 +4,20 @@ from . import views
 urlpatterns = [
     path('', views.live_feed, name='live_feed'),
     path('api/status/', views.stream_status, name='stream_status'),
+    path('api/cameras/', views.cameras_api, name='cameras_api'),
+    path('api/cameras/<str:camera_id>/snapshot/', views.camera_snapshot, name='camera_snapshot'),
     path('settings/', views.settings, name='settings'),  # Settings page
     path('analytics/', views.analytics, name='analytics'),  # Analytics page
     path('recordings/', views.recordings, name='recordings'),  # Recordings page
+    path('api/recordings/', views.recordings_list, name='recordings_list'),
+    path('api/recordings/<int:segment_id>/stream/', views.recording_stream, name='recording_stream'),
+    path('api/recordings/<int:segment_id>/thumbnail/', views.recording_thumbnail, name='recording_thumbnail'),
+    path('api/recordings/upload/<str:camera_id>/<str:name>/', views.recording_upload, name='recording_upload'),
+    path('api/playback/', views.playback_resolve, name='playback_resolve'),
+    path('api/playback/stream/', views.playback_stream, name='playback_stream'),
+    path('api/metrics/', views.metrics_api, name='metrics_api'),
+    path('api/metrics/receiver/', views.receiver_metrics_api, name='receiver_metrics_api'),
+    path('api/viewers/', views.viewers_api, name='viewers_api'),
+    path('api/viewers/queues/', views.viewer_queues_api, name='viewer_queues_api'),
+    path('api/commands/latency/', views.command_latency_api, name='command_latency_api'),
 ]
\ No newline at end of file
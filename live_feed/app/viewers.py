@@ -0,0 +1,246 @@
+"""
+Live viewer accounting per stream.
+
+Two sources feed one registry: dashboard sockets on /ws/camera/ announce the
+streams they are playing, and MediaMtxSessionPoller diffs MediaMTX's reader
+sessions against the previous poll. Joins, leaves and bandwidth updates are
+O(1) changes to per-stream counters; changes are pushed to browsers over the
+camera group rather than polled by them.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+from .cameras import camera_registry
+from .config import ViewerConfig
+
+log = logging.getLogger(__name__)
+
+
+class ViewerRegistry:
+    """
+    Active viewing sessions and the per-stream counters derived from them.
+
+    A session is keyed by (source, session_id) and belongs to one stream path.
+    Counts are kept per source because one browser tile shows up both as a
+    dashboard socket and as a MediaMTX WebRTC session; a stream's viewer count
+    is the largest of its per-source counts.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}                                  # (source, session_id) -> [stream, egress_kbps]
+        self.counts = defaultdict(lambda: defaultdict(int))  # stream -> source -> sessions
+        self.egress = defaultdict(float)                    # stream -> kbps
+
+    def join(self, source, session_id, stream, egress_kbps=0.0):
+        """Add or update a session; returns True if a viewer count changed"""
+        key = (source, session_id)
+        with self.lock:
+            session = self.sessions.get(key)
+            if session and session[0] == stream:
+                self.egress[stream] += egress_kbps - session[1]
+                session[1] = egress_kbps
+                return False
+            if session:
+                self.remove(key)
+            self.sessions[key] = [stream, egress_kbps]
+            self.counts[stream][source] += 1
+            self.egress[stream] += egress_kbps
+            return True
+
+    def leave(self, source, session_id):
+        """Remove a session; returns True if it existed"""
+        with self.lock:
+            return self.remove((source, session_id))
+
+    def remove(self, key):
+        session = self.sessions.pop(key, None)
+        if session is None:
+            return False
+        stream, egress_kbps = session
+        counts = self.counts[stream]
+        counts[key[0]] -= 1
+        if not counts[key[0]]:
+            del counts[key[0]]
+        self.egress[stream] -= egress_kbps
+        if not counts:
+            del self.counts[stream]
+            del self.egress[stream]
+        return True
+
+    def snapshot(self):
+        """Viewer counts and egress per stream, plus whether viewers should be moved to sub-streams"""
+        with self.lock:
+            streams = {
+                stream: {
+                    'viewers': max(counts.values()),
+                    'by_source': dict(counts),
+                    'egress_kbps': round(max(self.egress[stream], 0.0), 1),
+                }
+                for stream, counts in self.counts.items()
+            }
+        total_egress = sum(stream['egress_kbps'] for stream in streams.values())
+        over_budget = total_egress > ViewerConfig.EGRESS_BUDGET_KBPS
+        for stream in streams.values():
+            stream['prefer_sub'] = over_budget or stream['viewers'] >= ViewerConfig.SUB_STREAM_VIEWERS
+        return {
+            'streams': streams,
+            'total_viewers': sum(stream['viewers'] for stream in streams.values()),
+            'total_egress_kbps': round(total_egress, 1),
+            'egress_budget_kbps': ViewerConfig.EGRESS_BUDGET_KBPS,
+        }
+
+
+def fetch_host_sessions(api_url):
+    """
+    Reader sessions from one MediaMTX control API as (source, id, path, bytes_sent).
+
+    Returns None if the API is unreachable.
+    """
+    sessions = []
+    for source, endpoint in ViewerConfig.MEDIAMTX_SESSION_ENDPOINTS.items():
+        try:
+            with urllib.request.urlopen(f"{api_url}{endpoint}", timeout=ViewerConfig.POLL_TIMEOUT) as response:
+                items = json.load(response).get('items', [])
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            log.debug(f"MediaMTX API unavailable ({api_url}{endpoint}): {e}")
+            return None
+        for item in items:
+            # Publishers show up in the same lists; only readers are viewers
+            if item.get('state') == 'read':
+                sessions.append((source, item['id'], item.get('path', ''), item.get('bytesSent', 0)))
+    return sessions
+
+
+last_host_sessions = {}  # api_url -> sessions from its last successful poll
+
+
+def fetch_mediamtx_sessions():
+    """
+    Reader sessions across the MediaMTX servers of every registered camera
+    (or ViewerConfig.MEDIAMTX_API_URL if set).
+
+    A server that fails a poll reports its previous sessions, so a dropped
+    request is not mistaken for every viewer leaving.
+    """
+    api_urls = ([ViewerConfig.MEDIAMTX_API_URL] if ViewerConfig.MEDIAMTX_API_URL
+                else sorted({camera['api_url'] for camera in camera_registry.all()}))
+    sessions = []
+    for api_url in api_urls:
+        host_sessions = fetch_host_sessions(api_url)
+        if host_sessions is None:
+            host_sessions = last_host_sessions.get(api_url, [])
+        last_host_sessions[api_url] = host_sessions
+        sessions.extend(host_sessions)
+    return sessions
+
+
+class StubSessionSource:
+    """
+    Stand-in for the MediaMTX API when developing without a Pi.
+
+    Sessions added here are reported on every poll, and bytes_sent grows at
+    each session's configured bitrate.
+    """
+    def __init__(self):
+        self.sessions = {}  # session_id -> (source, path, kbps, started)
+
+    def add(self, session_id, path, kbps=500.0, source='webrtc'):
+        self.sessions[session_id] = (source, path, kbps, time.monotonic())
+
+    def remove(self, session_id):
+        self.sessions.pop(session_id, None)
+
+    def __call__(self):
+        now = time.monotonic()
+        return [(source, session_id, path, int((now - started) * kbps * 1000 / 8))
+                for session_id, (source, path, kbps, started) in self.sessions.items()]
+
+
+class MediaMtxSessionPoller:
+    """
+    Feeds MediaMTX reader sessions into the registry.
+
+    Each poll is diffed against the previous one, so only sessions that
+    appeared or went away touch the counters; egress per session is the
+    bytesSent delta between polls. on_change is awaited with a fresh snapshot
+    when a count changes or a stream's egress moves by more than
+    EGRESS_PUSH_DELTA, and on_join with the streams new sessions appeared on.
+    """
+    SOURCE_PREFIX = 'mediamtx:'
+
+    def __init__(self, registry, fetch=None, interval=None):
+        self.registry = registry
+        self.fetch = fetch or fetch_mediamtx_sessions
+        self.interval = interval or ViewerConfig.POLL_INTERVAL
+        self.last_bytes = {}   # (source, session_id) -> (monotonic time, bytes_sent)
+        self.pushed = None     # snapshot last handed to on_change
+        self.joined = []       # streams that gained a session in the last sync
+        self.task = None
+
+    def sync(self, sessions, now=None):
+        """Apply one poll result; returns True if a viewer count changed"""
+        now = time.monotonic() if now is None else now
+        changed = False
+        seen = set()
+        self.joined = []
+        for source, session_id, path, bytes_sent in sessions:
+            key = (self.SOURCE_PREFIX + source, session_id)
+            seen.add(key)
+            previous = self.last_bytes.get(key)
+            kbps = 0.0
+            if previous and now > previous[0] and bytes_sent >= previous[1]:
+                kbps = (bytes_sent - previous[1]) * 8 / 1000 / (now - previous[0])
+            self.last_bytes[key] = (now, bytes_sent)
+            if self.registry.join(*key, path, kbps):
+                changed = True
+                self.joined.append(path)
+
+        for key in self.last_bytes.keys() - seen:
+            del self.last_bytes[key]
+            changed |= self.registry.leave(*key)
+        return changed
+
+    def significant(self, snapshot):
+        """Whether snapshot differs enough from the last pushed one to be worth sending"""
+        if self.pushed is None or snapshot['streams'].keys() != self.pushed['streams'].keys():
+            return True
+        for name, stream in snapshot['streams'].items():
+            before = self.pushed['streams'][name]
+            if stream['viewers'] != before['viewers'] or stream['prefer_sub'] != before['prefer_sub']:
+                return True
+            if abs(stream['egress_kbps'] - before['egress_kbps']) > ViewerConfig.EGRESS_PUSH_DELTA * max(before['egress_kbps'], 1.0):
+                return True
+        return False
+
+    async def run(self, on_change, on_join=None):
+        while True:
+            sessions = await asyncio.to_thread(self.fetch)
+            if sessions is not None:
+                self.sync(sessions)
+                if on_join and self.joined:
+                    await on_join(self.joined)
+                snapshot = self.registry.snapshot()
+                if self.significant(snapshot):
+                    self.pushed = snapshot
+                    await on_change(snapshot)
+            await asyncio.sleep(self.interval)
+
+    def ensure_started(self, on_change, on_join=None):
+        """Start polling on the running event loop, once"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run(on_change, on_join))
+
+
+viewer_registry = ViewerRegistry()
+stub_sessions = StubSessionSource()
+viewer_poller = None
+if ViewerConfig.SESSION_SOURCE == 'mediamtx':
+    viewer_poller = MediaMtxSessionPoller(viewer_registry)
+elif ViewerConfig.SESSION_SOURCE == 'stub':
+    viewer_poller = MediaMtxSessionPoller(viewer_registry, fetch=stub_sessions)
@@ -1,10 +1,38 @@
 
 
 
-from django.shortcuts import render
-from django.http import JsonResponse
-from .config import NetworkConfig
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.shortcuts import render, get_object_or_404
+from django.http import JsonResponse, FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.db.models import Count, Sum
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from urllib.parse import urlencode
+from datetime import datetime, timedelta, timezone as dt_timezone
+from .cameras import camera_registry, stream_rendition
+from .commands import command_tracker
+from .config import MetricsConfig, NetworkConfig, ReceiverMetricsConfig, RecordingConfig, RelayConfig, SnapshotConfig
+from .consumers import topic_group
+from .metrics import RECEIVER_SERIES_FIELDS, bucket_start, query_series, rollup_point, save_receiver_samples, start_warming
+from .models import RecordingSegment
+from .outbound import queue_stats
+from .snapshots import snapshot_cache
+from .viewers import viewer_registry
+from .recordings import (
+    index_segment, is_transport_stream, iter_playback, playback_segments, ranged_file_response, remux_to_mp4,
+    resolve_playback, segment_file, thumbnail_cache
+)
+import json
+import math
+import os
+import re
+import shutil
 import socket
+import time
 
 def live_feed(request):
     """Main view to serve the streaming dashboard"""
@@ -36,6 +64,8 @@ def settings(request):
 
 def analytics(request):
     """Sub view to serve the analytics page"""
+    # Have past days cached before the page asks for them, even with no publisher connected yet
+    start_warming()
     # Check if this is an AJAX request
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         # Return only content partial for AJAX with metadata
@@ -56,7 +86,7 @@ def recordings(request):
         # Return only content partial for AJAX with metadata
         context = {
             'page_css': 'css/live_stream.css',
-            'page_js': None,  # Recordings has inline JS
+            'page_js': 'js/recordings.js',
             'page_name': 'recordings'
         }
         return render(request, 'partials/recordings_content.html', context)
@@ -64,35 +94,434 @@ def recordings(request):
     return render(request, 'recordings.html')
 
 def stream_status(request):
-    """API endpoint to provide stream configuration and status"""
-    # Get stream URLs from configuration
-    stream_urls = NetworkConfig.get_stream_urls()
+    """API endpoint to provide stream configuration and status for one camera (?camera=, default the first)"""
+    camera_id = request.GET.get('camera')
+    camera = camera_registry.get(camera_id) if camera_id else camera_registry.default()
+    if camera is None:
+        return JsonResponse({'error': 'Unknown camera' if camera_id else 'No cameras registered'}, status=404)
 
-    # Check if Pi MediaMTX server is reachable
-    pi_reachable = check_pi_connection()
+    # Check if the camera's MediaMTX server, and the relay viewers read through, are reachable
+    pi_reachable = check_pi_connection(camera)
+    relay_reachable = check_port(RelayConfig.HOST, RelayConfig.RTSP_PORT) if camera['relayed'] else None
+    if not pi_reachable:
+        status, message = 'pi_unreachable', 'Pi MediaMTX server not reachable'
+    elif relay_reachable is False:
+        status, message = 'relay_unreachable', 'Relay MediaMTX server not reachable'
+    else:
+        relay = f'relay {RelayConfig.HOST}, ' if camera['relayed'] else ''
+        status, message = 'ready', f'Stream URLs configured for {relay}Pi IP: {camera["host"]}'
 
     response_data = {
-        'hls_url': stream_urls['hls_url'],
-        'rtsp_url': stream_urls['rtsp_url'],
-        'webrtc_url': stream_urls['webrtc_url'],
-        'pi_ip': NetworkConfig.PI_VPN_IP,
+        'camera_id': camera['camera_id'],
+        'hls_url': camera['hls_url'],
+        'rtsp_url': camera['rtsp_url'],
+        'webrtc_url': camera['webrtc_url'],
+        'sub_rtsp_url': camera['sub_rtsp_url'],
+        'sub_webrtc_url': camera['sub_webrtc_url'],
+        # Main stream for single views, low-resolution sub-stream for grid tiles
+        'renditions': camera['renditions'],
+        'pi_ip': camera['host'],
         'windows_ip': NetworkConfig.WINDOWS_VPN_IP,
-        'stream_name': NetworkConfig.STREAM_NAME,
+        'stream_name': camera['stream_path'],
+        'has_audio': camera['has_audio'],
         'pi_reachable': pi_reachable,
-        'status': 'ready' if pi_reachable else 'pi_unreachable',
-        'message': f'Stream URLs configured for Pi IP: {NetworkConfig.PI_VPN_IP}' if pi_reachable else 'Pi MediaMTX server not reachable'
+        # Viewer URLs point at the server-side relay, which pulls one copy from the Pi
+        'relayed': camera['relayed'],
+        'relay_reachable': relay_reachable,
+        'status': status,
+        'message': message
     }
 
     return JsonResponse(response_data)
 
-def check_pi_connection():
-    """Check if Pi MediaMTX server is reachable"""
+def check_pi_connection(camera):
+    """Check if a camera's MediaMTX server is reachable"""
+    return check_port(camera['host'], camera['rtsp_port'])
+
+def check_port(host, port):
+    """Check if a TCP port accepts connections within NetworkConfig.CONNECTION_TIMEOUT"""
     try:
-        address = NetworkConfig.get_mediamtx_check_address()
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(NetworkConfig.CONNECTION_TIMEOUT)
-        result = sock.connect_ex(address)
+        result = sock.connect_ex((host, port))
         sock.close()
         return result == 0
     except Exception:
-        return False
\ No newline at end of file
+        return False
+
+def cameras_api(request):
+    """API endpoint listing the registered cameras in dashboard order, with their stream URLs"""
+    return JsonResponse({'cameras': camera_registry.all()})
+
+async def request_snapshot(camera_id):
+    """Ask a camera's publisher for its latest frame; the answer reaches snapshot_cache through its socket"""
+    await get_channel_layer().group_send(topic_group('commands'), {
+        'type': 'forward_snapshot_request',
+        'topic': 'commands',
+        'camera_id': camera_id,
+        'width': SnapshotConfig.WIDTH,
+    })
+
+async def camera_snapshot(request, camera_id):
+    """
+    Serve a camera's latest frame as a JPEG; requests within SnapshotConfig.TTL share one publisher request.
+    Async, so it waits for the answer on the event loop the publisher's socket delivers it to.
+    """
+    camera = (await camera_registry.aload()).get(camera_id)
+    if camera is None:
+        raise Http404("Unknown camera")
+    snapshot = await snapshot_cache.get(camera, request_snapshot)
+    if snapshot is None:
+        response = HttpResponse("No frame available from the camera", status=503, content_type='text/plain')
+        response['Retry-After'] = int(SnapshotConfig.RETRY_AFTER)
+        return response
+
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if snapshot.etag in etags or '*' in etags:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(snapshot.jpeg, content_type='image/jpeg')
+    response['ETag'] = snapshot.etag
+    response['Last-Modified'] = http_date(snapshot.taken_at)
+    response['Cache-Control'] = f'private, max-age={max(0, int(SnapshotConfig.TTL - snapshot.age()))}'
+    return response
+
+def encode_cursor(start_time, segment_id):
+    micros = int(start_time.timestamp()) * 10**6 + start_time.microsecond
+    return f"{micros}_{segment_id}"
+
+def decode_cursor(cursor):
+    micros, segment_id = (int(part) for part in cursor.split('_'))
+    start = datetime.fromtimestamp(micros // 10**6, tz=dt_timezone.utc).replace(microsecond=micros % 10**6)
+    return start, segment_id
+
+def recordings_list(request):
+    """API endpoint listing indexed recordings, newest first, with keyset pagination"""
+    segments = RecordingSegment.objects.all()
+
+    camera = request.GET.get('camera')
+    if camera:
+        segments = segments.filter(camera_id=camera)
+    try:
+        since = parse_datetime(request.GET.get('since', ''))
+        until = parse_datetime(request.GET.get('until', ''))
+    except ValueError:  # well formed but impossible, e.g. February 30
+        return JsonResponse({'error': 'invalid since or until'}, status=400)
+    if since:
+        segments = segments.filter(end_time__gte=since)
+    if until:
+        segments = segments.filter(start_time__lte=until)
+
+    try:
+        limit = max(1, min(int(request.GET.get('limit', RecordingConfig.PAGE_SIZE)), RecordingConfig.MAX_PAGE_SIZE))
+    except ValueError:
+        limit = RecordingConfig.PAGE_SIZE
+
+    # Totals describe the whole (filtered) set, so only compute them for the first page
+    response_data = {}
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            start, segment_id = decode_cursor(cursor)
+        except ValueError:
+            return JsonResponse({'error': 'invalid cursor'}, status=400)
+        # Seek past the cursor instead of OFFSET so deep pages stay as fast as the first
+        segments = segments.filter(start_time__lt=start) | segments.filter(start_time=start, id__lt=segment_id)
+    else:
+        totals = segments.aggregate(count=Count('id'), size=Sum('size'))
+        response_data['total_count'] = totals['count']
+        response_data['total_size'] = totals['size'] or 0
+        try:
+            usage = shutil.disk_usage(RecordingConfig.RECORDINGS_ROOT)
+            response_data['storage_free'] = usage.free
+        except OSError:
+            response_data['storage_free'] = None
+
+    rows = list(segments.order_by('-start_time', '-id').values(
+        'id', 'camera_id', 'start_time', 'end_time', 'duration', 'size')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    response_data['recordings'] = [{
+        'id': row['id'],
+        'camera_id': row['camera_id'],
+        'start_time': row['start_time'].isoformat(),
+        'end_time': row['end_time'].isoformat(),
+        'duration': row['duration'],
+        'size': row['size'],
+        'stream_url': reverse('recording_stream', args=[row['id']]),
+        'thumbnail_url': reverse('recording_thumbnail', args=[row['id']]),
+    } for row in rows]
+    response_data['next_cursor'] = encode_cursor(rows[-1]['start_time'], rows[-1]['id']) if has_more else None
+
+    return JsonResponse(response_data)
+
+def recording_stream(request, segment_id):
+    """Serve a recorded segment with HTTP Range support for seeking"""
+    segment = get_object_or_404(RecordingSegment, id=segment_id)
+    try:
+        return ranged_file_response(request, segment_file(segment))
+    except FileNotFoundError:
+        raise Http404("Recording file is missing")
+
+def recording_thumbnail(request, segment_id):
+    """Serve a cached JPEG thumbnail for a recorded segment"""
+    segment = get_object_or_404(RecordingSegment, id=segment_id)
+    path = thumbnail_cache.get(segment)
+    if path is None:
+        raise Http404("No frame available for thumbnail")
+
+    response = FileResponse(open(path, 'rb'), content_type='image/jpeg')
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+UPLOAD_CAMERA_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+@csrf_exempt
+def recording_upload(request, camera_id, name):
+    """
+    Accept a segment a publisher spooled while it could not reach the server
+    (see store_forward.py). name is the segment's UTC start time; the file is
+    stored under the server's own naming and indexed like a recorded segment.
+    Re-sending a segment that already arrived intact is a no-op (200), a
+    different file under the same name is a conflict (409).
+    """
+    if request.method != 'PUT':
+        return JsonResponse({'error': 'PUT a segment file'}, status=405)
+    stem, ext = os.path.splitext(name)
+    try:
+        start = datetime.strptime(stem, RecordingConfig.SEGMENT_TIME_FORMAT).replace(tzinfo=dt_timezone.utc)
+    except ValueError:
+        return JsonResponse({'error': f'name must be {RecordingConfig.SEGMENT_TIME_FORMAT} in UTC'}, status=400)
+    if not UPLOAD_CAMERA_ID.match(camera_id) or ext.lower() not in RecordingConfig.SEGMENT_EXTENSIONS:
+        return JsonResponse({'error': 'invalid camera id or segment extension'}, status=400)
+    try:
+        size = int(request.headers.get('Content-Length', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Content-Length is required'}, status=411)
+    if not 0 < size <= RecordingConfig.UPLOAD_MAX_BYTES:
+        return JsonResponse({'error': f'segments must be 1 to {RecordingConfig.UPLOAD_MAX_BYTES} bytes'}, status=413)
+
+    # parse_start_time() reads names in the server's zone
+    local_name = timezone.localtime(start).strftime(RecordingConfig.SEGMENT_TIME_FORMAT) + ext.lower()
+    directory = os.path.join(str(RecordingConfig.RECORDINGS_ROOT), camera_id)
+    path = os.path.join(directory, local_name)
+    if os.path.exists(path):
+        if os.path.getsize(path) == size:
+            return JsonResponse({'status': 'exists', 'name': local_name})
+        return JsonResponse({'error': f'{camera_id}/{local_name} exists with a different size'}, status=409)
+
+    os.makedirs(directory, exist_ok=True)
+    # Written under a name the indexer skips, so a broken upload never shows up as a recording
+    partial = path + '.part'
+    received = 0
+    with open(partial, 'wb') as f:
+        while True:
+            chunk = request.read(min(UPLOAD_CHUNK_SIZE, size - received))
+            if not chunk:
+                break
+            f.write(chunk)
+            received += len(chunk)
+    if received != size:
+        os.remove(partial)
+        return JsonResponse({'error': f'expected {size} bytes, received {received}'}, status=400)
+    os.replace(partial, path)
+    index_segment(path)
+    return JsonResponse({'status': 'stored', 'name': local_name}, status=201)
+
+
+def parse_playback_request(request):
+    """(camera_id, aware datetime) from ?camera=&at=, or a JsonResponse error"""
+    camera = request.GET.get('camera')
+    try:
+        at = parse_datetime(request.GET.get('at', ''))
+    except ValueError:  # well formed but impossible, e.g. February 30
+        at = None
+    if not camera or at is None:
+        return None, JsonResponse({'error': 'camera and at (ISO 8601) are required'}, status=400)
+    if timezone.is_naive(at):
+        at = timezone.make_aware(at)
+    return (camera, at), None
+
+def playback_resolve(request):
+    """API endpoint resolving a wall-clock instant to a segment, keyframe and stream URL"""
+    params, error = parse_playback_request(request)
+    if error:
+        return error
+    camera, at = params
+
+    resolved = resolve_playback(camera, at)
+    if resolved is None:
+        return JsonResponse({'error': 'no recording at or after this time'}, status=404)
+    segment, offset, byte_offset = resolved
+    keyframe_time = segment.start_time + timedelta(seconds=offset)
+
+    segment_url = reverse('recording_stream', args=[segment.id])
+    if is_transport_stream(segment.path):
+        query = urlencode({'camera': camera, 'at': keyframe_time.isoformat()})
+        stream_url = f"{reverse('playback_stream')}?{query}"
+    else:
+        # Other containers can't be joined mid-file; play the segment and seek in the browser
+        stream_url = f"{segment_url}#t={offset:.3f}"
+
+    return JsonResponse({
+        'camera_id': segment.camera_id,
+        'segment_id': segment.id,
+        'segment_start': segment.start_time.isoformat(),
+        'segment_url': segment_url,
+        'keyframe_time': keyframe_time.isoformat(),
+        'offset': offset,
+        'byte_offset': byte_offset,
+        # Distance between the requested instant and the keyframe playback starts from
+        'preroll': max((at - keyframe_time).total_seconds(), 0.0),
+        'stream_url': stream_url,
+    })
+
+def playback_stream(request):
+    """Stream recordings from the keyframe at or before ?at=, joined across consecutive segments"""
+    params, error = parse_playback_request(request)
+    if error:
+        return error
+    camera, at = params
+
+    duration = RecordingConfig.PLAYBACK_MAX_DURATION
+    if 'duration' in request.GET:
+        try:
+            duration = float(request.GET['duration'])
+        except ValueError:
+            duration = math.nan
+        if not (math.isfinite(duration) and duration > 0):
+            return JsonResponse({'error': 'duration must be a positive number of seconds'}, status=400)
+        duration = min(duration, RecordingConfig.PLAYBACK_MAX_DURATION)
+
+    resolved = resolve_playback(camera, at)
+    if resolved is None:
+        raise Http404("No recording at or after this time")
+    segment, _, byte_offset = resolved
+    if not is_transport_stream(segment.path):
+        return JsonResponse({'error': 'segment is not MPEG-TS; use its stream URL'}, status=409)
+
+    chain = playback_segments(segment, duration)
+
+    # Raw MPEG-TS for players that accept it; fragmented MP4 for the browser
+    if request.GET.get('format') == 'ts':
+        return StreamingHttpResponse(iter_playback(chain, byte_offset), content_type='video/mp2t')
+    return StreamingHttpResponse(remux_to_mp4(iter_playback(chain, byte_offset)), content_type='video/mp4')
+
+def parse_epoch(value):
+    """Epoch seconds from a number or an ISO 8601 string; None if absent or invalid"""
+    if not value:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        number = None
+    if number is not None:
+        return int(number) if math.isfinite(number) else None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:  # well formed but impossible, e.g. February 30
+        return None
+    if parsed is None:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return int(parsed.timestamp())
+
+def metrics_api(request):
+    """
+    API endpoint serving per-minute stream metrics rollups per camera, as a list of
+    column blocks ({"t": [...], "fps": [...], ...}) in time order.
+
+    Pass the returned cursor back as since= to fetch only points added after it;
+    fields= (comma separated) limits the series returned.
+    """
+    now = int(time.time())
+    since = parse_epoch(request.GET.get('since'))
+    if since is None:
+        since = now - MetricsConfig.DEFAULT_WINDOW
+    since = max(since, now - MetricsConfig.MAX_WINDOW)
+    until = parse_epoch(request.GET.get('until'))
+    if until is not None:
+        # Nothing is stored past the open bucket; an unbounded until would only add empty day windows
+        until = min(until, bucket_start(now) + MetricsConfig.ROLLUP_SECONDS)
+
+    if until is not None and since >= until:
+        series, last = '{}', None
+    else:
+        fields = request.GET.get('fields')
+        series, last = query_series(since, until, request.GET.get('camera') or None,
+                                    fields.split(',') if fields else None)
+    # The series are already JSON; splice them in rather than decoding and re-encoding
+    cursor = last if last is not None else since
+    body = f'{{"resolution":{MetricsConfig.ROLLUP_SECONDS},"cursor":{cursor},"series":{series}}}'
+    return HttpResponse(body, content_type='application/json')
+
+@csrf_exempt
+def receiver_metrics_api(request):
+    """
+    Accept a batch of samples from a receiver (see receiver_metrics.py):
+    {"receiver": name, "stream": MediaMTX path, "samples": [[epoch ms, fps, latency ms, frame number], ...]}.
+    The stream is matched to its camera in the registry; the samples are
+    stored, and the minute rollups they fall in are refolded and pushed to
+    analytics pages next to the publisher's series. Rollups hold one receiver
+    series per camera, for its main rendition, so sub-stream batches are
+    acknowledged and dropped.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST a batch of samples'}, status=405)
+    try:
+        batch = json.loads(request.body)
+        stream = str(batch['stream'])
+        samples = [(int(t), float(fps), float(latency_ms), int(frame_number))
+                   for t, fps, latency_ms, frame_number in batch['samples']]
+        # json.loads accepts NaN and Infinity; int() rejects them, but the floats would be stored
+        if not all(math.isfinite(fps) and math.isfinite(latency_ms) for _, fps, latency_ms, _ in samples):
+            raise ValueError('non-finite sample')
+    except (ValueError, OverflowError, KeyError, TypeError):
+        return JsonResponse({'error': 'expected {"stream": ..., "samples": [[epoch ms, fps, latency ms, frame], ...]}'},
+                            status=400)
+    if len(samples) > ReceiverMetricsConfig.MAX_BATCH:
+        return JsonResponse({'error': f'at most {ReceiverMetricsConfig.MAX_BATCH} samples per batch'}, status=413)
+
+    target = stream_rendition(camera_registry.load(), stream)
+    if target and target[1] != 'main':
+        # Averaged in, a sub-stream's lower rate would match neither rendition
+        return JsonResponse({'stored': 0, 'camera_id': target[0], 'rendition': target[1]})
+    camera_id = target[0] if target else stream  # unregistered: the publisher names cameras after their path
+    if not UPLOAD_CAMERA_ID.match(camera_id):
+        return JsonResponse({'error': 'invalid stream'}, status=400)
+
+    # Samples too old to keep, or from a receiver clock far ahead, are acknowledged and dropped
+    now_ms = time.time() * 1000
+    oldest = now_ms - ReceiverMetricsConfig.SAMPLE_RETENTION * 1000
+    samples = [sample for sample in samples if oldest <= sample[0] <= now_ms + 60_000]
+    rows = save_receiver_samples(camera_id, samples) if samples else []
+
+    channel_layer = get_channel_layer()
+    for row in rows:
+        # Partial: a later batch refolds the bucket, so browsers must not move their cursor past it
+        event = {'type': 'metrics_update', 'camera_id': camera_id, 'source': 'receiver', 'partial': True,
+                 'point': rollup_point(row, RECEIVER_SERIES_FIELDS)}
+        for topic in (f'metrics:{camera_id}', 'metrics:*'):
+            async_to_sync(channel_layer.group_send)(topic_group(topic), {**event, 'topic': topic})
+    return JsonResponse({'stored': len(samples), 'camera_id': camera_id})
+
+def viewers_api(request):
+    """
+    API endpoint for live viewer counts and egress bandwidth per stream.
+    Browsers on /ws/camera/ get the same snapshot pushed as 'viewers' messages.
+    """
+    return JsonResponse(viewer_registry.snapshot())
+
+def viewer_queues_api(request):
+    """API endpoint for per-socket send queue counters (sent, coalesced, dropped, depth) of open browser sockets"""
+    return JsonResponse({'sockets': queue_stats()})
+
+def command_latency_api(request):
+    """
+    API endpoint for camera setting command outcomes and round-trip latency
+    (server -> publisher -> server) histograms, overall and per setting.
+    """
+    return JsonResponse(command_tracker.snapshot())
@@ -2,17 +2,20 @@ import os
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
-from app.routing import websocket_urlpatterns
 from channels.security.websocket import AllowedHostsOriginValidator
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'live_feed.settings')
 
+# Set up Django before importing the consumers, which import models
+django_asgi_app = get_asgi_application()
+
+from app.routing import websocket_urlpatterns
 
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AllowedHostsOriginValidator(
         AuthMiddlewareStack(
             URLRouter(websocket_urlpatterns)
         )
     ),
-})
\ No newline at end of file
+})
@@ -0,0 +1,46 @@
+"""
+Framing of the Pi <-> Django control channel.
+
+Every WebSocket frame on /ws/camera/ between a publisher and Django is one
+Envelope: a framing version, the camera the frame concerns, a sequence
+number, and one or more ControlMessages whose oneof payload says what they
+are. The publisher batches a camera's status and acks into one frame per
+tick instead of one frame each.
+
+ENVELOPE_VERSION only changes when the framing itself does. A new payload
+type is a new oneof member: older receivers see a message with no payload
+set and skip it.
+"""
+from . import messages_pb2
+
+ENVELOPE_VERSION = 1
+
+
+def pack(camera_id, sequence, messages):
+    """Serialize ControlMessages for one camera into a frame"""
+    envelope = messages_pb2.Envelope(version=ENVELOPE_VERSION, camera_id=camera_id, sequence=sequence)
+    envelope.messages.extend(messages)
+    return envelope.SerializeToString()
+
+
+def unpack(data):
+    """Parse a frame; raises ValueError for a framing version this side does not speak"""
+    envelope = messages_pb2.Envelope()
+    envelope.ParseFromString(data)
+    if envelope.version != ENVELOPE_VERSION:
+        raise ValueError(f"Unsupported envelope version {envelope.version} (expected {ENVELOPE_VERSION})")
+    return envelope
+
+
+class SequenceTracker:
+    """Counts frames lost between a sender's sequence numbers on one connection"""
+    def __init__(self):
+        self.last = 0
+        self.lost = 0
+
+    def check(self, sequence):
+        """Record a received sequence number; returns how many frames were skipped before it"""
+        skipped = max(0, sequence - self.last - 1)
+        self.lost += skipped
+        self.last = max(self.last, sequence)
+        return skipped
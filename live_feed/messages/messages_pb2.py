@@ -1,38 +1,50 @@
-# -*- coding: utf-8 -*-
-# Generated by the protocol buffer compiler.  DO NOT EDIT!
-# NO CHECKED-IN PROTOBUF GENCODE
-# source: messages.proto
-# Protobuf Python Version: 6.31.1
-"""Generated protocol buffer code."""
-from google.protobuf import descriptor as _descriptor
-from google.protobuf import descriptor_pool as _descriptor_pool
-from google.protobuf import runtime_version as _runtime_version
-from google.protobuf import symbol_database as _symbol_database
-from google.protobuf.internal import builder as _builder
-_runtime_version.ValidateProtobufRuntimeVersion(
-    _runtime_version.Domain.PUBLIC,
-    6,
-    31,
-    1,
-    '',
-    'messages.proto'
-)
-# @@protoc_insertion_point(imports)
-
-_sym_db = _symbol_database.Default()
-
-
-
-
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0emessages.proto\x12\x08tutorial\"D\n\x0c\x43\x61meraStatus\x12\x13\n\x0bisConnected\x18\x01 \x01(\x08\x12\x12\n\nbrightness\x18\x02 \x01(\x05\x12\x0b\n\x03\x66ps\x18\x03 \x01(\x02\"7\n\x15\x43\x61meraSettingsCommand\x12\x0f\n\x07setting\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05\x62\x06proto3')
-
-_globals = globals()
-_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
-_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'messages_pb2', _globals)
-if not _descriptor._USE_C_DESCRIPTORS:
-  DESCRIPTOR._loaded_options = None
-  _globals['_CAMERASTATUS']._serialized_start=28
-  _globals['_CAMERASTATUS']._serialized_end=96
-  _globals['_CAMERASETTINGSCOMMAND']._serialized_start=98
-  _globals['_CAMERASETTINGSCOMMAND']._serialized_end=153
-# @@protoc_insertion_point(module_scope)
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: messages.proto
+# Protobuf Python Version: 6.31.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    6,
+    31,
+    1,
+    '',
+    'messages.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0emessages.proto\x12\x08tutorial\"\xab\x02\n\x0c\x43\x61meraStatus\x12\x13\n\x0bisConnected\x18\x01 \x01(\x08\x12\x12\n\nbrightness\x18\x02 \x01(\x05\x12\x0b\n\x03\x66ps\x18\x03 \x01(\x02\x12\x10\n\x08\x63ontrast\x18\x04 \x01(\x05\x12\x10\n\x08\x65xposure\x18\x05 \x01(\x05\x12\x0c\n\x04gain\x18\x06 \x01(\x05\x12\x15\n\rwhite_balance\x18\x07 \x01(\x05\x12\x11\n\tcamera_id\x18\x08 \x01(\t\x12\x11\n\tjitter_ms\x18\t \x01(\x02\x12\x16\n\x0e\x66rames_dropped\x18\n \x01(\r\x12\x19\n\x11\x66rames_duplicated\x18\x0b \x01(\r\x12\x13\n\x0b\x63pu_percent\x18\x0c \x01(\x02\x12\x14\n\x0c\x62itrate_kbps\x18\r \x01(\x02\x12\x12\n\nlatency_ms\x18\x0e \x01(\x02J\x04\x08\x0f\x10\x10\"l\n\x11\x43\x61meraSettingsAck\x12\x12\n\nrequest_id\x18\x01 \x01(\r\x12\x0f\n\x07setting\x18\x02 \x01(\t\x12\x11\n\trequested\x18\x03 \x01(\x05\x12\x0e\n\x06\x61\x63tual\x18\x04 \x01(\x05\x12\x0f\n\x07\x61pplied\x18\x05 \x01(\x08\"^\n\x15\x43\x61meraSettingsCommand\x12\x0f\n\x07setting\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05\x12\x11\n\tcamera_id\x18\x03 \x01(\t\x12\x12\n\nrequest_id\x18\x04 \x01(\r\"7\n\x0fKeyframeRequest\x12\x11\n\tcamera_id\x18\x01 \x01(\t\x12\x11\n\trendition\x18\x02 \x01(\t\"3\n\x0fSnapshotRequest\x12\x11\n\tcamera_id\x18\x01 \x01(\t\x12\r\n\x05width\x18\x02 \x01(\r\"F\n\x0e\x43\x61meraSnapshot\x12\x11\n\tcamera_id\x18\x01 \x01(\t\x12\x0c\n\x04jpeg\x18\x02 \x01(\x0c\x12\x13\n\x0b\x63\x61ptured_at\x18\x03 \x01(\x01\"l\n\x08\x45nvelope\x12\x0f\n\x07version\x18\x01 \x01(\r\x12\x11\n\tcamera_id\x18\x02 \x01(\t\x12\x10\n\x08sequence\x18\x03 \x01(\x04\x12*\n\x08messages\x18\x04 \x03(\x0b\x32\x18.tutorial.ControlMessage\"\xb9\x02\n\x0e\x43ontrolMessage\x12(\n\x06status\x18\x01 \x01(\x0b\x32\x16.tutorial.CameraStatusH\x00\x12*\n\x03\x61\x63k\x18\x02 \x01(\x0b\x32\x1b.tutorial.CameraSettingsAckH\x00\x12\x32\n\x07\x63ommand\x18\x03 \x01(\x0b\x32\x1f.tutorial.CameraSettingsCommandH\x00\x12-\n\x08keyframe\x18\x04 \x01(\x0b\x32\x19.tutorial.KeyframeRequestH\x00\x12\x35\n\x10snapshot_request\x18\x05 \x01(\x0b\x32\x19.tutorial.SnapshotRequestH\x00\x12,\n\x08snapshot\x18\x06 \x01(\x0b\x32\x18.tutorial.CameraSnapshotH\x00\x42\t\n\x07payloadb\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'messages_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_CAMERASTATUS']._serialized_start=29
+  _globals['_CAMERASTATUS']._serialized_end=328
+  _globals['_CAMERASETTINGSACK']._serialized_start=330
+  _globals['_CAMERASETTINGSACK']._serialized_end=438
+  _globals['_CAMERASETTINGSCOMMAND']._serialized_start=440
+  _globals['_CAMERASETTINGSCOMMAND']._serialized_end=534
+  _globals['_KEYFRAMEREQUEST']._serialized_start=536
+  _globals['_KEYFRAMEREQUEST']._serialized_end=591
+  _globals['_SNAPSHOTREQUEST']._serialized_start=593
+  _globals['_SNAPSHOTREQUEST']._serialized_end=644
+  _globals['_CAMERASNAPSHOT']._serialized_start=646
+  _globals['_CAMERASNAPSHOT']._serialized_end=716
+  _globals['_ENVELOPE']._serialized_start=718
+  _globals['_ENVELOPE']._serialized_end=826
+  _globals['_CONTROLMESSAGE']._serialized_start=829
+  _globals['_CONTROLMESSAGE']._serialized_end=1142
+# @@protoc_insertion_point(module_scope)
@@ -6,114 +6,260 @@
 Chart.defaults.color = '#94a3b8';
 Chart.defaults.borderColor = 'rgba(148, 163, 184, 0.1)';
 
-// System Performance Chart
-function initPerformanceChart() {
-    const performanceCtx = document.getElementById('performanceChart').getContext('2d');
-    new Chart(performanceCtx, {
-        type: 'line',
-        data: {
-            labels: ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
-            datasets: [
-                {
-                    label: 'CPU Usage (%)',
-                    data: [42, 48, 45, 51, 47, 45, 49],
-                    borderColor: '#06b6d4',
-                    backgroundColor: 'rgba(6, 182, 212, 0.1)',
-                    tension: 0.4,
-                    fill: true
-                },
-                {
-                    label: 'Memory Usage (%)',
-                    data: [58, 62, 60, 65, 63, 61, 64],
-                    borderColor: '#8b5cf6',
-                    backgroundColor: 'rgba(139, 92, 246, 0.1)',
-                    tension: 0.4,
-                    fill: true
-                }
-            ]
+const METRICS_WINDOW_SECONDS = 24 * 3600;
+const CAMERA_COLORS = ['#06b6d4', '#8b5cf6', '#f59e0b', '#10b981', '#ef4444', '#ec4899'];
+// Series the charts plot; only these are requested from /api/metrics/
+const SERIES = ['fps', 'cpu', 'bitrate_kbps', 'latency_ms', 'dropped', 'receiver_fps', 'receiver_latency_ms'];
+
+// camera_id -> {t: [...], fps: [...], ...}; filled from /api/metrics/ and extended by WebSocket pushes
+let metricsSeries = {};
+let metricsCursor = null;
+let metricsOffline = false;
+let analyticsCharts = {};
+
+function cameraColor(index, alpha = 1) {
+    const hex = CAMERA_COLORS[index % CAMERA_COLORS.length];
+    if (alpha === 1) return hex;
+    const [r, g, b] = [1, 3, 5].map(i => parseInt(hex.slice(i, i + 2), 16));
+    return `rgba(${r}, ${g}, ${b}, ${alpha})`;
+}
+
+function chartOptions(extraScales = {}) {
+    return {
+        responsive: true,
+        maintainAspectRatio: false,
+        animation: false,
+        spanGaps: false,
+        elements: { point: { radius: 0 } },
+        interaction: { mode: 'index', intersect: false },
+        plugins: {
+            legend: {
+                display: true,
+                position: 'bottom'
+            }
         },
-        options: {
-            responsive: true,
-            maintainAspectRatio: false,
-            plugins: {
-                legend: {
-                    display: true,
-                    position: 'bottom'
+        scales: {
+            y: {
+                beginAtZero: true,
+                grid: {
+                    color: 'rgba(148, 163, 184, 0.1)'
                 }
             },
-            scales: {
-                y: {
-                    beginAtZero: true,
-                    max: 100,
-                    grid: {
-                        color: 'rgba(148, 163, 184, 0.1)'
-                    }
+            x: {
+                grid: {
+                    display: false
                 },
-                x: {
-                    grid: {
-                        display: false
-                    }
-                }
-            }
+                ticks: { maxTicksLimit: 8 }
+            },
+            ...extraScales
         }
+    };
+}
+
+// System Performance Chart: publisher and receiver FPS per camera, publisher CPU on a second axis
+function initPerformanceChart() {
+    const performanceCtx = document.getElementById('performanceChart').getContext('2d');
+    analyticsCharts.performance = new Chart(performanceCtx, {
+        type: 'line',
+        data: { labels: [], datasets: [] },
+        options: chartOptions({
+            y1: {
+                position: 'right',
+                beginAtZero: true,
+                max: 100,
+                grid: { display: false },
+                title: { display: true, text: 'CPU %' }
+            }
+        })
     });
 }
 
-// Network Usage Chart
+// Network Usage Chart: encoded bitrate per camera
 function initNetworkChart() {
     const networkCtx = document.getElementById('networkChart').getContext('2d');
-    new Chart(networkCtx, {
-        type: 'bar',
-        data: {
-            labels: ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
-            datasets: [
-                {
-                    label: 'Upload (Mbps)',
-                    data: [2.4, 2.8, 2.5, 3.1, 2.9, 2.7, 3.0],
-                    backgroundColor: 'rgba(6, 182, 212, 0.5)',
-                    borderColor: '#06b6d4',
-                    borderWidth: 1
-                },
-                {
-                    label: 'Download (Mbps)',
-                    data: [1.2, 1.5, 1.3, 1.8, 1.6, 1.4, 1.7],
-                    backgroundColor: 'rgba(139, 92, 246, 0.5)',
-                    borderColor: '#8b5cf6',
-                    borderWidth: 1
-                }
-            ]
-        },
-        options: {
-            responsive: true,
-            maintainAspectRatio: false,
-            plugins: {
-                legend: {
-                    display: true,
-                    position: 'bottom'
-                }
-            },
-            scales: {
-                y: {
-                    beginAtZero: true,
-                    grid: {
-                        color: 'rgba(148, 163, 184, 0.1)'
-                    }
-                },
-                x: {
-                    grid: {
-                        display: false
-                    }
-                }
+    analyticsCharts.network = new Chart(networkCtx, {
+        type: 'line',
+        data: { labels: [], datasets: [] },
+        options: chartOptions()
+    });
+}
+
+// Latency Chart: capture-to-encoder and receiver-estimated latency per camera, pacing drops as bars
+function initLatencyChart() {
+    const latencyCtx = document.getElementById('latencyChart').getContext('2d');
+    analyticsCharts.latency = new Chart(latencyCtx, {
+        type: 'line',
+        data: { labels: [], datasets: [] },
+        options: chartOptions({
+            y1: {
+                position: 'right',
+                beginAtZero: true,
+                grid: { display: false },
+                title: { display: true, text: 'Frames dropped / min' }
             }
+        })
+    });
+}
+
+// Merge rollup points for one camera in time order. A point for an existing bucket replaces the
+// series it carries: publisher and receiver points for one bucket arrive separately
+function mergePoints(cameraId, points) {
+    const series = metricsSeries[cameraId] ||= Object.fromEntries(['t', ...SERIES].map(name => [name, []]));
+    points.forEach(point => {
+        // Points almost always belong at the end, so scan back from there
+        let i = series.t.length;
+        while (i > 0 && series.t[i - 1] > point.t) i--;
+        if (i > 0 && series.t[i - 1] === point.t) {
+            SERIES.forEach(name => {
+                if (name in point) series[name][i - 1] = point[name];
+            });
+        } else {
+            series.t.splice(i, 0, point.t);
+            SERIES.forEach(name => series[name].splice(i, 0, point[name] ?? null));
         }
     });
+
+    // Keep the chart window bounded
+    const oldest = Date.now() / 1000 - METRICS_WINDOW_SECONDS;
+    const keep = series.t.findIndex(t => t >= oldest);
+    if (keep > 0) {
+        ['t', ...SERIES].forEach(name => series[name].splice(0, keep));
+    }
+}
+
+// /api/metrics/ returns, per camera, a list of column blocks in time order
+function mergeColumns(series) {
+    Object.entries(series).forEach(([cameraId, blocks]) => {
+        blocks.forEach(columns => {
+            const points = columns.t.map((t, i) => {
+                const point = { t };
+                SERIES.forEach(name => point[name] = columns[name][i]);
+                return point;
+            });
+            mergePoints(cameraId, points);
+        });
+    });
+}
+
+// Rebuild chart data on a shared time axis; cameras without a point in a bucket get a gap
+function renderCharts() {
+    if (!analyticsCharts.performance) return;
+
+    const cameras = Object.keys(metricsSeries).sort();
+    const times = [...new Set(cameras.flatMap(id => metricsSeries[id].t))].sort((a, b) => a - b);
+    const slot = new Map(times.map((t, i) => [t, i]));
+    const labels = times.map(t => new Date(t * 1000).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }));
+
+    const aligned = (cameraId, name) => {
+        const values = new Array(times.length).fill(null);
+        const series = metricsSeries[cameraId];
+        series.t.forEach((t, i) => values[slot.get(t)] = series[name][i]);
+        return values;
+    };
+    const line = (label, data, index, extra = {}) => ({
+        label, data,
+        borderColor: cameraColor(index),
+        backgroundColor: cameraColor(index, 0.1),
+        borderWidth: 2,
+        tension: 0.3,
+        ...extra
+    });
+
+    // CPU is reported per publisher host; average across cameras for one line
+    const cpuByCamera = cameras.map(id => aligned(id, 'cpu'));
+    const cpu = times.map((_, i) => {
+        const values = cpuByCamera.map(values => values[i]).filter(v => v !== null);
+        return values.length ? values.reduce((a, b) => a + b, 0) / values.length : null;
+    });
+
+    analyticsCharts.performance.data.labels = labels;
+    analyticsCharts.performance.data.datasets = [
+        ...cameras.map((id, i) => line(`${id} FPS`, aligned(id, 'fps'), i)),
+        ...cameras.map((id, i) => line(`${id} receiver FPS`, aligned(id, 'receiver_fps'), i, { borderDash: [2, 3] })),
+        { label: 'CPU Usage (%)', data: cpu, yAxisID: 'y1', borderColor: '#94a3b8', borderDash: [4, 4], borderWidth: 1, tension: 0.3 }
+    ];
+
+    analyticsCharts.network.data.labels = labels;
+    analyticsCharts.network.data.datasets = cameras.map((id, i) =>
+        line(`${id} (kbps)`, aligned(id, 'bitrate_kbps'), i, { fill: true }));
+
+    analyticsCharts.latency.data.labels = labels;
+    analyticsCharts.latency.data.datasets = [
+        ...cameras.map((id, i) => line(`${id} latency (ms)`, aligned(id, 'latency_ms'), i)),
+        ...cameras.map((id, i) => line(`${id} receiver latency (ms)`, aligned(id, 'receiver_latency_ms'), i, { borderDash: [2, 3] })),
+        ...cameras.map((id, i) => ({
+            type: 'bar',
+            label: `${id} dropped`,
+            data: aligned(id, 'dropped'),
+            yAxisID: 'y1',
+            backgroundColor: cameraColor(i, 0.4)
+        }))
+    ];
+
+    Object.values(analyticsCharts).forEach(chart => chart.update('none'));
+    updateResourceCards(cpu);
+}
+
+function updateResourceCards(cpu) {
+    const latestCpu = cpu.filter(v => v !== null).pop();
+    const cpuValue = document.getElementById('cpu-usage-value');
+    if (cpuValue && latestCpu !== undefined) {
+        cpuValue.textContent = `${Math.round(latestCpu)}%`;
+        document.getElementById('cpu-usage-bar').style.width = `${Math.min(latestCpu, 100)}%`;
+    }
+}
+
+// Fetch rollups newer than the cursor; the first call loads the whole window
+async function fetchMetrics() {
+    const params = new URLSearchParams();
+    if (metricsCursor !== null) params.set('since', metricsCursor);
+
+    try {
+        params.set('fields', SERIES.join(','));
+        const response = await fetch(`/api/metrics/?${params}`);
+        const data = await response.json();
+        mergeColumns(data.series);
+        metricsCursor = data.cursor;
+        renderCharts();
+    } catch (error) {
+        console.error('❌ Failed to load metrics:', error);
+    }
+}
+
+// Live deltas: the server pushes each closed minute and periodic previews of the open one
+function handleMetricsMessage(data) {
+    mergePoints(data.camera_id, [data.point]);
+    if (!data.partial) {
+        metricsCursor = Math.max(metricsCursor ?? 0, data.point.t);
+    }
+    renderCharts();
+}
+
+// Fill in whatever closed while the shared socket was down
+function handleMetricsSocketState(connected) {
+    if (!connected) {
+        metricsOffline = true;
+    } else if (metricsOffline && document.getElementById('performanceChart')) {
+        metricsOffline = false;
+        fetchMetrics();
+    }
 }
 
 // Initialize analytics
 function initAnalytics() {
     console.log('📊 Initializing Analytics...');
+    Object.values(analyticsCharts).forEach(chart => chart.destroy());
+    analyticsCharts = {};
+    metricsSeries = {};
+    metricsCursor = null;
+
     initPerformanceChart();
     initNetworkChart();
+    initLatencyChart();
+    fetchMetrics();
+
+    subscribeTopic('metrics:*', handleMetricsMessage);
+    onCameraSocketState(handleMetricsSocketState);
     console.log('✅ Analytics Ready');
 }
 
@@ -0,0 +1,97 @@
+/* ============================================================================
+   CAMERA SOCKET - One /ws/camera/ connection shared by every page in the tab
+   ============================================================================ */
+
+// Pages subscribe to topics instead of opening their own socket:
+//   status:<camera_id>   camera_status / connection_status ('status:*' for every camera)
+//   metrics:<camera_id>  per-minute rollup points ('metrics:*' for every camera)
+//   commands             camera_setting commands sent from any tab
+//   viewers              live viewer counts and egress
+// The server only forwards a message to sockets subscribed to its topic.
+
+let cameraSocket = null;
+let cameraSocketRetry = null;
+const topicHandlers = new Map();       // topic -> Set of message handlers
+const pageTopicHandlers = [];          // [topic, handler] registered by the current page
+const socketStateHandlers = new Set(); // called with true on (re)connect, false on disconnect
+
+function connectCameraSocket() {
+    if (cameraSocket && cameraSocket.readyState <= WebSocket.OPEN) return;
+
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    cameraSocket = new WebSocket(`${protocol}//${window.location.host}/ws/camera/`);
+
+    cameraSocket.onopen = () => {
+        console.log('✅ Camera socket connected');
+        if (topicHandlers.size) {
+            cameraSocket.send(JSON.stringify({ type: 'subscribe', topics: [...topicHandlers.keys()] }));
+        }
+        socketStateHandlers.forEach(handler => handler(true));
+    };
+
+    cameraSocket.onmessage = (event) => {
+        let message;
+        try {
+            message = JSON.parse(event.data);
+        } catch (error) {
+            console.error('❌ Error parsing camera socket message:', error, 'Raw message:', event.data);
+            return;
+        }
+        const handlers = topicHandlers.get(message.topic);
+        if (handlers) {
+            handlers.forEach(handler => handler(message));
+        }
+    };
+
+    cameraSocket.onclose = () => {
+        console.log('🔌 Camera socket disconnected, attempting to reconnect...');
+        cameraSocket = null;
+        socketStateHandlers.forEach(handler => handler(false));
+        clearTimeout(cameraSocketRetry);
+        cameraSocketRetry = setTimeout(connectCameraSocket, 3000);
+    };
+}
+
+function cameraSocketOpen() {
+    return cameraSocket !== null && cameraSocket.readyState === WebSocket.OPEN;
+}
+
+// Send a JSON message; returns false if the socket is not connected
+function sendCameraMessage(message) {
+    if (!cameraSocketOpen()) {
+        connectCameraSocket();
+        return false;
+    }
+    cameraSocket.send(JSON.stringify(message));
+    return true;
+}
+
+// Register handler for a topic. Page-scoped handlers are dropped when navigation swaps the page;
+// pass pageScoped = false for handlers that should live as long as the tab.
+function subscribeTopic(topic, handler, pageScoped = true) {
+    let handlers = topicHandlers.get(topic);
+    if (!handlers) {
+        handlers = new Set();
+        topicHandlers.set(topic, handlers);
+        sendCameraMessage({ type: 'subscribe', topics: [topic] });
+    }
+    handlers.add(handler);
+    if (pageScoped) pageTopicHandlers.push([topic, handler]);
+}
+
+function unsubscribeTopic(topic, handler) {
+    const handlers = topicHandlers.get(topic);
+    if (!handlers || !handlers.delete(handler) || handlers.size) return;
+    topicHandlers.delete(topic);
+    sendCameraMessage({ type: 'unsubscribe', topics: [topic] });
+}
+
+function releasePageTopics() {
+    pageTopicHandlers.splice(0).forEach(([topic, handler]) => unsubscribeTopic(topic, handler));
+}
+
+function onCameraSocketState(handler) {
+    socketStateHandlers.add(handler);
+}
+
+document.addEventListener('DOMContentLoaded', connectCameraSocket);
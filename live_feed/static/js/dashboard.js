@@ -2,10 +2,13 @@
    DASHBOARD JAVASCRIPT
    ============================================================================ */
 
-let cameraWebSocket = null;
+let dashboardSubscribed = false;  // Subscribed to camera status via the shared socket (camera_socket.js)
 let isConnected = false;
 let isRecording = false;
 let currentView = 'all';
+let singleCameraId = null;  // Camera playing in the single view
+// Player (tile id or 'single') -> stream path it plays; reported to the server for viewer counts
+let watchedStreams = {};
 
 // === FPS COUNTER (Real-time message rate tracking) ===
 function createFpsCounter(windowMs = 1000) {
@@ -47,7 +50,21 @@ function selectCamera(cameraId) {
     } else {
         document.getElementById('camera-grid-all').classList.add('hidden');
         document.getElementById('camera-grid-single').classList.remove('hidden');
-        document.getElementById('single-camera-label').textContent = `Camera ${cameraId}`;
+        const label = document.getElementById('single-camera-label');
+        label.textContent = `Camera ${cameraId}`;
+        getStreamConfig().then(config => {
+            const camera = tileCamera(config, cameraId);
+            if (camera) label.textContent = camera.name;
+        }).catch(() => {});
+
+        // The single view plays one camera; picking another one needs a new connect
+        if (singleCameraId !== null && singleCameraId !== cameraId) {
+            stopTile('single');
+            singleCameraId = null;
+            document.getElementById('overlay-single').classList.remove('hidden');
+            document.getElementById('video-single').classList.add('hidden');
+        }
+        refreshSnapshots();
     }
 }
 
@@ -88,62 +105,96 @@ function toggleRecording() {
     }
 }
 
-// Connect individual camera
-async function connectCamera(cameraId, event) {
-    console.log(`🔌 Connecting to Camera ${cameraId}...`);
-
-    // Add ripple effect to button
-    const button = event.currentTarget.querySelector('.connect-btn-overlay');
-    button.classList.add('clicked');
-    setTimeout(() => button.classList.remove('clicked'), 600);
+// === STREAM CONFIG ===
+
+// Registered cameras in tile order (/api/cameras/), fetched once per tab and shared as a promise
+let streamConfigPromise = null;
+
+function getStreamConfig() {
+    if (!streamConfigPromise) {
+        streamConfigPromise = fetch('/api/cameras/')
+            .then(response => {
+                if (!response.ok) throw new Error(`Camera registry request failed: ${response.statusText}`);
+                return response.json();
+            })
+            .then(config => {
+                console.log('Stream config:', config);
+                labelTiles(config.cameras);
+                return config;
+            })
+            .catch(error => {
+                streamConfigPromise = null;  // retry on the next connect
+                throw error;
+            });
+    }
+    return streamConfigPromise;
+}
 
-    try {
-        // Fetch stream configuration from API
-        const response = await fetch('/api/status/');
-        const config = await response.json();
+// Camera for a tile number (1-based), or undefined if fewer cameras are registered
+function tileCamera(config, cameraId) {
+    return config.cameras[cameraId - 1];
+}
 
-        console.log('Stream config:', config);
+function labelTiles(cameras) {
+    cameras.slice(0, 4).forEach((camera, i) => {
+        const label = document.querySelector(`#video-${i + 1}`)?.closest('.camera-feed')?.querySelector('.camera-label');
+        if (label) label.textContent = camera.name;
+    });
+}
 
-        // Get video element
-        const video = document.getElementById(`video-${cameraId}`);
+// === SNAPSHOT PREVIEWS ===
 
-        // Connect using WebRTC (preferred for low latency)
-        if (config.webrtc_url) {
-            await connectVideoWebRTC(video, config.webrtc_url, cameraId);
-        } else {
-            throw new Error('No stream URL available');
-        }
+// Tiles that are not playing show the camera's latest snapshot behind the connect button;
+// WebRTC is only negotiated once a tile is connected
+const SNAPSHOT_REFRESH_MS = 5000;
 
-        // Hide overlay and show video on success
-        const overlay = document.getElementById(`overlay-${cameraId}`);
-        setTimeout(() => {
-            overlay.classList.add('hidden');
-            video.classList.remove('hidden');
-        }, 300);
+function refreshSnapshots() {
+    if (document.hidden) return;
+    getStreamConfig().then(config => {
+        config.cameras.slice(0, 4).forEach((camera, i) => showSnapshot(`overlay-${i + 1}`, camera));
+        if (currentView !== 'all') showSnapshot('overlay-single', tileCamera(config, currentView));
+    }).catch(() => {});
+}
 
-        console.log(`✅ Camera ${cameraId} connected successfully`);
-    } catch (error) {
-        console.error(`❌ Failed to connect Camera ${cameraId}:`, error);
-        alert(`Failed to connect to camera: ${error.message}`);
-    }
+function showSnapshot(overlayId, camera) {
+    const overlay = document.getElementById(overlayId);
+    if (!overlay || !camera || overlay.classList.contains('hidden')) return;
+    // Load off-screen first, so a failed grab keeps the previous preview; the server
+    // caches snapshots, so the bucketed query only decides when the browser asks again
+    const image = new Image();
+    image.onload = () => {
+        overlay.style.backgroundImage = `linear-gradient(rgba(0, 0, 0, 0.3), rgba(0, 0, 0, 0.3)), url("${image.src}")`;
+        overlay.classList.add('snapshot');
+    };
+    image.src = `${camera.snapshot_url}?t=${Math.floor(Date.now() / SNAPSHOT_REFRESH_MS)}`;
 }
 
-// WebRTC connection for video element
-async function connectVideoWebRTC(videoElement, webrtcUrl, cameraId) {
-    console.log(`📡 Connecting Camera ${cameraId} via WebRTC...`);
+// === WEBRTC SESSIONS ===
+
+// One WHEP session per stream URL, shared by every tile showing that stream
+const whepSessions = new Map();  // webrtcUrl -> { pc, media: Promise<MediaStream>, resource, tiles: Set, closeTimer }
+// view ('tile-1'..'tile-4', 'single') -> { video, tile, webrtcUrl, audio, visible, attached }
+const tilePlayers = new Map();
+// Sessions without a visible tile are kept briefly so scrolling back or refocusing the tab is instant
+const SESSION_IDLE_CLOSE_MS = 10000;
+
+// WHEP negotiation for one stream
+async function connectVideoWebRTC(webrtcUrl, audio) {
+    console.log(`📡 Negotiating WebRTC session for ${streamPath(webrtcUrl)}...`);
 
     const pc = new RTCPeerConnection({
         iceServers: [{ urls: 'stun:stun.l.google.com:19302' }]
     });
 
-    pc.ontrack = (event) => {
-        console.log(`✅ Camera ${cameraId} stream received`);
-        videoElement.srcObject = event.streams[0];
-        videoElement.play().catch(e => console.error('Play error:', e));
-    };
+    const media = new Promise(resolve => {
+        pc.ontrack = (event) => resolve(event.streams[0]);
+    });
 
     pc.addTransceiver('video', { direction: 'recvonly' });
-    pc.addTransceiver('audio', { direction: 'recvonly' });
+    // The publisher sends video only; an audio m-line just adds negotiation and RTCP overhead
+    if (audio) {
+        pc.addTransceiver('audio', { direction: 'recvonly' });
+    }
 
     const offer = await pc.createOffer();
     await pc.setLocalDescription(offer);
@@ -155,6 +206,7 @@ async function connectVideoWebRTC(videoElement, webrtcUrl, cameraId) {
     });
 
     if (!response.ok) {
+        pc.close();
         throw new Error(`WebRTC connection failed: ${response.statusText}`);
     }
 
@@ -164,7 +216,209 @@ async function connectVideoWebRTC(videoElement, webrtcUrl, cameraId) {
         sdp: answer
     });
 
-    return pc;
+    const location = response.headers.get('Location');
+    return { pc, media, resource: location && new URL(location, webrtcUrl).href };
+}
+
+function acquireSession(webrtcUrl, audio) {
+    let session = whepSessions.get(webrtcUrl);
+    if (!session) {
+        session = { tiles: new Set(), closeTimer: null };
+        session.ready = connectVideoWebRTC(webrtcUrl, audio).then(result => Object.assign(session, result));
+        session.ready.catch(() => whepSessions.delete(webrtcUrl));
+        whepSessions.set(webrtcUrl, session);
+    }
+    clearTimeout(session.closeTimer);
+    session.closeTimer = null;
+    return session;
+}
+
+function releaseSession(webrtcUrl, view, immediate = false) {
+    const session = whepSessions.get(webrtcUrl);
+    if (!session) return;
+    session.tiles.delete(view);
+    if (session.tiles.size) return;
+
+    clearTimeout(session.closeTimer);
+    session.closeTimer = setTimeout(() => closeSession(webrtcUrl), immediate ? 0 : SESSION_IDLE_CLOSE_MS);
+}
+
+function closeSession(webrtcUrl) {
+    const session = whepSessions.get(webrtcUrl);
+    if (!session || session.tiles.size) return;
+    whepSessions.delete(webrtcUrl);
+    session.ready.then(() => {
+        session.pc.close();
+        // Ends the session on MediaMTX now instead of when ICE times out
+        if (session.resource) {
+            fetch(session.resource, { method: 'DELETE' }).catch(() => {});
+        }
+        console.log(`⏸️ Closed WebRTC session for ${streamPath(webrtcUrl)}`);
+    }, () => {});
+}
+
+// === TILE PLAYBACK ===
+
+const tileObserver = new IntersectionObserver(entries => {
+    entries.forEach(entry => {
+        const view = entry.target.dataset.view;
+        const player = tilePlayers.get(view);
+        if (player) {
+            player.visible = entry.isIntersecting;
+            updateTile(view);
+        }
+    });
+});
+
+// Tiles only hold a session while on screen in a visible tab
+document.addEventListener('visibilitychange', () => {
+    tilePlayers.forEach((_, view) => updateTile(view));
+});
+
+async function playTile(view, video, webrtcUrl, audio) {
+    stopTile(view);
+    // Observe the tile rather than the video, which stays hidden until the first frame
+    const tile = video.closest('.camera-feed') || video;
+    const player = { video, tile, webrtcUrl, audio, visible: true, attached: false };
+    tilePlayers.set(view, player);
+    tile.dataset.view = view;
+    tileObserver.observe(tile);
+    await attachTile(view);
+}
+
+async function attachTile(view) {
+    const player = tilePlayers.get(view);
+    player.attached = true;
+    const session = acquireSession(player.webrtcUrl, player.audio);
+    session.tiles.add(view);
+    reportWatching(view, player.webrtcUrl);
+
+    try {
+        await session.ready;
+        const stream = await session.media;
+        // The tile may have been parked or stopped while negotiating
+        if (tilePlayers.get(view) !== player || !player.attached) return;
+        player.video.srcObject = stream;
+        player.video.play().catch(e => console.error('Play error:', e));
+    } catch (error) {
+        detachTile(view);
+        throw error;
+    }
+}
+
+function detachTile(view, immediate = false) {
+    const player = tilePlayers.get(view);
+    if (!player || !player.attached) return;
+    player.attached = false;
+    player.video.pause();
+    player.video.srcObject = null;
+    releaseSession(player.webrtcUrl, view, immediate);
+    delete watchedStreams[view];
+    sendCameraMessage({ type: 'unwatch', view });
+}
+
+function updateTile(view) {
+    const player = tilePlayers.get(view);
+    const active = player.visible && !document.hidden;
+    if (active && !player.attached) {
+        console.log(`▶️ Resuming ${view}`);
+        attachTile(view).catch(error => console.error(`❌ Failed to resume ${view}:`, error));
+    } else if (!active && player.attached) {
+        console.log(`⏸️ Pausing ${view} (off-screen or hidden tab)`);
+        detachTile(view);
+    }
+}
+
+function stopTile(view) {
+    const player = tilePlayers.get(view);
+    if (!player) return;
+    tileObserver.unobserve(player.tile);
+    detachTile(view, true);
+    tilePlayers.delete(view);
+}
+
+// Connect one grid tile; tiles showing the same stream share a session
+async function connectTile(cameraId) {
+    const camera = tileCamera(await getStreamConfig(), cameraId);
+    if (!camera) {
+        throw new Error('No camera registered for this tile');
+    }
+
+    // Grid tiles use the low-resolution sub-stream when the camera provides one
+    const [webrtcUrl, fallbackUrl] = [camera.sub_webrtc_url, camera.webrtc_url].filter(Boolean);
+    if (!webrtcUrl) {
+        throw new Error('No stream URL available');
+    }
+
+    const video = document.getElementById(`video-${cameraId}`);
+    try {
+        await playTile(`tile-${cameraId}`, video, webrtcUrl, camera.has_audio);
+    } catch (error) {
+        // A registered sub path has no source when the publisher runs with --sub-size 0
+        if (!fallbackUrl) throw error;
+        console.warn(`⚠️ Sub-stream unavailable for Camera ${cameraId}, using the main stream:`, error);
+        await playTile(`tile-${cameraId}`, video, fallbackUrl, camera.has_audio);
+    }
+
+    // Hide overlay and show video on success
+    const overlay = document.getElementById(`overlay-${cameraId}`);
+    setTimeout(() => {
+        overlay.classList.add('hidden');
+        video.classList.remove('hidden');
+    }, 300);
+
+    console.log(`✅ Camera ${cameraId} connected successfully`);
+}
+
+// Connect individual camera
+async function connectCamera(cameraId, event) {
+    console.log(`🔌 Connecting to Camera ${cameraId}...`);
+
+    // Add ripple effect to button
+    const button = event.currentTarget.querySelector('.connect-btn-overlay');
+    button.classList.add('clicked');
+    setTimeout(() => button.classList.remove('clicked'), 600);
+
+    try {
+        await connectTile(cameraId);
+    } catch (error) {
+        console.error(`❌ Failed to connect Camera ${cameraId}:`, error);
+        alert(`Failed to connect to camera: ${error.message}`);
+    }
+}
+
+// Connect every idle grid tile that has a camera; negotiations run in parallel
+async function connectGrid() {
+    let config;
+    try {
+        config = await getStreamConfig();
+    } catch (error) {
+        console.error('❌ Failed to load cameras:', error);
+        return;
+    }
+    const idle = [1, 2, 3, 4].filter(i =>
+        tileCamera(config, i) && !tilePlayers.has(`tile-${i}`) && document.getElementById(`video-${i}`));
+    const results = await Promise.allSettled(idle.map(connectTile));
+    results.forEach((result, i) => {
+        if (result.status === 'rejected') {
+            console.error(`❌ Failed to connect Camera ${idle[i]}:`, result.reason);
+        }
+    });
+}
+
+// Stream path from a WHEP URL, e.g. http://host:8889/zerolatency_sub/whep -> zerolatency_sub
+function streamPath(webrtcUrl) {
+    return new URL(webrtcUrl, window.location.href).pathname.split('/')[1];
+}
+
+// Tell the server this player is watching a stream; resent whenever the socket (re)opens
+function reportWatching(view, webrtcUrl) {
+    watchedStreams[view] = streamPath(webrtcUrl);
+    sendWatch(view);
+}
+
+function sendWatch(view) {
+    sendCameraMessage({ type: 'watch', view, stream: watchedStreams[view] });
 }
 
 // Connect single camera view
@@ -177,18 +431,19 @@ async function connectSingleCamera(event) {
     setTimeout(() => button.classList.remove('clicked'), 600);
 
     try {
-        // Fetch stream configuration from API
-        const response = await fetch('/api/status/');
-        const config = await response.json();
-
-        console.log('Stream config:', config);
+        // The camera picked with the camera buttons, main rendition
+        const camera = tileCamera(await getStreamConfig(), currentView === 'all' ? 1 : currentView);
+        if (!camera) {
+            throw new Error('No camera registered for this view');
+        }
 
         // Get video element
         const video = document.getElementById('video-single');
 
         // Connect using WebRTC (preferred for low latency)
-        if (config.webrtc_url) {
-            await connectVideoWebRTC(video, config.webrtc_url, 'single');
+        if (camera.webrtc_url) {
+            await playTile('single', video, camera.webrtc_url, camera.has_audio);
+            singleCameraId = currentView === 'all' ? 1 : currentView;
         } else {
             throw new Error('No stream URL available');
         }
@@ -211,37 +466,45 @@ async function connectSingleCamera(event) {
 function handleConnect() {
     console.log('🔌 Connecting to camera system...');
 
-    const wsUrl = `ws://${window.location.host}/ws/camera/`;
-    cameraWebSocket = new WebSocket(wsUrl);
-
-    cameraWebSocket.onopen = function() {
+    // Tab-lived subscriptions: the dashboard keeps its camera connection across page swaps
+    dashboardSubscribed = true;
+    subscribeTopic('status:*', handleCameraMessage, false);
+    subscribeTopic('viewers', handleCameraMessage, false);
+    if (cameraSocketOpen()) {
         console.log('✅ Connected to camera system');
         showConnectedState();
-    };
-
-    cameraWebSocket.onmessage = function(event) {
-        try {
-            const message = JSON.parse(event.data);
-            handleCameraMessage(message);
-        } catch (e) {
-            console.error('❌ Error parsing message from Pi:', e, 'Raw message:', event.data);
-        }
-    };
+    }
+    if (currentView === 'all') {
+        connectGrid();
+    }
+}
 
-    cameraWebSocket.onclose = function() {
+function handleDashboardSocketState(connected) {
+    if (connected) {
+        // The server dropped this tab's viewer sessions with the old socket
+        Object.keys(watchedStreams).forEach(sendWatch);
+    }
+    if (!dashboardSubscribed) return;
+    if (connected) {
+        console.log('✅ Connected to camera system');
+        showConnectedState();
+    } else {
         console.log('❌ Disconnected from camera system');
         showDisconnectedState();
-    };
+    }
 }
 
 // Stop/Disconnect from camera system
 function handleStop() {
     console.log('⏹️ Stopping camera system...');
 
-    if (cameraWebSocket) {
-        cameraWebSocket.close();
-        cameraWebSocket = null;
-    }
+    dashboardSubscribed = false;
+    unsubscribeTopic('status:*', handleCameraMessage);
+    unsubscribeTopic('viewers', handleCameraMessage);
+    // Close every tile's WebRTC session
+    [...tilePlayers.keys()].forEach(stopTile);
+    singleCameraId = null;
+    streamConfigPromise = null;
 
     // Reset all camera feeds
     for (let i = 1; i <= 4; i++) {
@@ -250,7 +513,6 @@ function handleStop() {
 
         const video = document.getElementById(`video-${i}`);
         video.classList.add('hidden');
-        video.src = '';
     }
 
     // Reset single camera view
@@ -259,7 +521,6 @@ function handleStop() {
 
     const videoSingle = document.getElementById('video-single');
     videoSingle.classList.add('hidden');
-    videoSingle.src = '';
 
     showDisconnectedState();
     console.log('✅ Camera system stopped');
@@ -284,6 +545,10 @@ function handleCameraMessage(message) {
             handleErrorAlert(message);
             break;
 
+        case 'viewers':
+            handleViewers(message);
+            break;
+
         default:
             console.warn('⚠️ Unknown message type:', message.type, message);
     }
@@ -357,6 +622,17 @@ function handleSystemMetrics(message) {
     }
 }
 
+// === Handle viewer counts (pushed whenever a viewer joins or leaves) ===
+function handleViewers(message) {
+    const viewers = document.getElementById('network-viewers');
+    if (!viewers) return;
+    viewers.textContent = message.total_viewers;
+    const egress = document.getElementById('network-egress');
+    egress.textContent = `${(message.total_egress_kbps / 1000).toFixed(2)} Mbps`;
+    // Over the uplink budget: viewers should be moved to sub-streams
+    egress.classList.toggle('text-red-400', message.total_egress_kbps > message.egress_budget_kbps);
+}
+
 // === Handle error alerts ===
 function handleErrorAlert(message) {
     console.error('🚨 System alert:', message.message);
@@ -420,13 +696,12 @@ function showDisconnectedState() {
 
 // Send camera settings
 function sendCameraSetting(setting, value) {
-    if (cameraWebSocket && cameraWebSocket.readyState === WebSocket.OPEN) {
-        const message = {
-            type: 'update_camera_settings',
-            setting: setting,
-            value: value
-        };
-        cameraWebSocket.send(JSON.stringify(message));
+    const message = {
+        type: 'update_camera_settings',
+        setting: setting,
+        value: value
+    };
+    if (sendCameraMessage(message)) {
         console.log(`📡 Sent ${setting}: ${value}`);
     }
 }
@@ -450,8 +725,11 @@ function toggleMetrics() {
 // Initialize dashboard
 function initDashboard() {
     console.log('🚀 Security Surveillance Dashboard Starting...');
+    refreshSnapshots();
+    setInterval(refreshSnapshots, SNAPSHOT_REFRESH_MS);
     console.log('✅ Dashboard Ready');
 }
 
 // Start the application
+onCameraSocketState(handleDashboardSocketState);
 document.addEventListener('DOMContentLoaded', initDashboard);
@@ -8,6 +8,8 @@ let isMuted = false;
 let isTheaterMode = false;
 let currentVolume = 100;
 let streamConnection = null;
+let viewerSocket = null;
+let streamName = null;
 let videoElement = document.getElementById('video-player');
 let loadingOverlay = document.getElementById('loading-overlay');
 
@@ -65,6 +67,7 @@ async function connectToStream() {
         // Connect using WebRTC
         if (data.webrtc_url) {
             await connectWebRTC(data.webrtc_url);
+            watchViewerCount(new URL(data.webrtc_url, window.location.href).pathname.split('/')[1]);
         } else if (data.hls_url) {
             connectHLS(data.hls_url);
         } else {
@@ -179,6 +182,39 @@ function sendChatMessage() {
     }
 }
 
+// === VIEWER COUNT ===
+
+function updateViewerCount(snapshot) {
+    const stream = snapshot.streams[streamName];
+    document.getElementById('viewer-count').textContent = stream ? stream.viewers : 0;
+}
+
+// Register as a viewer of the stream; the server pushes counts whenever someone joins or leaves
+function watchViewerCount(name) {
+    streamName = name;
+    if (viewerSocket) return;
+
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    viewerSocket = new WebSocket(`${protocol}//${window.location.host}/ws/camera/`);
+
+    viewerSocket.onopen = () => {
+        viewerSocket.send(JSON.stringify({ type: 'subscribe', topics: ['viewers'] }));
+        viewerSocket.send(JSON.stringify({ type: 'watch', view: 'live', stream: streamName }));
+    };
+
+    viewerSocket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'viewers') {
+            updateViewerCount(message);
+        }
+    };
+
+    viewerSocket.onclose = () => {
+        viewerSocket = null;
+        setTimeout(() => watchViewerCount(streamName), 3000);
+    };
+}
+
 // === INITIALIZE ===
 
 function initializeStream() {
@@ -291,12 +327,6 @@ function initializeStream() {
         connectToStream();
     }, 1000);
 
-    // Simulate viewer count updates
-    setInterval(() => {
-        const viewers = Math.floor(Math.random() * 50) + 10;
-        document.getElementById('viewer-count').textContent = viewers;
-    }, 5000);
-
     console.log('✅ Stream page ready');
 }
 
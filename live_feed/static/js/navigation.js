@@ -73,6 +73,9 @@ async function loadPage(url, pageName, clickedLink) {
         // Insert new content after sidebar
         sidebar.insertAdjacentHTML('afterend', html);
 
+        // Drop the old page's topic subscriptions; the shared socket stays open
+        releasePageTopics();
+
         // Load page-specific CSS and JS
         await loadPageResources();
 
@@ -148,7 +151,7 @@ function initializePageScripts(pageName) {
             break;
 
         case 'settings':
-            // Reinitialize settings page WebSocket
+            // Resubscribe settings page topics
             if (typeof initSettings === 'function') {
                 initSettings();
             }
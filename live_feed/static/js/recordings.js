@@ -0,0 +1,200 @@
+/* ============================================================================
+   RECORDINGS JAVASCRIPT
+   ============================================================================ */
+
+let recordingsCursor = null;
+
+function formatDuration(seconds) {
+    const total = Math.round(seconds);
+    const h = Math.floor(total / 3600);
+    const m = Math.floor((total % 3600) / 60);
+    const s = total % 60;
+    const mm = String(m).padStart(h ? 2 : 1, '0');
+    const ss = String(s).padStart(2, '0');
+    return h ? `${h}:${mm}:${ss}` : `${mm}:${ss}`;
+}
+
+function formatSize(bytes) {
+    if (bytes === null || bytes === undefined) return '-';
+    const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+    let value = bytes;
+    let unit = 0;
+    while (value >= 1024 && unit < units.length - 1) {
+        value /= 1024;
+        unit++;
+    }
+    return `${value.toFixed(unit ? 1 : 0)} ${units[unit]}`;
+}
+
+function recordingTitle(recording) {
+    const start = new Date(recording.start_time);
+    return `${recording.camera_id} - ${start.toLocaleDateString()} ${start.toLocaleTimeString()}`;
+}
+
+// Build one list entry; thumbnails load lazily as they scroll into view
+function renderRecording(recording) {
+    const item = document.createElement('div');
+    item.className = 'recording-item';
+    item.onclick = () => playRecordingSegment(recording);
+
+    const duration = formatDuration(recording.duration);
+    item.innerHTML = `
+        <div class="flex items-center justify-between">
+            <div class="flex items-center gap-3">
+                <div class="relative">
+                    <img src="${recording.thumbnail_url}" loading="lazy" alt=""
+                         class="w-16 h-16 object-cover bg-slate-700 rounded-lg"
+                         onerror="this.replaceWith(Object.assign(document.createElement('div'), {className: 'w-16 h-16 bg-slate-700 rounded-lg'}))">
+                    <div class="absolute bottom-1 right-1 bg-black/80 text-white text-xs px-1 rounded">${duration}</div>
+                </div>
+                <div>
+                    <div class="text-sm font-medium text-slate-200"></div>
+                    <div class="text-xs text-slate-500">Duration: ${duration} • Size: ${formatSize(recording.size)}</div>
+                </div>
+            </div>
+            <div class="flex items-center space-x-2">
+                <button class="btn btn-ghost p-2 hover:text-cyan-500" title="Download">
+                    <i class="fas fa-download"></i>
+                </button>
+            </div>
+        </div>`;
+    item.querySelector('.text-sm.font-medium').textContent = recordingTitle(recording);
+    item.querySelector('button[title="Download"]').onclick = (event) => {
+        event.stopPropagation();
+        downloadRecording(recording.stream_url, recording.start_time);
+    };
+    return item;
+}
+
+// Fetch a page of recordings; append=true continues from the last cursor
+async function loadRecordings(append = false) {
+    const list = document.getElementById('recordings-list');
+    const emptyState = document.getElementById('empty-state');
+    const loadMore = document.getElementById('load-more-btn');
+    if (!list) return;
+
+    if (!append) {
+        recordingsCursor = null;
+        list.querySelectorAll('.recording-item').forEach(item => item.remove());
+    }
+
+    const params = new URLSearchParams();
+    if (recordingsCursor) params.set('cursor', recordingsCursor);
+
+    try {
+        const response = await fetch(`/api/recordings/?${params}`);
+        const data = await response.json();
+
+        data.recordings.forEach(recording => list.insertBefore(renderRecording(recording), emptyState));
+        addPlaybackCameras(data.recordings);
+        recordingsCursor = data.next_cursor;
+        loadMore.classList.toggle('hidden', !recordingsCursor);
+
+        if (!append) {
+            emptyState.classList.toggle('hidden', data.recordings.length > 0);
+            document.getElementById('total-recordings').textContent = data.total_count;
+            document.getElementById('storage-used').textContent = formatSize(data.total_size);
+            document.getElementById('storage-available').textContent = formatSize(data.storage_free);
+        }
+    } catch (error) {
+        console.error('❌ Failed to load recordings:', error);
+    }
+}
+
+// Play recording in video player; the server honours Range requests so seeking is cheap
+function playRecordingSegment(recording) {
+    const player = document.getElementById('recording-player');
+    const videoInfo = document.getElementById('current-video-info');
+
+    player.src = recording.stream_url;
+    player.load();
+    player.play().catch(e => console.error('Play error:', e));
+
+    document.getElementById('video-title').textContent = recordingTitle(recording);
+    document.getElementById('video-duration').textContent = `Duration: ${formatDuration(recording.duration)}`;
+    document.getElementById('video-size').textContent = `Size: ${formatSize(recording.size)}`;
+    document.getElementById('video-date').textContent = new Date(recording.start_time).toLocaleDateString();
+
+    videoInfo.classList.remove('hidden');
+    player.scrollIntoView({ behavior: 'smooth', block: 'nearest' });
+
+    console.log('Playing recording:', recordingTitle(recording));
+}
+
+// Offer the cameras seen so far as suggestions in the jump-to-time form
+function addPlaybackCameras(recordings) {
+    const datalist = document.getElementById('playback-cameras');
+    if (!datalist) return;
+    const known = new Set([...datalist.options].map(option => option.value));
+    recordings.forEach(recording => {
+        if (!known.has(recording.camera_id)) {
+            known.add(recording.camera_id);
+            datalist.appendChild(new Option(recording.camera_id, recording.camera_id));
+        }
+    });
+}
+
+// Play a camera from a wall-clock instant, continuing across segment boundaries
+async function playAtTime(camera, localTime) {
+    const params = new URLSearchParams({ camera, at: new Date(localTime).toISOString() });
+    const response = await fetch(`/api/playback/?${params}`);
+    const data = await response.json();
+    if (!response.ok) {
+        alert(data.error || 'No recording found');
+        return;
+    }
+
+    const player = document.getElementById('recording-player');
+    const start = new Date(data.keyframe_time);
+    player.src = data.stream_url;
+    player.load();
+    // Playback begins at the nearest earlier keyframe; skip the preroll once buffered
+    player.addEventListener('loadedmetadata', () => {
+        if (data.preroll > 0) player.currentTime += data.preroll;
+    }, { once: true });
+    player.play().catch(e => console.error('Play error:', e));
+
+    document.getElementById('video-title').textContent = `${data.camera_id} - ${start.toLocaleDateString()} ${start.toLocaleTimeString()}`;
+    document.getElementById('video-duration').textContent = '';
+    document.getElementById('video-size').textContent = '';
+    document.getElementById('video-date').textContent = `From ${new Date(params.get('at')).toLocaleTimeString()}`;
+    document.getElementById('current-video-info').classList.remove('hidden');
+
+    console.log('Playing from:', params.get('at'), data);
+}
+
+// Download recording
+function downloadRecording(url, name) {
+    console.log('Downloading:', url);
+    const link = document.createElement('a');
+    link.href = url;
+    link.download = name || url.split('/').pop();
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+}
+
+// Initialize recordings
+function initRecordings() {
+    console.log('📁 Recordings initialized');
+
+    document.getElementById('download-btn')?.addEventListener('click', function() {
+        const player = document.getElementById('recording-player');
+        if (player.src) {
+            downloadRecording(player.src);
+        }
+    });
+
+    document.getElementById('playback-form')?.addEventListener('submit', function(event) {
+        event.preventDefault();
+        const camera = document.getElementById('playback-camera').value.trim();
+        const time = document.getElementById('playback-time').value;
+        if (camera && time) {
+            playAtTime(camera, time);
+        }
+    });
+
+    loadRecordings();
+}
+
+document.addEventListener('DOMContentLoaded', initRecordings);
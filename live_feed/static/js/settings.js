@@ -2,9 +2,8 @@
    SETTINGS JAVASCRIPT
    ============================================================================ */
 
-// WebSocket connection
-let ws = null;
-let reconnectInterval = null;
+// Camera controls reported in camera_status and adjustable from the Camera tab
+const CAMERA_CONTROLS = ['brightness', 'contrast', 'exposure', 'gain', 'white_balance'];
 
 function switchTab(tab) {
     // Hide all tabs
@@ -30,44 +29,89 @@ function updateValue(id, value) {
     document.getElementById(id + '-val').textContent = value;
 }
 
-// WebSocket connection setup
-function connectWebSocket() {
-    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const wsUrl = `${protocol}//${window.location.host}/ws/camera/`;
-
-    ws = new WebSocket(wsUrl);
-
-    ws.onopen = () => {
-        console.log('✅ Settings WebSocket connected');
-        if (reconnectInterval) {
-            clearInterval(reconnectInterval);
-            reconnectInterval = null;
+// Slider changes awaiting a camera_setting_ack: setting -> { requestId, value, timer }.
+// While a change is pending its slider shows the requested value and ignores status updates;
+// the ack then snaps it to the value the camera actually took.
+const pendingSettings = new Map();
+const confirmedSettings = {};  // setting -> last value reported by the camera
+let settingRequestId = 0;
+const SETTING_ACK_TIMEOUT_MS = 3000;  // server answers 'timeout' after 1.5 s; this covers a lost socket
+let settingsCameraId = null;  // camera the sliders show and adjust; the first registered one by default
+
+// Update sliders with current camera settings from Pi
+function handleSettingsStatus(data) {
+    if (data.type !== 'camera_status' || data.camera_id !== settingsCameraId) return;
+    CAMERA_CONTROLS.forEach(setting => {
+        if (typeof data[setting] !== 'undefined') {
+            confirmedSettings[setting] = data[setting];
+            if (!pendingSettings.has(setting)) {
+                updateSliderValue(setting, data[setting]);
+            }
         }
-    };
+    });
+}
 
-    ws.onmessage = (event) => {
-        try {
-            const data = JSON.parse(event.data);
+// Settings changed from another tab show up before the Pi reports them back
+function handleSettingsCommand(data) {
+    if (data.camera_id !== settingsCameraId) return;
+    if (data.type === 'camera_setting_ack') {
+        handleSettingAck(data);
+    } else if (!pendingSettings.has(data.setting)) {
+        updateSliderValue(data.setting, data.value);
+    }
+}
 
-            if (data.type === 'camera_status') {
-                // Update slider with current camera setting from Pi
-                updateSliderValue('brightness', data.brightness);
-            }
-        } catch (error) {
-            console.error('Error parsing WebSocket message:', error);
+// Reconcile a slider with the outcome of a command
+function handleSettingAck(data) {
+    const pending = pendingSettings.get(data.setting);
+    if (data.request_id === undefined) {
+        // Another tab's command: only its resulting value matters
+        if (!pending && data.actual !== null) {
+            confirmedSettings[data.setting] = data.actual;
+            updateSliderValue(data.setting, data.actual);
         }
-    };
+        return;
+    }
+    // Acks for older requests are superseded by the one still pending
+    if (!pending || pending.requestId !== data.request_id) return;
+    clearPendingSetting(data.setting);
+
+    if (data.status === 'applied' || data.status === 'failed') {
+        confirmedSettings[data.setting] = data.actual;
+        updateSliderValue(data.setting, data.actual);
+        if (data.actual !== data.value) {
+            markSettingAdjusted(data.setting, `Requested ${data.value}, camera set ${data.actual}`);
+        }
+        console.log(`✅ ${data.setting} = ${data.actual} (${data.status}, ${data.latency_ms} ms)`);
+    } else if (data.status !== 'superseded') {
+        // rejected or timeout: fall back to what the camera last reported
+        revertSetting(data.setting, `Camera did not apply ${data.value} (${data.status})`);
+    }
+}
 
-    ws.onerror = (error) => {
-        console.error('❌ WebSocket error:', error);
-    };
+function clearPendingSetting(setting) {
+    const pending = pendingSettings.get(setting);
+    if (pending) {
+        clearTimeout(pending.timer);
+        pendingSettings.delete(setting);
+    }
+    const valueDisplay = document.getElementById(`${setting}-val`);
+    if (valueDisplay) valueDisplay.classList.remove('setting-pending');
+}
 
-    ws.onclose = () => {
-        console.log('🔌 WebSocket disconnected, attempting to reconnect...');
-        if (!reconnectInterval) {
-            reconnectInterval = setInterval(connectWebSocket, 3000);
-        }
-    };
+function revertSetting(setting, reason) {
+    console.warn(`⚠️ ${setting}: ${reason}`);
+    if (typeof confirmedSettings[setting] !== 'undefined') {
+        updateSliderValue(setting, confirmedSettings[setting]);
+    }
+    markSettingAdjusted(setting, reason);
+}
+
+function markSettingAdjusted(setting, reason) {
+    const valueDisplay = document.getElementById(`${setting}-val`);
+    if (!valueDisplay) return;
+    valueDisplay.classList.add('setting-adjusted');
+    valueDisplay.title = reason;
 }
 
 // Update slider and display value from WebSocket
@@ -83,27 +127,83 @@ function updateSliderValue(setting, value) {
 
 // Send camera setting change to backend
 function updateCameraSetting(setting, value) {
+    const valueDisplay = document.getElementById(`${setting}-val`);
     // Update display immediately
-    document.getElementById(`${setting}-val`).textContent = value;
+    valueDisplay.textContent = value;
+    valueDisplay.classList.remove('setting-adjusted');
+    valueDisplay.title = '';
+
+    if (settingsCameraId === null) {
+        revertSetting(setting, 'No camera selected');
+        return;
+    }
 
     // Send to backend via WebSocket
-    if (ws && ws.readyState === WebSocket.OPEN) {
-        const message = {
-            type: 'camera_setting',
-            setting: setting,
-            value: parseInt(value)
-        };
-        ws.send(JSON.stringify(message));
-        console.log(`📤 Sent ${setting} = ${value}`);
-    } else {
+    const requestId = ++settingRequestId;
+    const message = {
+        type: 'camera_setting',
+        setting: setting,
+        value: parseInt(value),
+        camera_id: settingsCameraId,
+        request_id: requestId
+    };
+    if (!sendCameraMessage(message)) {
         console.warn('⚠️ WebSocket not connected, cannot send setting');
+        revertSetting(setting, 'Not connected');
+        return;
+    }
+    console.log(`📤 Sent ${setting} = ${value} to ${settingsCameraId} (#${requestId})`);
+
+    clearPendingSetting(setting);
+    valueDisplay.classList.add('setting-pending');
+    pendingSettings.set(setting, {
+        requestId,
+        value: message.value,
+        timer: setTimeout(() => {
+            clearPendingSetting(setting);
+            revertSetting(setting, `No acknowledgement for ${message.value}`);
+        }, SETTING_ACK_TIMEOUT_MS)
+    });
+}
+
+// Point the sliders at another camera: only its status drives them and changes go to it
+function selectSettingsCamera(cameraId) {
+    if (settingsCameraId !== null) {
+        unsubscribeTopic(`status:${settingsCameraId}`, handleSettingsStatus);
     }
+    // Pending changes and reported values belong to the previous camera
+    [...pendingSettings.keys()].forEach(clearPendingSetting);
+    Object.keys(confirmedSettings).forEach(setting => delete confirmedSettings[setting]);
+
+    settingsCameraId = cameraId;
+    const select = document.getElementById('settings-camera');
+    if (select) select.value = cameraId;
+    subscribeTopic(`status:${cameraId}`, handleSettingsStatus);
+}
+
+// Fill the camera picker from /api/cameras/, keeping the selection across page visits
+function loadSettingsCameras() {
+    fetch('/api/cameras/')
+        .then(response => {
+            if (!response.ok) throw new Error(`Camera registry request failed: ${response.statusText}`);
+            return response.json();
+        })
+        .then(config => {
+            const select = document.getElementById('settings-camera');
+            if (!select) return;  // navigated away meanwhile
+            select.innerHTML = '';
+            config.cameras.forEach(camera => select.add(new Option(camera.name, camera.camera_id)));
+            const camera = config.cameras.find(c => c.camera_id === settingsCameraId) || config.cameras[0];
+            if (camera) selectSettingsCamera(camera.camera_id);
+        })
+        .catch(error => console.error('❌ Failed to load cameras:', error));
 }
 
 // Initialize settings
 function initSettings() {
     console.log('⚙️ Settings initialized');
-    connectWebSocket();
+    subscribeTopic('commands', handleSettingsCommand);
+    loadSettingsCameras();
 }
 
 document.addEventListener('DOMContentLoaded', initSettings);
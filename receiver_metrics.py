@@ -0,0 +1,120 @@
+"""
+Receiver metrics reporting to the Django side.
+
+The receiver's frame rate and latency estimate are folded locally into one
+sample per SAMPLE_SECONDS: frames counted over the interval, mean latency
+of the frames the latency stage looked at. Every BATCH_SECONDS the samples
+gathered so far are POSTed to /api/metrics/receiver/ as one compact JSON
+request, which the server stores and folds into the per-minute rollups the
+analytics page charts next to the publisher's.
+
+Samples wait in a bounded buffer until the server has acknowledged them.
+While it is unreachable the buffer keeps the newest BUFFER_MAX samples,
+uploads back off up to RETRY_MAX, and once it is back the backlog goes out
+oldest first, MAX_BATCH samples per request. A sample is
+[epoch ms, fps, latency ms, frame number].
+"""
+import http.client
+import json
+import socket
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from live_feed.app.config import ReceiverMetricsConfig
+
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class MetricsReporter:
+    """Aggregates a receiver's metrics and uploads them in batches from a background thread"""
+    def __init__(self, url, stream, frame_count, receiver_id=None):
+        self.url = urlsplit(url)
+        self.stream = stream
+        self.frame_count = frame_count  # callable: frames received so far
+        self.receiver_id = receiver_id or socket.gethostname()
+        self.buffer = deque(maxlen=ReceiverMetricsConfig.BUFFER_MAX)
+        self.lock = threading.Lock()
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.dropped = 0  # samples pushed out of the full buffer
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def observe_latency(self, latency_ms):
+        """Add one frame's latency estimate to the current sample; safe to call from any thread"""
+        with self.lock:
+            self.latency_sum += latency_ms
+            self.latency_count += 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="metrics-reporter", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling and make one last attempt to upload what is buffered"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(ReceiverMetricsConfig.UPLOAD_TIMEOUT * 2)
+
+    def run(self):
+        last_frames = self.frame_count()
+        last_sample = time.monotonic()
+        next_upload = last_sample + ReceiverMetricsConfig.BATCH_SECONDS
+        backoff = ReceiverMetricsConfig.BATCH_SECONDS
+        while not self.stop_event.wait(max(0.0, last_sample + ReceiverMetricsConfig.SAMPLE_SECONDS - time.monotonic())):
+            now = time.monotonic()
+            frames = self.frame_count()
+            self.add_sample(frames, (frames - last_frames) / (now - last_sample))
+            last_frames, last_sample = frames, now
+
+            if now >= next_upload:
+                if self.upload_all():
+                    backoff = ReceiverMetricsConfig.BATCH_SECONDS
+                else:
+                    backoff = min(backoff * 2, ReceiverMetricsConfig.RETRY_MAX)
+                next_upload = now + backoff
+
+        self.upload_all()
+
+    def add_sample(self, frames, fps):
+        with self.lock:
+            latency_ms = self.latency_sum / self.latency_count if self.latency_count else 0.0
+            self.latency_sum, self.latency_count = 0.0, 0
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append([int(time.time() * 1000), round(fps, 2), round(latency_ms, 1), frames])
+
+    def upload_all(self):
+        """Upload the buffer oldest first; False if the server could not be reached"""
+        while self.buffer:
+            batch = list(self.buffer)[:ReceiverMetricsConfig.MAX_BATCH]
+            if not self.upload(batch):
+                return False
+            for _ in batch:
+                self.buffer.popleft()
+        return True
+
+    def upload(self, samples):
+        body = json.dumps({'receiver': self.receiver_id, 'stream': self.stream, 'samples': samples},
+                          separators=(',', ':')).encode()
+        conn = http.client.HTTPConnection(self.url.hostname, self.url.port or 80,
+                                          timeout=ReceiverMetricsConfig.UPLOAD_TIMEOUT)
+        try:
+            conn.request('POST', self.url.path or '/', body=body, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException) as e:
+            log.debug(f"Metrics upload failed, {len(self.buffer)} sample(s) buffered: {e}")
+            return False
+        finally:
+            conn.close()
+        if response.status >= 500:
+            return False
+        if response.status >= 400:
+            # The server will not take this batch however often it is sent
+            log.warning(f"Metrics batch of {len(samples)} sample(s) rejected: HTTP {response.status}")
+        return True
@@ -0,0 +1,245 @@
+"""
+Frame processing stages behind the receiver's receive loop.
+
+The receive loop reads and decodes frames and does only the per-frame
+bookkeeping itself; everything else is a stage registered with a
+FramePipeline: a function called as func(frame, info) on its own worker
+thread. A stage is registered with
+
+    stride     it sees every Nth frame
+    budget_ms  the time one call may take
+    optional   it may be shed under load
+    source     the stage whose return value it consumes instead of the
+               received frame (display and recording take the overlay's)
+
+Handing a frame over never blocks the receive loop: each stage has a
+bounded queue, and a frame that finds it full is dropped for that stage.
+Once a second the pipeline reviews the optional stages. One that dropped
+frames or ran over budget is shed by doubling its stride, down to 1 in
+2**MAX_SHED frames; one that kept up for RESTORE_AFTER reviews gets twice
+the frames back. When the receive loop's own work per frame goes over
+CORE_BUDGET_MS, worker threads are taking CPU and the GIL from it, and the
+most expensive optional stage is shed even if it is within its budget.
+Required stages are never shed, and neither is a stage a required stage
+consumes from; they only drop frames when their queue is full.
+
+Stages must not modify the frame they are given: the same array goes to
+every stage reading the received frame. A stage that draws copies first.
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+from live_feed.app.config import PipelineConfig
+
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def timing_stats(timings):
+    """Mean and p99 in ms of a window of durations in seconds"""
+    if not timings:
+        return 0.0, 0.0
+    ordered = sorted(timings)
+    return (sum(ordered) / len(ordered) * 1000,
+            ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000)
+
+
+class Stage:
+    """A registered processing step with its worker thread, queue and timings"""
+    def __init__(self, name, func, stride=1, budget_ms=None, optional=True, source=None, queue_size=None):
+        self.name = name
+        self.func = func
+        self.stride = max(1, stride)
+        self.budget = (budget_ms or PipelineConfig.DEFAULT_BUDGET_MS) / 1000
+        self.optional = optional
+        self.source = source
+        self.consumers = []  # stages fed with this stage's return value
+        self.frames = queue.Queue(maxsize=queue_size or PipelineConfig.QUEUE_SIZE)
+        self.shed = 0        # the effective stride is stride * 2**shed
+        self.timings = deque(maxlen=PipelineConfig.TIMING_WINDOW)
+        self.processed = 0
+        self.dropped = 0
+        self.overruns = 0
+        self.errors = 0
+        self.window = [0, 0, 0]  # processed, dropped, overruns since the last review
+        self.clean_reviews = 0
+        self.thread = None
+
+    @property
+    def effective_stride(self):
+        return self.stride << self.shed
+
+    def offer(self, index, frame, info):
+        """Queue a frame if this stage wants it; never blocks"""
+        if index % self.effective_stride:
+            return
+        try:
+            self.frames.put_nowait((index, frame, info))
+        except queue.Full:
+            self.dropped += 1
+            self.window[1] += 1
+
+    def run(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            index, frame, info = item
+            started = time.perf_counter()
+            try:
+                result = self.func(frame, info)
+            except Exception as e:
+                self.errors += 1
+                log.warning(f"Stage '{self.name}' failed on frame {index}: {e}")
+                continue
+            elapsed = time.perf_counter() - started
+            self.timings.append(elapsed)
+            self.processed += 1
+            self.window[0] += 1
+            if elapsed > self.budget:
+                self.overruns += 1
+                self.window[2] += 1
+            if result is not None:
+                for consumer in self.consumers:
+                    consumer.offer(index, result, info)
+
+    def cost(self):
+        """Seconds per received frame this stage currently costs"""
+        mean_ms, _ = timing_stats(self.timings)
+        return mean_ms / 1000 / self.effective_stride
+
+    def stats(self):
+        mean_ms, p99_ms = timing_stats(self.timings)
+        return {
+            'stride': self.effective_stride,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'overruns': self.overruns,
+            'errors': self.errors,
+            'mean_ms': mean_ms,
+            'p99_ms': p99_ms,
+            'budget_ms': self.budget * 1000,
+            'optional': self.optional,
+        }
+
+
+class FramePipeline:
+    """Stages fed from the receive loop; see the module docstring"""
+    def __init__(self, core_budget_ms=None):
+        self.stages = {}  # name -> Stage, in registration order
+        self.core_budget = (core_budget_ms or PipelineConfig.CORE_BUDGET_MS) / 1000
+        self.core_timings = deque(maxlen=PipelineConfig.TIMING_WINDOW)
+        self.core_window = []
+        self.last_review = time.monotonic()
+        self.running = False
+
+    def register(self, name, func, stride=1, budget_ms=None, optional=True, source=None, queue_size=None):
+        """Add a stage; its source, if any, must be registered first"""
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already registered")
+        if source is not None and source not in self.stages:
+            raise ValueError(f"Stage '{name}' consumes from unknown stage '{source}'")
+        stage = Stage(name, func, stride, budget_ms, optional, source, queue_size)
+        upstream = self.stages.get(source)
+        if upstream:
+            upstream.consumers.append(stage)
+        while upstream and not optional:
+            upstream.optional = False  # shedding it would shed the required stage too
+            upstream = self.stages.get(upstream.source)
+        self.stages[name] = stage
+        if self.running:
+            self.start_stage(stage)
+        return stage
+
+    def start(self):
+        self.running = True
+        for stage in self.stages.values():
+            self.start_stage(stage)
+
+    def start_stage(self, stage):
+        stage.thread = threading.Thread(target=stage.run, name=f"stage-{stage.name}", daemon=True)
+        stage.thread.start()
+
+    def submit(self, index, frame, info):
+        """Hand a received frame to every stage that reads received frames; called by the receive loop"""
+        for stage in self.stages.values():
+            if stage.source is None:
+                stage.offer(index, frame, info)
+
+    def record_core(self, seconds):
+        """Report the receive loop's work on one frame; reviews shedding once per REVIEW_INTERVAL"""
+        self.core_timings.append(seconds)
+        self.core_window.append(seconds)
+        now = time.monotonic()
+        if now - self.last_review >= PipelineConfig.REVIEW_INTERVAL:
+            self.review()
+            self.last_review = now
+
+    def review(self):
+        optional = [stage for stage in self.stages.values() if stage.optional]
+        for stage in optional:
+            processed, dropped, overruns = stage.window
+            if dropped or overruns > processed * PipelineConfig.OVERRUN_SHARE:
+                self.shed_stage(stage, 'dropped frames' if dropped else 'over budget')
+            elif stage.shed:
+                stage.clean_reviews += 1
+                if stage.clean_reviews >= PipelineConfig.RESTORE_AFTER:
+                    stage.shed -= 1
+                    stage.clean_reviews = 0
+                    log.info(f"Stage '{stage.name}' restored to every {stage.effective_stride} frame(s)")
+
+        core = sorted(self.core_window)
+        if core and core[len(core) // 2] > self.core_budget:
+            candidates = [stage for stage in optional if stage.shed < PipelineConfig.MAX_SHED]
+            if candidates:
+                self.shed_stage(max(candidates, key=Stage.cost), 'receive loop behind')
+
+        for stage in self.stages.values():
+            stage.window = [0, 0, 0]
+        self.core_window = []
+
+    @staticmethod
+    def shed_stage(stage, reason):
+        stage.clean_reviews = 0
+        if stage.shed < PipelineConfig.MAX_SHED:
+            stage.shed += 1
+            log.info(f"Stage '{stage.name}' shed to every {stage.effective_stride} frame(s): {reason}")
+
+    def stats(self):
+        """Per-stage timing and counters, plus the receive loop's own work as 'core'"""
+        mean_ms, p99_ms = timing_stats(self.core_timings)
+        stats = {name: stage.stats() for name, stage in self.stages.items()}
+        stats['core'] = {'mean_ms': mean_ms, 'p99_ms': p99_ms, 'budget_ms': self.core_budget * 1000}
+        return stats
+
+    def summary(self):
+        """One-line timing report for the log"""
+        parts = []
+        for name, stats in self.stats().items():
+            part = f"{name} {stats['mean_ms']:.1f}/{stats['p99_ms']:.1f}ms"
+            if name != 'core':
+                part += f" 1/{stats['stride']}"
+                if stats['dropped']:
+                    part += f" dropped {stats['dropped']}"
+            parts.append(part)
+        return ", ".join(parts)
+
+    def stop(self, timeout=2.0):
+        self.running = False
+        for stage in self.stages.values():
+            # Make room for the sentinel if frames are still waiting
+            while True:
+                try:
+                    stage.frames.put_nowait(None)
+                    break
+                except queue.Full:
+                    try:
+                        stage.frames.get_nowait()
+                    except queue.Empty:
+                        pass
+        for stage in self.stages.values():
+            if stage.thread and stage.thread is not threading.current_thread():
+                stage.thread.join(timeout)
@@ -0,0 +1,280 @@
+"""
+Store-and-forward of the publisher's streams across VPN outages.
+
+The publisher pushes to the MediaMTX on the Pi itself, so the live pipeline
+keeps running when the tunnel drops; what is lost is everything the server
+would have recorded from it. StoreAndForward watches the WebSocket link to
+Django as the upstream signal:
+
+- once it has been down for OUTAGE_GRACE seconds, a SpoolRecorder per camera
+  copies the encoded stream from the local MediaMTX (no re-encode) into
+  rolling MPEG-TS segments named by their UTC start time, and the oldest
+  segments are deleted to stay within SPOOL_BUDGET_MB;
+- once it is back, recording stops and the backlog is uploaded oldest first
+  to /api/recordings/upload/, which files the segments next to the server's
+  own recordings and indexes them. Uploads are capped at UPLOAD_KBPS, sent
+  with the CS1 (background) DSCP mark, and abort as soon as the link drops
+  again, so they never compete with the live stream for long. Empty
+  segments are deleted rather than sent, and segments the server refuses
+  outright are renamed to *.ts.rejected, so neither holds up the rest.
+"""
+import http.client
+import os
+import socket
+import subprocess
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+from live_feed.app.config import RecordingConfig, StoreForwardConfig
+
+import logging
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+DSCP_CS1 = 0x20  # IP_TOS value for the "lower effort" class
+REJECTED_SUFFIX = '.rejected'  # appended to segments the server refused; spooled_segments() skips them
+RETRYABLE_STATUSES = (408, 429)  # client errors that may succeed later; other 4xx are permanent
+
+
+class UploadAborted(Exception):
+    pass
+
+
+class SpoolRecorder:
+    """ffmpeg copying one camera's stream from the local MediaMTX into rolling spool segments"""
+    def __init__(self, ffmpeg_path, camera_id, source_url, spool_dir, segment_seconds, on_segment):
+        self.ffmpeg_path = ffmpeg_path
+        self.camera_id = camera_id
+        self.source_url = source_url
+        self.directory = os.path.join(spool_dir, camera_id)
+        self.segment_seconds = segment_seconds
+        self.on_segment = on_segment
+        self.process = None
+        self.thread = None
+
+    def command(self):
+        pattern = os.path.join(self.directory, f"{RecordingConfig.SEGMENT_TIME_FORMAT}.ts")
+        return [
+            self.ffmpeg_path, '-hide_banner', '-loglevel', 'error',
+            '-rtsp_transport', 'tcp', '-i', self.source_url,
+            '-c', 'copy', '-f', 'segment',
+            '-segment_time', str(self.segment_seconds),
+            '-segment_format', 'mpegts',
+            '-strftime', '1',
+            '-segment_list', 'pipe:1', '-segment_list_type', 'flat',
+            pattern,
+        ]
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        log.info(f"Spooling {self.camera_id} to {self.directory}")
+        # Name segments in UTC; the server converts to its own zone on upload
+        self.process = subprocess.Popen(self.command(), stdout=subprocess.PIPE, text=True,
+                                        env={**os.environ, 'TZ': 'UTC'})
+        self.thread = threading.Thread(target=self.read_segments, name=f"spool-{self.camera_id}", daemon=True)
+        self.thread.start()
+
+    def read_segments(self):
+        for line in self.process.stdout:
+            if line.strip():
+                self.on_segment()
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        else:
+            log.warning(f"Spool recorder for {self.camera_id} had exited ({self.process.returncode})")
+        self.thread.join(timeout=2)
+        self.process = self.thread = None
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+
+def spooled_segments(spool_dir):
+    """(path, camera_id, name, size) of every spooled segment, oldest first"""
+    segments = []
+    if not os.path.isdir(spool_dir):
+        return segments
+    with os.scandir(spool_dir) as cameras:
+        for camera in cameras:
+            if not camera.is_dir():
+                continue
+            with os.scandir(camera.path) as files:
+                for entry in files:
+                    if entry.is_file() and entry.name.endswith('.ts'):
+                        segments.append((entry.path, camera.name, entry.name, entry.stat().st_size))
+    # Names are UTC start times, so they sort chronologically across cameras
+    segments.sort(key=lambda segment: segment[2])
+    return segments
+
+
+def throttled(f, rate_bytes, aborted):
+    """Yield a file's chunks at no more than rate_bytes per second"""
+    started = time.monotonic()
+    sent = 0
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        if aborted():
+            raise UploadAborted()
+        yield chunk
+        sent += len(chunk)
+        ahead = sent / rate_bytes - (time.monotonic() - started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+class StoreAndForward:
+    """Spools the publisher's streams while the upstream is down and uploads the backlog once it is back"""
+    def __init__(self, ffmpeg_path, sources, upload_url, spool_dir=None, budget_mb=None, upload_kbps=None,
+                 segment_seconds=None, grace=None):
+        self.spool_dir = str(spool_dir or StoreForwardConfig.SPOOL_DIR)
+        self.budget_bytes = (budget_mb or StoreForwardConfig.SPOOL_BUDGET_MB) * 2**20
+        self.upload_rate = (upload_kbps or StoreForwardConfig.UPLOAD_KBPS) * 1000 / 8
+        self.grace = StoreForwardConfig.OUTAGE_GRACE if grace is None else grace
+        self.upload_url = upload_url.rstrip('/')
+        segment_seconds = segment_seconds or StoreForwardConfig.SEGMENT_SECONDS
+        self.recorders = [SpoolRecorder(ffmpeg_path, camera_id, url, self.spool_dir, segment_seconds, self.enforce_budget)
+                          for camera_id, url in sources.items()]
+        self.upstream = threading.Event()
+        self.down_since = time.monotonic()  # nothing is known to be up at startup
+        self.recording = False
+        self.retry_at = 0.0
+        self.budget_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.uploaded = self.evicted = self.rejected = 0
+
+    def set_upstream(self, up):
+        """Report the WebSocket link state; safe to call from any thread"""
+        if up and not self.upstream.is_set():
+            self.upstream.set()
+        elif not up and self.upstream.is_set():
+            self.upstream.clear()
+            self.down_since = time.monotonic()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="store-forward", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+        self.stop_recording()
+
+    def run(self):
+        backlog = spooled_segments(self.spool_dir)
+        if backlog:
+            log.info(f"{len(backlog)} spooled segments waiting for upload")
+        while not self.stop_event.is_set():
+            if self.upstream.is_set():
+                self.stop_recording()
+                if time.monotonic() >= self.retry_at and self.upload_next():
+                    continue  # keep draining the backlog
+            elif time.monotonic() - self.down_since >= self.grace:
+                self.start_recording()
+            self.stop_event.wait(1.0)
+
+    def start_recording(self):
+        if self.recording:
+            # Restart a recorder whose ffmpeg gave up, e.g. MediaMTX restarting
+            for recorder in self.recorders:
+                if not recorder.alive():
+                    recorder.stop()
+                    recorder.start()
+            return
+        log.warning(f"Upstream unreachable for {self.grace}s, spooling streams locally")
+        self.recording = True
+        for recorder in self.recorders:
+            recorder.start()
+
+    def stop_recording(self):
+        if not self.recording:
+            return
+        log.info("Upstream back, stopping local spooling")
+        self.recording = False
+        for recorder in self.recorders:
+            recorder.stop()
+        self.enforce_budget()
+
+    def enforce_budget(self):
+        """Delete the oldest spooled segments beyond the disk budget"""
+        with self.budget_lock:
+            segments = spooled_segments(self.spool_dir)
+            total = sum(segment[3] for segment in segments)
+            # Never delete the newest segment per camera: it may still be open for writing
+            newest = {camera_id: path for path, camera_id, _, _ in segments}
+            for path, camera_id, name, size in segments:
+                if total <= self.budget_bytes:
+                    break
+                if newest[camera_id] == path:
+                    continue
+                os.remove(path)
+                total -= size
+                self.evicted += 1
+                log.warning(f"Spool over budget, deleted {camera_id}/{name}")
+
+    def upload_next(self):
+        """Upload the oldest spooled segment; returns True if one was uploaded"""
+        segments = spooled_segments(self.spool_dir)
+        if not segments:
+            return False
+        path, camera_id, name, size = segments[0]
+        if size == 0:
+            # ffmpeg terminated at a segment rollover can leave an empty file, which the server refuses
+            os.remove(path)
+            log.info(f"Deleted empty spooled segment {camera_id}/{name}")
+            return True
+        try:
+            status = self.upload(path, camera_id, name, size)
+        except UploadAborted:
+            log.info(f"Upstream dropped while uploading {camera_id}/{name}, will resume later")
+            return False
+        except (OSError, http.client.HTTPException) as e:
+            log.warning(f"Upload of {camera_id}/{name} failed: {e}")
+            self.retry_at = time.monotonic() + StoreForwardConfig.UPLOAD_RETRY
+            return False
+
+        if status in (200, 201, 409):
+            if status == 409:
+                log.warning(f"Server already has a different {camera_id}/{name}; dropping the spooled copy")
+            os.remove(path)
+            self.uploaded += 1
+            log.info(f"Uploaded {camera_id}/{name} ({size / 2**20:.1f} MB), {len(segments) - 1} left")
+            return True
+        if 400 <= status < 500 and status not in RETRYABLE_STATUSES:
+            # Retrying would fail the same way and hold up every segment behind this one
+            os.replace(path, path + REJECTED_SUFFIX)
+            self.rejected += 1
+            log.warning(f"Upload of {camera_id}/{name} refused with HTTP {status}, kept as {name}{REJECTED_SUFFIX}")
+            return True
+        log.warning(f"Upload of {camera_id}/{name} rejected with HTTP {status}")
+        self.retry_at = time.monotonic() + StoreForwardConfig.UPLOAD_RETRY
+        return False
+
+    def upload(self, path, camera_id, name, size):
+        url = urlsplit(f"{self.upload_url}/{quote(camera_id)}/{quote(name)}/")
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        try:
+            conn.connect()
+            conn.sock.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, DSCP_CS1)
+            with open(path, 'rb') as f:
+                body = throttled(f, self.upload_rate, lambda: not self.upstream.is_set() or self.stop_event.is_set())
+                conn.request('PUT', url.path, body=body,
+                              headers={'Content-Length': str(size), 'Content-Type': 'video/mp2t'})
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
@@ -1,15 +1,18 @@
 import sys
 import cv2
+import numpy as np
 import subprocess
 import time
 import signal
 import atexit
 import socket
 import os
+import random
+import itertools
 
 import argparse
 from datetime import datetime
-from live_feed.app.config import NetworkConfig
+from live_feed.app.config import KeyframeConfig, LinkConfig, NetworkConfig, SceneConfig, SnapshotConfig, StoreForwardConfig
 import asyncio
 from asyncio.exceptions import TimeoutError
 import websockets
@@ -18,9 +21,23 @@ from asyncio.exceptions import TimeoutError
 import queue
 import asyncio
 import threading
-from live_feed.messages import messages_pb2
+from collections import deque
+from live_feed.messages import envelope, messages_pb2
+from frame_bus import FrameBus, bus_name
+from store_forward import StoreAndForward
 import logging
 
+try:
+    import psutil  # optional: accurate CPU usage; falls back to load average
+except ImportError:
+    psutil = None
+
+try:
+    import av  # optional: in-process encoder that takes keyframe requests; falls back to an ffmpeg subprocess
+    from av.video.frame import PictureType
+except ImportError:
+    av = None
+
 
 logging.basicConfig(
     level=logging.INFO,
@@ -28,46 +45,187 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__) 
 
-to_async_queue =  queue.Queue()   # main thread -> async thread
-cam_status = messages_pb2.CameraStatus()
-publisher_instance = None  # Global reference to publisher for WebSocket callbacks
+to_async_queue =  queue.Queue(maxsize=100)   # main thread -> async thread
+publishers = {}  # camera_id -> ZeroLatencyPublisher, for WebSocket callbacks
+store_forward = None  # StoreAndForward, told when the link to Django goes up or down
 
-async def writer(ws: websockets.WebSocketClientProtocol, stop_event: asyncio.Event):
-    while not stop_event.is_set():
-        try: 
-            message = await asyncio.to_thread( to_async_queue.get, timeout=3) #timeout is needed to prevent blocking
-            await ws.send(message)
-            #print(f"Sent message: {message}")
+
+def enqueue_message(camera_id, message):
+    """
+    Queue a ControlMessage for Django without blocking the capture thread. While
+    the link is down nothing drains the queue, so the oldest message is dropped
+    to make room: statuses are snapshots and only the newest ones matter.
+    """
+    while True:
+        try:
+            to_async_queue.put((camera_id, message), block=False)
+            return
+        except queue.Full:
+            try:
+                to_async_queue.get_nowait()
+                to_async_queue.task_done()
+            except queue.Empty:
+                pass
+
+# Runtime camera controls: setting -> (OpenCV property, UI value -> driver value, driver value -> UI value)
+# UI values are the integers carried by CameraSettingsCommand/CameraStatus.
+CAMERA_CONTROLS = {
+    'brightness':    (cv2.CAP_PROP_BRIGHTNESS,     lambda v: v / 100.0, lambda v: round(v * 100)),
+    'contrast':      (cv2.CAP_PROP_CONTRAST,       lambda v: v / 100.0, lambda v: round(v * 100)),
+    'gain':          (cv2.CAP_PROP_GAIN,           lambda v: v / 100.0, lambda v: round(v * 100)),
+    'exposure':      (cv2.CAP_PROP_EXPOSURE,       lambda v: v / 10.0,  lambda v: round(v * 10)),  # protobuf sends int, camera expects float
+    'white_balance': (cv2.CAP_PROP_WB_TEMPERATURE, lambda v: float(v),  lambda v: round(v)),       # Kelvin
+}
+
+# Automatic modes that must be switched off before a manual value sticks (V4L2: 1 = manual exposure)
+CAMERA_CONTROL_MANUAL_MODES = {
+    'exposure':      (cv2.CAP_PROP_AUTO_EXPOSURE, 1),
+    'white_balance': (cv2.CAP_PROP_AUTO_WB, 0),
+}
+
+
+class CameraControlQueue:
+    """
+    Coalescing queue of pending camera control changes.
+
+    The WebSocket reader submits changes and the capture thread drains them between
+    frames, so V4L2 ioctls never run on the reader path. Only the newest value per
+    setting is kept, and each setting is applied at most once per debounce interval,
+    so dragging a slider does not issue an ioctl for every input event. The request
+    ids of superseded changes are kept so every command still gets acknowledged.
+    """
+    def __init__(self, debounce_s=0.1):
+        self.debounce_s = debounce_s
+        self._pending = {}  # setting -> (value, [request_id, ...])
+        self._last_applied = {}
+        self._lock = threading.Lock()
+
+    def submit(self, setting, value, request_id=0):
+        with self._lock:
+            _, request_ids = self._pending.get(setting, (None, []))
+            if request_id:
+                request_ids = request_ids + [request_id]
+            self._pending[setting] = (value, request_ids)
+
+    def drain(self):
+        """Return {setting: (value, request_ids)} for the pending changes whose debounce interval has elapsed"""
+        if not self._pending:
+            return {}
+
+        now = time.monotonic()
+        due = {}
+        with self._lock:
+            for setting in list(self._pending):
+                if now - self._last_applied.get(setting, float('-inf')) >= self.debounce_s:
+                    due[setting] = self._pending.pop(setting)
+                    self._last_applied[setting] = now
+        return due
+
+def take_batch(abandoned):
+    """
+    Next batch of queued (camera_id, message) pairs for the writer; runs in a worker thread.
+
+    Collects for up to BATCH_WINDOW after the first message, so the statuses of
+    one tick go out together, but returns as soon as an ack is queued.
+    """
+    batch = [to_async_queue.get(timeout=0.5)]
+    to_async_queue.task_done()
+    deadline = time.monotonic() + LinkConfig.BATCH_WINDOW
+    while True:
+        remaining = 0 if batch[-1][1].HasField('ack') else deadline - time.monotonic()
+        try:
+            batch.append(to_async_queue.get(timeout=remaining) if remaining > 0 else to_async_queue.get_nowait())
             to_async_queue.task_done()
         except queue.Empty:
-            continue
+            break
+    if abandoned.is_set():
+        # The link went away while this thread was waiting; keep the messages for the next one
+        for camera_id, message in batch:
+            enqueue_message(camera_id, message)
+        raise queue.Empty
+    return batch
+
+def batch_frames(batch):
+    """
+    Group a batch into one list of ControlMessages per camera. Only the newest
+    status per camera is kept; acks are all kept, in order, ahead of it.
+    """
+    frames = {}
+    for camera_id, message in batch:
+        acks, status = frames.get(camera_id, ([], None))
+        if message.HasField('status'):
+            status = message
+        else:
+            acks.append(message)
+        frames[camera_id] = (acks, status)
+    return {camera_id: acks + ([status] if status else []) for camera_id, (acks, status) in frames.items()}
+
+async def writer(ws: websockets.WebSocketClientProtocol, stop_event: asyncio.Event, sequence):
+    abandoned = threading.Event()
+    try:
+        while not stop_event.is_set():
+            try:
+                batch = await asyncio.to_thread(take_batch, abandoned)
+            except queue.Empty:
+                continue
+            try:
+                for camera_id, messages in batch_frames(batch).items():
+                    # A send only blocks once the socket buffer is full, i.e. the peer stopped reading
+                    frame = envelope.pack(camera_id, next(sequence), messages)
+                    await asyncio.wait_for(ws.send(frame), LinkConfig.SEND_TIMEOUT)
+            except TimeoutError:
+                log.warning(f"Send stalled for {LinkConfig.SEND_TIMEOUT}s, dropping the link")
+                ws.transport.abort()
+                break
+    finally:
+        abandoned.set()
 
 async def reader(ws: websockets.WebSocketClientProtocol, stop_event: asyncio.Event):
     """
     Reader coroutine to handle incoming messages from the WebSocket server.
-    Processes CameraSettingsCommand messages from Django.
+    Processes the CameraSettingsCommands in Django's envelopes.
     """
-    global publisher_instance
+    sequence = envelope.SequenceTracker()
     while not stop_event.is_set():
         try:
             async for message in ws:
-                # Parse incoming protobuf message
+                # Parse incoming protobuf envelope
                 try:
-                    cmd = messages_pb2.CameraSettingsCommand()
-                    cmd.ParseFromString(message)
-
-                    # Apply the setting change to the camera
-                    if publisher_instance:
-                        # For exposure, divide by 10 (protobuf sends int, camera expects float)
-                        value = cmd.value / 10.0 if cmd.setting == 'exposure' else cmd.value
-                        publisher_instance.update_camera_setting(cmd.setting, value)
-                        log.info(f"Applied setting: {cmd.setting} = {value}")
-                    else:
-                        log.warning("Publisher instance not available")
+                    frame = envelope.unpack(message)
+                    if sequence.check(frame.sequence):
+                        log.warning(f"Missed {sequence.lost} envelopes from Django on this connection")
+
+                    for control in frame.messages:
+                        payload = control.WhichOneof('payload')
+                        if payload == 'command':
+                            cmd = control.command
+
+                            # Queue the setting change; the capture thread applies it between frames
+                            publisher = get_publisher(cmd.camera_id)
+                            if publisher:
+                                publisher.update_camera_setting(cmd.setting, cmd.value, cmd.request_id)
+                            else:
+                                log.warning(f"No publisher for camera '{cmd.camera_id}'")
+
+                        elif payload == 'keyframe':
+                            # A viewer just joined; the encoder starts an IDR with its next frame
+                            publisher = get_publisher(control.keyframe.camera_id)
+                            if publisher:
+                                publisher.request_keyframe(control.keyframe.rendition)
+
+                        elif payload == 'snapshot_request':
+                            # Dashboard preview: JPEG-encode the latest frame off the event loop
+                            publisher = get_publisher(control.snapshot_request.camera_id)
+                            if publisher:
+                                asyncio.get_running_loop().run_in_executor(
+                                    None, send_snapshot, publisher, control.snapshot_request.width)
 
                 except Exception as parse_error:
                     log.error(f"Failed to parse command: {parse_error}")
 
+            # Iteration ends quietly on a clean close; iterating again would spin
+            log.info("websocket connection closed")
+            break
         except websockets.ConnectionClosed:
             log.info("websocket connection closed")
             break
@@ -76,17 +234,65 @@ async def reader(ws: websockets.WebSocketClientProtocol, stop_event: asyncio.Eve
             break
 
 
-# NEW: WebSocket handler with auto-reconnect
-async def WebSocketHandler(stop_event: asyncio.Event ):
-    uri = f"ws://{NetworkConfig.PI_VPN_IP}:{NetworkConfig.WEBSOCKET_PORT}/ws/camera/"
+def send_snapshot(publisher, width):
+    """Answer a SnapshotRequest; nothing is sent before the first frame"""
+    snapshot = publisher.snapshot(width)
+    if snapshot:
+        enqueue_message(publisher.camera_id, messages_pb2.ControlMessage(snapshot=snapshot))
+
+def reconnect_delays(first=LinkConfig.RECONNECT_FIRST, maximum=LinkConfig.RECONNECT_MAX):
+    """
+    Exponential backoff with full jitter: the nth retry waits uniform(0, first * 2**n),
+    capped at maximum. The first retry is nearly immediate, and publishers that lost
+    the server together do not come back in lockstep.
+    """
+    for attempt in itertools.count():
+        yield random.uniform(0, min(maximum, first * 2 ** attempt))
+
+def set_tcp_user_timeout(ws):
+    """Let the kernel fail a connection whose sent data goes unacknowledged, instead of retransmitting for minutes"""
+    sock = ws.transport.get_extra_info('socket')
+    if sock is not None and hasattr(socket, 'TCP_USER_TIMEOUT'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, LinkConfig.TCP_USER_TIMEOUT_MS)
+
+async def send_status_snapshots(ws, sequence):
+    """Send every camera's latest status first, so Django is current without waiting for the capture loop"""
+    for publisher in list(publishers.values()):
+        if publisher.status_snapshot:
+            status = messages_pb2.ControlMessage(status=messages_pb2.CameraStatus.FromString(publisher.status_snapshot))
+            frame = envelope.pack(publisher.camera_id, next(sequence), [status])
+            await asyncio.wait_for(ws.send(frame), LinkConfig.SEND_TIMEOUT)
+
+async def WebSocketHandler(stop_event: asyncio.Event, uri=None):
+    """
+    Keep a WebSocket to Django open, reconnecting with jittered backoff.
+
+    A link is declared dead when a ping goes unanswered for PING_TIMEOUT, a
+    send stays blocked for SEND_TIMEOUT, or the kernel gives up on unacknowledged
+    data (TCP_USER_TIMEOUT), rather than when TCP eventually times out.
+    """
+    uri = uri or f"ws://{NetworkConfig.PI_VPN_IP}:{NetworkConfig.WEBSOCKET_PORT}/ws/camera/"
     log.info (f"connecting to {uri}")
+    delays = reconnect_delays()
     while not stop_event.is_set():
+        connected_at = None
         try:
-            async with websockets.connect(uri) as ws:
+            async with websockets.connect(uri,
+                                          open_timeout=NetworkConfig.CONNECTION_TIMEOUT,
+                                          ping_interval=LinkConfig.PING_INTERVAL,
+                                          ping_timeout=LinkConfig.PING_TIMEOUT,
+                                          close_timeout=LinkConfig.CLOSE_TIMEOUT) as ws:
+                connected_at = time.monotonic()
+                set_tcp_user_timeout(ws)
                 log.info("WebSocket connected")
+                if store_forward:
+                    store_forward.set_upstream(True)
+                # Envelopes are numbered per connection
+                sequence = itertools.count(1)
+                await send_status_snapshots(ws, sequence)
                 #read incoming messages as concurrent background task
                 reader_task = asyncio.create_task(reader(ws, stop_event))
-                writer_task = asyncio.create_task(writer(ws, stop_event))
+                writer_task = asyncio.create_task(writer(ws, stop_event, sequence))
                 done, pending = await asyncio.wait(
                     {reader_task, writer_task, asyncio.create_task(stop_event.wait())},
                     return_when=asyncio.FIRST_COMPLETED,
@@ -113,13 +319,27 @@ async def WebSocketHandler(stop_event: asyncio.Event ):
             log.error("Connection timed out")
         except Exception as e:
             log.error(f"Connection error: {e}")
-        
-        log.info ("Reconnecting in 5 seconds...")
-        await asyncio.sleep(5)  
 
-def run_asyncio_loop(publisher ):
-    #wait until publisher is running before starting websocket
-    while not publisher.isRunning():
+        if store_forward:
+            store_forward.set_upstream(False)
+        if connected_at is not None and time.monotonic() - connected_at >= LinkConfig.RECONNECT_RESET_AFTER:
+            delays = reconnect_delays()
+        delay = next(delays)
+        log.info (f"Reconnecting in {delay:.2f} seconds...")
+        try:
+            await asyncio.wait_for(stop_event.wait(), delay)
+        except TimeoutError:
+            pass
+
+def get_publisher(camera_id):
+    """Resolve a command's camera_id; an empty id addresses the first camera"""
+    if camera_id:
+        return publishers.get(camera_id)
+    return next(iter(publishers.values()), None)
+
+def run_asyncio_loop(publisher_list):
+    #wait until a publisher is running before starting websocket
+    while not any(publisher.isRunning() for publisher in publisher_list):
         time.sleep(0.5)
     log.info("started websocket thread")
     stop_event = asyncio.Event()
@@ -131,10 +351,343 @@ def run_asyncio_loop(publisher ):
 
 
 
+class FramePacer:
+    """
+    Monotonic-clock frame pacing toward target_fps.
+
+    Each captured frame is stamped with its capture time and mapped onto the
+    target frame grid. Frames that arrive more than half an interval before
+    their slot are dropped. With the duplicate policy, slots missed while the
+    camera stalled are filled by repeating the frame, so the encoder sees a
+    constant rate; 'off' passes every frame through. Inter-frame jitter
+    against the ideal interval is tracked over a sliding window.
+    """
+    MAX_DUPLICATES = 5  # beyond this, resync to the grid instead of flooding the encoder
+
+    def __init__(self, target_fps, policy='drop'):
+        self.interval = 1.0 / target_fps
+        self.policy = policy
+        self.next_slot = None
+        self.last_capture = None
+        self.dropped = 0
+        self.duplicated = 0
+        self.jitter = deque(maxlen=max(1, int(target_fps * 10)))  # ~10 s window
+
+    def schedule(self, capture_time):
+        """Return how many times to encode the frame captured at capture_time (0 drops it)"""
+        if self.last_capture is not None:
+            self.jitter.append(abs(capture_time - self.last_capture - self.interval))
+        self.last_capture = capture_time
+
+        if self.policy == 'off':
+            return 1
+
+        if self.next_slot is None:
+            self.next_slot = capture_time + self.interval
+            return 1
+
+        if capture_time < self.next_slot - self.interval / 2:
+            self.dropped += 1
+            return 0
+
+        missed = int((capture_time - self.next_slot) / self.interval + 0.5)
+        copies = 1
+        if self.policy == 'duplicate' and missed:
+            copies += min(missed, self.MAX_DUPLICATES)
+            self.duplicated += copies - 1
+
+        if missed > self.MAX_DUPLICATES:
+            self.next_slot = capture_time + self.interval
+        else:
+            self.next_slot += (missed + 1) * self.interval
+        return copies
+
+    def stats(self):
+        if not self.jitter:
+            return {'jitter_ms': 0.0, 'jitter_p99_ms': 0.0, 'dropped': self.dropped, 'duplicated': self.duplicated}
+        ordered = sorted(self.jitter)
+        return {
+            'jitter_ms': sum(ordered) / len(ordered) * 1000,
+            'jitter_p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+            'dropped': self.dropped,
+            'duplicated': self.duplicated,
+        }
+
+
+class SceneGate:
+    """
+    Variable frame rate for static scenes.
+
+    Every paced frame is sampled at every DECIMATION-th pixel, reduced to
+    grey and compared with the frame of the last change by mean absolute
+    difference, so slow drift (shadows, clouds) adds up until it counts.
+    Once nothing has changed for STATIC_AFTER seconds only idle_fps frames
+    a second are encoded; the first changed frame goes out at once and
+    restores the full rate. Encoders stamp frames with their capture time,
+    so a skipped stretch shows up as a longer frame duration, not a stall.
+    """
+    def __init__(self, idle_fps, threshold=None, decimation=None, static_after=None):
+        self.idle_interval = 1.0 / idle_fps if idle_fps else 0.0
+        self.threshold = threshold or SceneConfig.CHANGE_THRESHOLD
+        self.step = decimation or SceneConfig.DECIMATION
+        self.static_after = static_after or SceneConfig.STATIC_AFTER
+        self.reference = None  # grey samples of the frame of the last change
+        self.last_change = None
+        self.last_admitted = float('-inf')
+        self.skipped = 0
+
+    def grey(self, frame):
+        samples = frame[::self.step, ::self.step].astype(np.int32)
+        # BT.601 luma in integer arithmetic: (29 B + 150 G + 77 R) / 256
+        return ((samples[..., 0] * 29 + samples[..., 1] * 150 + samples[..., 2] * 77) >> 8).astype(np.int16)
+
+    def admit(self, frame, capture_time):
+        """True if the frame captured at capture_time should be encoded"""
+        if not self.idle_interval:
+            return True
+        grey = self.grey(frame)
+        if self.reference is None or grey.shape != self.reference.shape \
+                or np.abs(grey - self.reference).mean() >= self.threshold:
+            self.reference = grey
+            self.last_change = capture_time
+        elif capture_time - self.last_change >= self.static_after \
+                and capture_time - self.last_admitted < self.idle_interval:
+            self.skipped += 1
+            return False
+        self.last_admitted = capture_time
+        return True
+
+    def wake(self):
+        """Admit the next frame even if the scene is static; safe to call from any thread"""
+        self.last_admitted = float('-inf')
+
+    @property
+    def static(self):
+        return self.last_change is not None and self.last_admitted - self.last_change >= self.static_after
+
+
+def cpu_percent():
+    """System-wide CPU usage in percent since the previous call"""
+    if psutil:
+        return psutil.cpu_percent(interval=None)
+    try:
+        return min(100.0, os.getloadavg()[0] / (os.cpu_count() or 1) * 100)
+    except OSError:
+        return 0.0
+
+
+class EncoderProgress:
+    """
+    Encoded output bitrate, read from ffmpeg's -progress key=value stream.
+
+    ffmpeg reports the running total_size about once a second; the bitrate is
+    the size delta over the last report interval, not ffmpeg's lifetime average.
+    Muxers that report no size fall back to ffmpeg's own bitrate figure.
+    """
+    def __init__(self, stream):
+        self.bitrate_kbps = 0.0
+        self.last = None
+        self.thread = threading.Thread(target=self.run, args=(stream,), name="encoder-progress", daemon=True)
+        self.thread.start()
+
+    def run(self, stream):
+        for line in stream:
+            key, _, value = line.decode(errors='ignore').strip().partition('=')
+            if key == 'total_size' and value.isdigit():
+                now, size = time.monotonic(), int(value)
+                if self.last and now > self.last[0]:
+                    self.bitrate_kbps = (size - self.last[1]) * 8 / 1000 / (now - self.last[0])
+                self.last = (now, size)
+            elif key == 'bitrate' and self.last is None and value.strip().endswith('kbits/s'):
+                self.bitrate_kbps = float(value.strip()[:-len('kbits/s')])
+
+
+def parse_bitrate(value):
+    """'800k' -> 800000 bits/s"""
+    value = str(value).strip().lower()
+    scale = {'k': 10**3, 'm': 10**6}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * scale)
+
+
+class PipeEncoder:
+    """
+    libx264 in an ffmpeg subprocess, fed raw BGR frames on stdin.
+
+    Keyframes come on a fixed schedule only (PIPE_GOP_SECONDS); the
+    subprocess cannot be asked for one, so request_keyframe() does nothing.
+    """
+    def __init__(self, cmd, progress=False):
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE if progress else None)
+        self.stdin = self.process.stdin
+        self.progress = EncoderProgress(self.process.stdout) if progress else None
+
+    @property
+    def bitrate_kbps(self):
+        return self.progress.bitrate_kbps if self.progress else 0.0
+
+    def request_keyframe(self):
+        pass
+
+    def write(self, frame, copies=1, capture_time=None):
+        frame_bytes = frame.tobytes()
+        for _ in range(copies):
+            self.stdin.write(frame_bytes)
+        self.stdin.flush()
+
+    def close(self):
+        self.stdin.close()
+        self.process.wait()
+
+
+class PyAvEncoder:
+    """
+    libx264 in-process through PyAV, muxed straight to RTSP.
+
+    Unlike the ffmpeg subprocess it can be asked for a keyframe:
+    request_keyframe() marks the next frame as an I picture, which x264
+    (forced-idr) encodes as an IDR. The GOP can then be long, leaving more
+    of the bitrate for picture quality, while a viewer joining mid-GOP is
+    still sent a decodable frame right away. The GOP is kept in capture
+    time, not frames, so it stays the same length while a static scene is
+    encoded at a reduced rate.
+    """
+    def __init__(self, width, height, fps, bitrate, rtsp_url, gop):
+        self.fps = fps
+        self.gop_seconds = gop / fps
+        self.container = av.open(rtsp_url, mode='w', format='rtsp', options={'rtsp_transport': 'tcp'})
+        self.stream = self.container.add_stream('libx264', rate=fps)
+        self.stream.width = width
+        self.stream.height = height
+        self.stream.pix_fmt = 'yuv420p'
+        self.stream.bit_rate = parse_bitrate(bitrate)
+        self.stream.gop_size = gop
+        self.stream.options = {'preset': 'ultrafast', 'tune': 'zerolatency', 'forced-idr': '1',
+                               'maxrate': str(parse_bitrate(bitrate)), 'bufsize': '200k'}
+        self.keyframe_requested = False  # set by the WebSocket thread, cleared by the encoding thread
+        self.first_capture = None
+        self.last_keyframe = None  # capture time of the last keyframe x264 produced
+        self.last_pts = -1
+        self.bitrate_kbps = 0.0
+        self.window = (time.monotonic(), 0)  # start, bytes muxed since
+
+    def request_keyframe(self):
+        self.keyframe_requested = True
+
+    def write(self, frame, copies=1, capture_time=None):
+        capture_time = time.monotonic() if capture_time is None else capture_time
+        if self.first_capture is None:
+            self.first_capture = self.last_keyframe = capture_time
+        video_frame = av.VideoFrame.from_ndarray(frame, format='bgr24').reformat(format='yuv420p')
+        # Timestamps follow capture time on the 1/fps grid, as -use_wallclock_as_timestamps does for the pipe
+        pts = max(self.last_pts + 1, round((capture_time - self.first_capture) * self.fps))
+        for _ in range(copies):
+            video_frame.pts = pts
+            video_frame.pict_type = PictureType.NONE
+            if self.keyframe_requested or capture_time - self.last_keyframe >= self.gop_seconds:
+                self.keyframe_requested = False
+                video_frame.pict_type = PictureType.I
+            self.mux(self.stream.encode(video_frame))
+            self.last_pts = pts
+            pts += 1
+
+    def mux(self, packets):
+        for packet in packets:
+            if packet.is_keyframe and packet.pts is not None:
+                self.last_keyframe = self.first_capture + float(packet.pts * packet.time_base)
+            self.container.mux(packet)
+            start, size = self.window
+            size += packet.size
+            now = time.monotonic()
+            if now - start >= 1.0:
+                self.bitrate_kbps = size * 8 / 1000 / (now - start)
+                start, size = now, 0
+            self.window = (start, size)
+
+    def close(self):
+        try:
+            self.mux(self.stream.encode(None))
+        finally:
+            self.container.close()
+
+
+class SubStreamEncoder:
+    """
+    Low-resolution, low-fps rendition of a publisher's stream.
+
+    The capture loop hands over every Nth frame, or every frame it encodes
+    while the scene is static and the main stream already runs below the
+    sub-stream rate; a worker thread downscales it once
+    with INTER_AREA and feeds a second encoder publishing to its own path.
+    The hand-off queue holds a single frame, so a slow encode drops sub-stream
+    frames instead of stalling capture.
+    """
+    def __init__(self, publisher, width, height, fps, bitrate, rtsp_url, publish_url=None):
+        self.publisher = publisher
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.bitrate = bitrate
+        self.rtsp_url = rtsp_url
+        self.publish_url = publish_url or rtsp_url
+        self.stride = max(1, round(publisher.target_fps / fps))
+        self.frames = queue.Queue(maxsize=1)
+        self.frame_index = 0
+        self.encoder = None
+        self.thread = None
+
+    def start(self):
+        log.info(f"Sub-stream {self.width}x{self.height}@{self.fps} will be available at: {self.rtsp_url}")
+        self.encoder = self.publisher.create_encoder(self.width, self.height, self.fps, self.bitrate, self.publish_url)
+        self.thread = threading.Thread(target=self.run, name=f"substream-{self.publisher.camera_id}", daemon=True)
+        self.thread.start()
+
+    def submit(self, frame, capture_time, force=False):
+        """Offer a captured frame; only every stride-th frame is encoded unless forced"""
+        self.frame_index += 1
+        if self.frame_index % self.stride and not force:
+            return
+        try:
+            self.frames.put_nowait((frame, capture_time))
+        except queue.Full:
+            pass  # encoder still busy with the previous frame
+
+    def run(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            frame, capture_time = item
+            small = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+            try:
+                self.encoder.write(small, 1, capture_time)
+            except Exception as e:
+                log.error(f"Sub-stream encoder stopped: {e}")
+                break
+
+    def stop(self):
+        if self.thread:
+            # Make room for the sentinel if a frame is still waiting
+            try:
+                self.frames.get_nowait()
+            except queue.Empty:
+                pass
+            self.frames.put(None)
+            self.thread.join(timeout=2)
+            self.thread = None
+
+        if self.encoder:
+            self.encoder.close()
+            self.encoder = None
+
+
 class ZeroLatencyPublisher:
-    def __init__(self, mediamtx_path, ffmpeg_path, camera_index, width, height, target_fps, bitrate, rtsp_url):
+    def __init__(self, mediamtx_path, ffmpeg_path, camera_index, width, height, target_fps, bitrate, rtsp_url, stream_name=None,
+                 sub_size=None, sub_fps=10, sub_bitrate='150k', pacing='drop', frame_bus_slots=4,
+                 encoder='auto', gop_seconds=None, idle_fps=None, change_threshold=None):
         self.running = False
         self.camera_index = camera_index
+        self.stream_name = stream_name or NetworkConfig.STREAM_NAME
+        self.camera_id = self.stream_name  # one MediaMTX path per camera
         self.width = width
         self.height = height
         self.target_fps = target_fps
@@ -145,27 +698,62 @@ class ZeroLatencyPublisher:
         self.lock = threading.Lock()
         self.cam_status = messages_pb2.CameraStatus()
         self.cam_status.isConnected = False
+        self.cam_status.camera_id = self.camera_id
 
         
         """ Get the local IP address to construct the RTSP URL."""
         """Use configuration from NetworkConfig"""
         # local_ip = self.get_local_ip()
         local_ip = NetworkConfig.PI_VPN_IP
-        self.rtsp_url = f"rtsp://{local_ip}:{NetworkConfig.RTSP_PORT}/{NetworkConfig.STREAM_NAME}"
+        self.rtsp_url = f"rtsp://{local_ip}:{NetworkConfig.RTSP_PORT}/{self.stream_name}"
+        # MediaMTX runs on this Pi: push over loopback so publishing survives the VPN going down
+        self.publish_url = f"rtsp://127.0.0.1:{NetworkConfig.RTSP_PORT}/{self.stream_name}"
+
+        """ In-process encoding (PyAV) takes keyframe requests, so it can use a long GOP."""
+        self.in_process = encoder == 'pyav' or (encoder == 'auto' and av is not None)
+        self.gop_seconds = gop_seconds or (KeyframeConfig.GOP_SECONDS if self.in_process else KeyframeConfig.PIPE_GOP_SECONDS)
+
+        """ Pace frames onto the target_fps grid using capture timestamps."""
+        self.pacer = FramePacer(target_fps, pacing)
+
+        """ Encode static scenes at idle_fps only; duplicate pacing asks for a constant rate, so it keeps every frame."""
+        idle_fps = SceneConfig.IDLE_FPS if idle_fps is None else idle_fps
+        if pacing == 'duplicate' and idle_fps:
+            log.info("Static-scene frame skipping is off with duplicate pacing")
+            idle_fps = 0
+        self.scene = SceneGate(min(idle_fps, target_fps), change_threshold)
+
+        """ Optional low-resolution sub-stream published next to the main stream."""
+        self.sub_encoder = None
+        if sub_size and sub_fps:
+            sub_width, sub_height = sub_size
+            sub_path = f"{self.stream_name}{NetworkConfig.SUB_STREAM_SUFFIX}"
+            self.sub_encoder = SubStreamEncoder(self, sub_width, sub_height, min(sub_fps, target_fps), sub_bitrate,
+                                                f"rtsp://{local_ip}:{NetworkConfig.RTSP_PORT}/{sub_path}",
+                                                f"rtsp://127.0.0.1:{NetworkConfig.RTSP_PORT}/{sub_path}")
+
+        """ Optional shared-memory ring of raw frames for local consumers (see frame_bus.py)."""
+        self.frame_bus = FrameBus(bus_name(self.camera_id), frame_bus_slots) if frame_bus_slots else None
         
-        """ Initialize camera and ffmpeg process variables."""
+        """ Initialize camera and encoder variables."""
         self.cap = None
-        self.ffmpeg_process = None
+        self.encoder = None
         self.mediamtx_process = None
         self.fps_counter = 0
-        self.fps_timer = time.time()
+        self.fps_timer = time.monotonic()
         self.current_fps = 0
+        self.latency_total_ms = 0.0
 
         """ Initialize camera settings with default values."""
         self.camera_settings = {
             'brightness': 50,    # 0 to 100 (UI) -> maps to 0.0 to 1.0 (OpenCV)
         }
-        self.settings_lock = threading.Lock()
+        # Owned by the capture thread; other threads submit changes to control_queue
+        # and read status_snapshot, an immutable serialized CameraStatus.
+        self.control_queue = CameraControlQueue()
+        self.status_snapshot = self.cam_status.SerializeToString()
+        # (frame, wall time) last handed to the encoder, for snapshots; never drawn on once stored
+        self.latest_frame = None
 
         atexit.register(self.stop)
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -260,116 +848,192 @@ class ZeroLatencyPublisher:
         self.apply_camera_settings()
 
     def apply_camera_settings(self):
-        """Apply current camera settings to the camera"""
+        """Apply current camera settings to the camera and read back the others"""
         if self.cap is None or not self.cap.isOpened():
             return
 
-        with self.settings_lock:
-            try:
-                # Check camera's brightness capabilities
-                min_brightness = self.cap.get(cv2.CAP_PROP_BRIGHTNESS)
-                log.info(f"Camera default brightness: {min_brightness}")
-
-                # Try to get brightness range (some cameras support this)
+        for setting in CAMERA_CONTROLS:
+            if setting in self.camera_settings:
+                self.apply_camera_setting(setting, self.camera_settings[setting])
+            else:
+                prop, _, to_ui = CAMERA_CONTROLS[setting]
                 try:
-                    min_val = self.cap.get(cv2.CAP_PROP_BRIGHTNESS + 100)  # Some cameras use offset for min
-                    max_val = self.cap.get(cv2.CAP_PROP_BRIGHTNESS + 200)  # Some cameras use offset for max
-                    log.info(f"Brightness range (if supported): {min_val} to {max_val}")
-                except:
-                    log.info("Brightness range query not supported")
+                    self.camera_settings[setting] = to_ui(self.cap.get(prop))
+                except Exception as e:
+                    log.info(f"Could not read {setting}: {e}")
+        self.update_status_fields()
 
-                # Set brightness (normalize 0-100 to 0.0-1.0)
-                brightness_normalized = self.camera_settings['brightness'] / 100.0
-                result = self.cap.set(cv2.CAP_PROP_BRIGHTNESS, brightness_normalized)
-                actual = self.cap.get(cv2.CAP_PROP_BRIGHTNESS)
+    def update_camera_setting(self, setting, value, request_id=0):
+        """Queue a camera setting change; safe to call from any thread"""
+        if setting not in CAMERA_CONTROLS:
+            log.warning(f"Unknown or unsupported setting: {setting}")
+            if request_id:
+                self.send_acks([self.settings_ack(request_id, setting, value, value, False)])
+            return
+        self.control_queue.submit(setting, value, request_id)
 
-                if result:
-                    log.info(f"✓ Brightness set to {self.camera_settings['brightness']}% ({brightness_normalized:.2f}), actual value: {actual:.2f}")
-                else:
-                    log.warning("✗ Camera does not support brightness control")
+    def apply_pending_settings(self):
+        """Apply queued setting changes and acknowledge them; called by the capture thread between frames"""
+        changes = self.control_queue.drain()
+        if not changes:
+            return
 
-            except Exception as e:
-                log.error(f"Error applying camera settings: {e}")
+        acks = []
+        for setting, (value, request_ids) in changes.items():
+            applied = self.apply_camera_setting(setting, value)
+            actual = self.camera_settings[setting]
+            acks.extend(self.settings_ack(request_id, setting, value, actual, applied) for request_id in request_ids)
+        self.update_status_fields()
+        if acks:
+            self.send_acks(acks)
 
-    def update_camera_setting(self, setting, value):
-        """Update a specific camera setting"""
-        with self.settings_lock:
-            if setting == 'brightness' and setting in self.camera_settings:
-                # Store the UI value (0-100)
-                self.camera_settings[setting] = value
+    @staticmethod
+    def settings_ack(request_id, setting, requested, actual, applied):
+        ack = messages_pb2.CameraSettingsAck()
+        ack.request_id = request_id
+        ack.setting = setting
+        ack.requested = int(requested)
+        ack.actual = int(actual)
+        ack.applied = applied
+        return ack
 
-                # Interpolate 0-100 to 0.0-1.0 for OpenCV
-                brightness_normalized = value / 100.0
-                log.info(f"Requested brightness: {value} (UI) -> {brightness_normalized:.2f} (normalized)")
+    def send_acks(self, acks):
+        """Queue acks for Django; the writer sends them without waiting for the batch window"""
+        for ack in acks:
+            enqueue_message(self.camera_id, messages_pb2.ControlMessage(ack=ack))
 
-                # Apply the setting immediately to camera
-                if self.cap and self.cap.isOpened():
-                    try:
-                        # Get current brightness before setting
-                        current = self.cap.get(cv2.CAP_PROP_BRIGHTNESS)
-                        log.info(f"Current brightness before set: {current:.2f}")
-
-                        # Set new brightness using normalized value
-                        result = self.cap.set(cv2.CAP_PROP_BRIGHTNESS, brightness_normalized)
-
-                        # Read back what was actually set
-                        actual = self.cap.get(cv2.CAP_PROP_BRIGHTNESS)
-                        log.info(f"Brightness after set: requested={brightness_normalized:.2f}, actual={actual:.2f}, success={result}")
-
-                        if result:
-                            log.info(f"✓ Brightness control applied: {value}% -> {brightness_normalized:.2f}")
-                        else:
-                            log.warning("✗ Camera does not support brightness control")
-                    except Exception as e:
-                        log.error(f"Error applying brightness: {e}")
-            else:
-                log.warning(f"Unknown or unsupported setting: {setting}")
+    def apply_camera_setting(self, setting, value):
+        """
+        Set one control on the camera; must run on the capture thread.
 
-    def send_camera_status(self):
-        """Send current camera status including settings to Django"""
-        with self.settings_lock:
-            self.cam_status.isConnected = (self.cap is not None and self.cap.isOpened())
-            self.cam_status.brightness = self.camera_settings['brightness']
-            self.cam_status.fps = self.current_fps
+        Returns True if the camera accepted it. camera_settings[setting] is
+        left holding the value read back from the camera, which may differ
+        from the requested one (drivers clamp and quantize).
+        """
+        prop, to_driver, to_ui = CAMERA_CONTROLS[setting]
+        # Store the UI value
+        self.camera_settings[setting] = value
 
+        if not (self.cap and self.cap.isOpened()):
+            return False
+
+        driver_value = to_driver(value)
         try:
-            to_async_queue.put(self.cam_status.SerializeToString(), block=False)
-        except queue.Full:
-            log.warning("Queue full, skipping status update")
+            if setting in CAMERA_CONTROL_MANUAL_MODES:
+                mode_prop, manual = CAMERA_CONTROL_MANUAL_MODES[setting]
+                self.cap.set(mode_prop, manual)
+
+            result = self.cap.set(prop, driver_value)
+
+            # Read back what was actually set
+            actual = self.cap.get(prop)
+            self.camera_settings[setting] = to_ui(actual)
+            if result:
+                log.info(f"✓ {setting} set: requested={value} ({driver_value:.2f}), actual={actual:.2f}")
+            else:
+                log.warning(f"✗ Camera does not support {setting} control")
+            return bool(result)
+        except Exception as e:
+            log.error(f"Error applying {setting}: {e}")
+            return False
+
+    def update_status_fields(self):
+        """Copy current settings into cam_status; called by the capture thread"""
+        for setting in CAMERA_CONTROLS:
+            if setting in self.camera_settings:
+                setattr(self.cam_status, setting, int(self.camera_settings[setting]))
+
+    def send_camera_status(self):
+        """Send the latest camera status snapshot to Django"""
+        enqueue_message(self.camera_id, messages_pb2.ControlMessage(status=self.cam_status))
         
-    def setup_ffmpeg(self):
-        cmd = [
+    def ffmpeg_command(self, width, height, fps, bitrate, rtsp_url, progress=False):
+        # With the drop policy or static-scene skipping frames arrive on a variable grid,
+        # so let ffmpeg stamp them with their arrival time instead of assuming exactly `fps`,
+        # and place keyframes by time since the frame count per GOP varies.
+        wallclock = self.pacer.policy == 'drop' or bool(self.scene.idle_interval)
+        return [
             self.ffmpeg_path, '-y', '-hide_banner', '-loglevel', 'error',
+            *(['-progress', 'pipe:1', '-stats_period', '1'] if progress else []),
             '-f', 'rawvideo', '-vcodec', 'rawvideo', '-pix_fmt', 'bgr24',
-            '-s', f'{self.width}x{self.height}', '-r', str(self.target_fps), '-i', '-',
+            *(['-use_wallclock_as_timestamps', '1'] if wallclock else []),
+            '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
             '-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency',
-            '-g', '10', '-b:v', self.bitrate, '-maxrate', self.bitrate,
-            '-bufsize', '200k', '-f', 'rtsp', '-rtsp_transport', 'tcp', self.rtsp_url
+            *(['-fps_mode', 'passthrough'] if wallclock else []),
+            '-g', str(max(1, round(fps * self.gop_seconds))), '-b:v', bitrate, '-maxrate', bitrate,
+            *(['-force_key_frames', f'expr:gte(t,n_forced*{self.gop_seconds:g})'] if self.scene.idle_interval else []),
+            '-bufsize', '200k', '-f', 'rtsp', '-rtsp_transport', 'tcp', rtsp_url
         ]
+
+    def create_encoder(self, width, height, fps, bitrate, rtsp_url, progress=False):
+        """PyAvEncoder if in-process encoding is on, else a PipeEncoder around ffmpeg_command"""
+        if self.in_process:
+            return PyAvEncoder(width, height, fps, bitrate, rtsp_url, max(1, round(fps * self.gop_seconds)))
+        return PipeEncoder(self.ffmpeg_command(width, height, fps, bitrate, rtsp_url, progress), progress)
+
+    def setup_encoder(self):
+        log.info(f"Encoding {'in-process' if self.in_process else 'in an ffmpeg subprocess'}, "
+                 f"keyframe every {self.gop_seconds:g}s{' or on request' if self.in_process else ''}")
+        self.encoder = self.create_encoder(self.width, self.height, self.target_fps, self.bitrate, self.publish_url, progress=True)
+
+        if self.sub_encoder:
+            self.sub_encoder.start()
+
+    def request_keyframe(self, rendition=''):
+        """Have a rendition's encoder ('main', 'sub', or '' for both) start an IDR with its next frame; safe to call from any thread"""
+        self.scene.wake()  # a viewer waiting on a static scene gets that frame now, not at the idle rate
+        renditions = {'main': self.encoder, 'sub': self.sub_encoder and self.sub_encoder.encoder}
+        for name, encoder in renditions.items():
+            if encoder and rendition in ('', name):
+                encoder.request_keyframe()
         
-        self.ffmpeg_process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
-        
-    def add_timestamp(self, frame):
+    def snapshot(self, width=0):
+        """The latest encoded frame as a CameraSnapshot JPEG, scaled down to width; None before the first frame"""
+        latest = self.latest_frame
+        if latest is None:
+            return None
+        frame, captured_at = latest
+        height, frame_width = frame.shape[:2]
+        if width and frame_width > width:
+            frame = cv2.resize(frame, (width, max(1, height * width // frame_width)), interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, SnapshotConfig.JPEG_QUALITY])
+        if not ok:
+            return None
+        return messages_pb2.CameraSnapshot(camera_id=self.camera_id, jpeg=jpeg.tobytes(), captured_at=captured_at)
+
+    def add_timestamp(self, frame, capture_time):
         current_time = datetime.now()
         timestamp = current_time.strftime('%H:%M:%S.%f')[:-3]
         
         # Calculate latency (time since frame capture)
-        frame_time = time.time()
-        latency_ms = (frame_time - getattr(self, 'frame_start_time', frame_time)) * 1000
-        self.frame_start_time = frame_time
+        latency_ms = (time.monotonic() - capture_time) * 1000
         
         cv2.putText(frame, f"PUB: {timestamp}", (5, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
         cv2.putText(frame, f"FPS: {self.current_fps:.1f}", (5, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
         cv2.putText(frame, f"LAT: {latency_ms:.1f}ms", (5, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
         return frame
         
-    def calculate_fps(self):
+    def calculate_fps(self, capture_time):
         self.fps_counter += 1
-        current_time = time.time()
+        current_time = time.monotonic()
+        self.latency_total_ms += (current_time - capture_time) * 1000
         if current_time - self.fps_timer >= 2.0:
             self.current_fps = self.fps_counter / (current_time - self.fps_timer)
+            self.cam_status.latency_ms = self.latency_total_ms / self.fps_counter
             self.fps_counter = 0
             self.fps_timer = current_time
+            self.latency_total_ms = 0.0
+
+            stats = self.pacer.stats()
+            self.cam_status.jitter_ms = stats['jitter_ms']
+            self.cam_status.frames_dropped = stats['dropped']
+            self.cam_status.frames_duplicated = stats['duplicated']
+            self.cam_status.cpu_percent = cpu_percent()
+            if self.encoder:
+                self.cam_status.bitrate_kbps = self.encoder.bitrate_kbps
+            log.debug(f"Pacing: fps={self.current_fps:.1f}, jitter={stats['jitter_ms']:.1f}ms "
+                      f"(p99 {stats['jitter_p99_ms']:.1f}ms), dropped={stats['dropped']}, duplicated={stats['duplicated']}, "
+                      f"skipped={self.scene.skipped}{' (static)' if self.scene.static else ''}")
             
     def start(self):
         
@@ -383,32 +1047,55 @@ class ZeroLatencyPublisher:
                 return
             
         self.setup_camera()
-        self.setup_ffmpeg()        
+        self.setup_encoder()
         self.setRunning(True)
         log.info("Starting publishing frames to client")
         
-        while self.isRunning():
-            ret, frame = self.cap.read()
+        try:
+            while self.isRunning():
+                ret, frame = self.cap.read()
+                capture_time = time.monotonic()
 
-            # Update camera status with current settings
-            with self.settings_lock:
+                # Apply queued control changes between frames, then publish a status snapshot
+                self.apply_pending_settings()
                 self.cam_status.isConnected = ret
-                self.cam_status.brightness = self.camera_settings['brightness']
                 self.cam_status.fps = self.current_fps
+                self.status_snapshot = self.cam_status.SerializeToString()
 
-            if not ret:
-                continue
-            else:
-                to_async_queue.put(self.cam_status.SerializeToString()) # if full raises exception queue.Full
+                if not ret:
+                    continue
+                else:
+                    self.send_camera_status()
+
+                # Local consumers get every captured frame, unpaced and without the overlay
+                if self.frame_bus:
+                    self.frame_bus.publish(frame, capture_time)
         
-            frame_with_timestamp = self.add_timestamp(frame)    
-            try:
-                self.ffmpeg_process.stdin.write(frame_with_timestamp.tobytes())
-                self.ffmpeg_process.stdin.flush()
-            except:
-                break
+                # 0 drops a frame that arrived ahead of its slot, >1 fills slots the camera missed
+                copies = self.pacer.schedule(capture_time)
+                if not copies:
+                    continue
+
+                # Judged before the overlay is drawn, so its running clock does not count as motion
+                if not self.scene.admit(frame, capture_time):
+                    continue
+
+                frame_with_timestamp = self.add_timestamp(frame, capture_time)
+                self.latest_frame = (frame_with_timestamp, time.time())
+                try:
+                    self.encoder.write(frame_with_timestamp, copies, capture_time)
+                except:
+                    break
+
+                if self.sub_encoder:
+                    self.sub_encoder.submit(frame_with_timestamp, capture_time, force=self.scene.static)
                 
-            self.calculate_fps()
+                self.calculate_fps(capture_time)
+        finally:
+            # The capture thread owns the frame bus, so it is unlinked here rather than in stop(),
+            # also when SIGINT, sys.exit or an error ends the loop; a leaked segment blocks the next start
+            if self.frame_bus:
+                self.frame_bus.close()
             
     def signal_handler(self, sig, frame):
         self.stop()
@@ -420,20 +1107,82 @@ class ZeroLatencyPublisher:
             
         self.setRunning(False)
         
-        if self.ffmpeg_process:
-            self.ffmpeg_process.stdin.close()
-            self.ffmpeg_process.wait()
+        if self.encoder:
+            self.encoder.close()
+
+        if self.sub_encoder:
+            self.sub_encoder.stop()
             
         if self.cap:
             self.cap.release()
-            cv2.destroyAllWindows()
+            try:
+                cv2.destroyAllWindows()
+            except cv2.error:
+                pass  # headless OpenCV build, no windows to close
             
         self.stop_mediamtx()
         log.info("Stopped publishing frames to client")
 
-def main():
-    global publisher_instance
+class MultiCameraPublisher:
+    """
+    Runs several ZeroLatencyPublisher pipelines in one process.
+
+    Each camera captures and encodes on its own thread and publishes to its own
+    MediaMTX path. All cameras share one MediaMTX instance and the WebSocket
+    control connection, with status and commands keyed by camera_id.
+    """
+    def __init__(self, publisher_list):
+        self.publishers = publisher_list
+        self.threads = []
+        signal.signal(signal.SIGINT, self.signal_handler)
+
+    def start(self):
+        # Start the shared MediaMTX once, before the capture threads race to do it
+        if not ZeroLatencyPublisher.check_mediamtx():
+            log.info("MediaMTX not running, attempting to start...")
+            if not self.publishers[0].start_mediamtx():
+                log.error("Failed to start MediaMTX")
+                return
+
+        for publisher in self.publishers:
+            thread = threading.Thread(target=publisher.start, name=f"capture-{publisher.camera_id}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        # Join with a timeout so the main thread keeps handling SIGINT
+        for thread in self.threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+
+    def signal_handler(self, sig, frame):
+        self.stop()
+        sys.exit(0)
+
+    def stop(self):
+        # The first publisher owns MediaMTX, so stop it last
+        for publisher in reversed(self.publishers):
+            publisher.stop()
 
+def parse_camera_spec(spec):
+    """Parse an INDEX[:PATH] camera spec; PATH defaults to <STREAM_NAME>_<INDEX>"""
+    index, _, path = spec.partition(':')
+    try:
+        index = int(index)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid camera spec '{spec}', expected INDEX[:PATH]")
+    return index, path or f"{NetworkConfig.STREAM_NAME}_{index}"
+
+def parse_size(value):
+    """Parse a WxH size; 0 disables the rendition"""
+    if value == '0':
+        return None
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size '{value}', expected WxH")
+    return width, height
+
+def main():
     parser = argparse.ArgumentParser(description='Zero Latency RTSP Publisher')
     parser.add_argument('--mediamtx-path', '-m',
                        required=True,
@@ -445,6 +1194,11 @@ def main():
                        type=int,
                        default=0,
                        help='Camera index to use (default: 0)')
+    parser.add_argument('--cameras',
+                       nargs='+',
+                       type=parse_camera_spec,
+                       metavar='INDEX[:PATH]',
+                       help='Publish several cameras, each to its own MediaMTX path (overrides --camera_index)')
     parser.add_argument('--width', '-w',
                        type=int,
                        default=640,
@@ -460,33 +1214,117 @@ def main():
     parser.add_argument('--bitrate', '-b',
                        default='800k',
                        help='Video bitrate (default: 800k)')
+    parser.add_argument('--sub-size',
+                       type=parse_size,
+                       default='320x240',
+                       metavar='WxH',
+                       help='Sub-stream resolution, or 0 to disable (default: 320x240)')
+    parser.add_argument('--sub-fps',
+                       type=int,
+                       default=10,
+                       help='Sub-stream FPS, or 0 to disable (default: 10)')
+    parser.add_argument('--sub-bitrate',
+                       default='150k',
+                       help='Sub-stream bitrate (default: 150k)')
+    parser.add_argument('--pacing',
+                       choices=['drop', 'duplicate', 'off'],
+                       default='drop',
+                       help='Frame pacing policy: drop early frames and use capture timestamps, '
+                            'duplicate frames to keep a constant rate, or off (default: drop)')
+    parser.add_argument('--encoder',
+                       choices=['auto', 'pyav', 'ffmpeg'],
+                       default='auto',
+                       help='pyav encodes in-process and honours keyframe requests from the server, ffmpeg runs a '
+                            'subprocess with a short fixed GOP; auto picks pyav if it is installed (default: auto)')
+    parser.add_argument('--gop',
+                       type=float,
+                       default=None,
+                       help=f'Seconds between scheduled keyframes (default: {KeyframeConfig.GOP_SECONDS:g} in-process, '
+                            f'{KeyframeConfig.PIPE_GOP_SECONDS:g} with ffmpeg)')
+    parser.add_argument('--idle-fps',
+                       type=float,
+                       default=SceneConfig.IDLE_FPS,
+                       help=f'Frame rate while the scene is static, 0 to encode every frame (default: {SceneConfig.IDLE_FPS:g})')
+    parser.add_argument('--change-threshold',
+                       type=float,
+                       default=SceneConfig.CHANGE_THRESHOLD,
+                       help=f'Mean grey-level difference (0-255) between frames that counts as motion (default: {SceneConfig.CHANGE_THRESHOLD:g})')
+    parser.add_argument('--frame-bus-slots',
+                       type=int,
+                       default=4,
+                       help='Raw frames kept in the shared-memory frame bus for local consumers, 0 to disable (default: 4)')
+    parser.add_argument('--spool-dir',
+                       default=str(StoreForwardConfig.SPOOL_DIR),
+                       help=f'Where streams are spooled while Django is unreachable (default: {StoreForwardConfig.SPOOL_DIR})')
+    parser.add_argument('--spool-budget-mb',
+                       type=int,
+                       default=StoreForwardConfig.SPOOL_BUDGET_MB,
+                       help=f'Disk budget of the spool; the oldest segments are deleted beyond it (default: {StoreForwardConfig.SPOOL_BUDGET_MB})')
+    parser.add_argument('--backlog-kbps',
+                       type=int,
+                       default=StoreForwardConfig.UPLOAD_KBPS,
+                       help=f'Upload rate for the spooled backlog once Django is back, 0 to disable store-and-forward (default: {StoreForwardConfig.UPLOAD_KBPS})')
+    parser.add_argument('--outage-grace',
+                       type=float,
+                       default=StoreForwardConfig.OUTAGE_GRACE,
+                       help=f'Seconds Django must be unreachable before spooling starts (default: {StoreForwardConfig.OUTAGE_GRACE})')
     parser.add_argument('--rtsp-url', '-u',
                        default='rtsp://192.168.0.183:8554/zerolatency',
                        help='RTSP URL to publish to (default: rtsp://localhost:8554/zerolatency)')
 
     args = parser.parse_args()
+    if args.encoder == 'pyav' and av is None:
+        parser.error("--encoder pyav needs PyAV (pip install av)")
+    if args.sub_fps < 0:
+        parser.error("--sub-fps must be positive, or 0 to disable the sub-stream")
+
+    cameras = args.cameras or [(args.camera_index, NetworkConfig.STREAM_NAME)]
+    paths = [path for _, path in cameras]
+    repeated = sorted({path for path in paths if paths.count(path) > 1})
+    if repeated:
+        # Publishers are keyed by path, and each path names its frame bus
+        parser.error(f"--cameras paths must be unique, repeated: {', '.join(repeated)}")
+    for camera_index, stream_name in cameras:
+        publisher = ZeroLatencyPublisher(
+            args.mediamtx_path,
+            args.ffmpeg_path,
+            camera_index,
+            args.width,
+            args.height,
+            args.fps,
+            args.bitrate,
+            args.rtsp_url,
+            stream_name=stream_name,
+            sub_size=args.sub_size,
+            sub_fps=args.sub_fps,
+            sub_bitrate=args.sub_bitrate,
+            pacing=args.pacing,
+            frame_bus_slots=args.frame_bus_slots,
+            encoder=args.encoder,
+            gop_seconds=args.gop,
+            idle_fps=args.idle_fps,
+            change_threshold=args.change_threshold
+        )
+        # Register for WebSocket callbacks
+        publishers[publisher.camera_id] = publisher
 
-    publisher = ZeroLatencyPublisher(
-        args.mediamtx_path,
-        args.ffmpeg_path,
-        args.camera_index,
-        args.width,
-        args.height,
-        args.fps,
-        args.bitrate,
-        args.rtsp_url
-    )
-
-    # Set global reference for WebSocket callbacks
-    publisher_instance = publisher
-
-    async_thread = threading.Thread(target=run_asyncio_loop, args=(publisher, ), daemon=True)
+    global store_forward
+    if args.backlog_kbps:
+        # Spool every published path, sub-streams excluded: the server records main streams only
+        sources = {camera_id: publisher.publish_url for camera_id, publisher in publishers.items()}
+        upload_url = f"http://{NetworkConfig.PI_VPN_IP}:{NetworkConfig.WEBSOCKET_PORT}/api/recordings/upload"
+        store_forward = StoreAndForward(args.ffmpeg_path, sources, upload_url, spool_dir=args.spool_dir,
+                                        budget_mb=args.spool_budget_mb, upload_kbps=args.backlog_kbps,
+                                        grace=args.outage_grace)
+        store_forward.start()
+
+    async_thread = threading.Thread(target=run_asyncio_loop, args=(list(publishers.values()), ), daemon=True)
     async_thread.start()
-    publisher.start()
+
+    if len(publishers) == 1:
+        publisher.start()
+    else:
+        MultiCameraPublisher(list(publishers.values())).start()
    
 if __name__ == "__main__":
-    main()
-
-    
-
-    
+    main()
\ No newline at end of file
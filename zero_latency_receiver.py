@@ -8,10 +8,19 @@ import signal
 import atexit
 import socket
 import argparse
+from collections import namedtuple
 from datetime import datetime
+from urllib.parse import urlsplit
+
+from live_feed.app.config import NetworkConfig
+from receiver_metrics import MetricsReporter
+from receiver_pipeline import FramePipeline
+
+# What the receive loop knows about a frame when it hands it to the stages
+FrameInfo = namedtuple('FrameInfo', 'index received interval')
 
 class ZeroLatencyReceiver:
-    def __init__(self, rtsp_url=None, display_mode="headless"):
+    def __init__(self, rtsp_url=None, display_mode="headless", metrics_url=None):
         self.name = "ZeroLatencyReceiver"
         self.running = False
         self.display_mode = display_mode  # "headless", "display", or "save"
@@ -25,17 +34,39 @@ class ZeroLatencyReceiver:
             self.rtsp_url = rtsp_url
             
         ZeroLatencyReceiver.log(f"RTSP URL: {self.rtsp_url}")
+
+        # Parsed once for the connectivity check and the overlay
+        try:
+            url = urlsplit(self.rtsp_url)
+            self.rtsp_host, self.rtsp_port = url.hostname, url.port or 8554
+            self.source_text = f"SRC: {url.netloc}"
+        except ValueError:
+            url = None
+            self.rtsp_host, self.rtsp_port = None, 8554
+            self.source_text = "SRC: Unknown"
         
         self.cap = None
         self.fps_counter = 0
-        self.fps_timer = time.time()
+        self.fps_timer = time.monotonic()
         self.current_fps = 0
         self.latency_ms = 0
         self.frame_count = 0
-        self.last_frame_time = time.time()
+        self.last_frame_time = time.monotonic()
         
         # Video writer for saving frames (optional)
         self.video_writer = None
+
+        # Latest frame from the display stage; HighGUI is not thread-safe, so the main thread shows it
+        self.display_frame = None
+
+        # Everything but reading frames runs as stages on worker threads (see setup_stages)
+        self.pipeline = FramePipeline()
+
+        # FPS and latency go to the server in batches when a metrics URL is given
+        self.metrics = None
+        if metrics_url:
+            stream = url.path.strip('/') if url else ''
+            self.metrics = MetricsReporter(metrics_url, stream, lambda: self.frame_count)
         
         # Signal handlers for graceful shutdown
         atexit.register(self.stop)
@@ -87,22 +118,14 @@ class ZeroLatencyReceiver:
         """Setup RTSP connection with Raspberry Pi optimizations"""
         ZeroLatencyReceiver.log(f"Connecting to RTSP stream: {self.rtsp_url}")
         
-        # Extract host and port from RTSP URL for connectivity check
-        try:
-            # Parse rtsp://host:port/stream format
-            url_parts = self.rtsp_url.replace('rtsp://', '').split('/')
-            host_port = url_parts[0].split(':')
-            host = host_port[0]
-            port = int(host_port[1]) if len(host_port) > 1 else 8554
-            
-            # Check if RTSP server is reachable
-            if not ZeroLatencyReceiver.check_rtsp_server(host, port):
-                ZeroLatencyReceiver.log(f"Warning: Cannot reach RTSP server at {host}:{port}")
-            else:
-                ZeroLatencyReceiver.log(f"RTSP server at {host}:{port} is reachable")
-                
-        except Exception as e:
-            ZeroLatencyReceiver.log(f"Could not parse RTSP URL for connectivity check: {e}")
+        # Check if RTSP server is reachable
+        host, port = self.rtsp_host, self.rtsp_port
+        if not host:
+            ZeroLatencyReceiver.log("Could not parse RTSP URL for connectivity check")
+        elif not ZeroLatencyReceiver.check_rtsp_server(host, port):
+            ZeroLatencyReceiver.log(f"Warning: Cannot reach RTSP server at {host}:{port}")
+        else:
+            ZeroLatencyReceiver.log(f"RTSP server at {host}:{port} is reachable")
         
         # Try different backends in order of preference for Raspberry Pi
         backends = [
@@ -141,8 +164,8 @@ class ZeroLatencyReceiver:
         ZeroLatencyReceiver.log("Failed to connect to RTSP stream with any backend")
         return False
         
-    def extract_publisher_timestamp_simple(self, frame):
-        """Simplified timestamp extraction without OCR dependencies"""
+    def extract_publisher_timestamp_simple(self, frame, info):
+        """Simplified timestamp extraction without OCR dependencies (latency stage)"""
         try:
             # Look for green text in the top-left corner (publisher timestamp)
             # Since we know the publisher uses green color (0, 255, 0)
@@ -162,10 +185,8 @@ class ZeroLatencyReceiver:
             
             # If we detect green text, estimate latency based on frame timing
             if green_pixels > 10:  # Threshold for detecting text
-                current_time = time.time()
-                
-                # Calculate frame interval
-                frame_interval = current_time - self.last_frame_time
+                # Frame interval as the receive loop saw it, not as this worker thread does
+                frame_interval = info.interval
                 
                 # Expected frame interval for 30 FPS
                 expected_interval = 1.0 / 30.0
@@ -178,8 +199,6 @@ class ZeroLatencyReceiver:
                     self.latency_ms = base_latency + additional_latency
                 else:
                     self.latency_ms = base_latency
-                    
-                self.last_frame_time = current_time
             else:
                 # No timestamp detected, use default
                 self.latency_ms = 75
@@ -187,22 +206,19 @@ class ZeroLatencyReceiver:
         except Exception as e:
             # Fallback latency
             self.latency_ms = 100
+
+        if self.metrics:
+            self.metrics.observe_latency(self.latency_ms)
             
-    def add_receiver_overlay(self, frame):
-        """Add receiver information overlay"""
+    def add_receiver_overlay(self, frame, info):
+        """Add receiver information overlay to a copy of the frame (overlay stage)"""
+        frame = frame.copy()  # other stages read the received frame
         current_time = datetime.now()
         timestamp_text = f"REC: {current_time.strftime('%H:%M:%S.%f')[:-3]}"
         fps_text = f"REC FPS: {self.current_fps:.1f}"
         latency_text = f"EST LAT: {self.latency_ms:.1f}ms"
-        frame_text = f"FRAME: {self.frame_count}"
-        
-        # Extract IP from RTSP URL for display
-        try:
-            url_parts = self.rtsp_url.replace('rtsp://', '').split('/')
-            host_port = url_parts[0]
-            ip_text = f"SRC: {host_port}"
-        except:
-            ip_text = "SRC: Unknown"
+        frame_text = f"FRAME: {info.index}"
+        ip_text = self.source_text
         
         font = cv2.FONT_HERSHEY_SIMPLEX
         font_scale = 0.5
@@ -225,7 +241,7 @@ class ZeroLatencyReceiver:
     def calculate_fps(self):
         """Calculate and update FPS"""
         self.fps_counter += 1
-        current_time = time.time()
+        current_time = time.monotonic()
         
         if current_time - self.fps_timer >= 2.0:  # Update every 2 seconds
             self.current_fps = self.fps_counter / (current_time - self.fps_timer)
@@ -249,42 +265,76 @@ class ZeroLatencyReceiver:
                 return False
         return True
         
+    def queue_display(self, frame, info):
+        """Hand a frame to the main thread for the receiver window; a newer frame replaces one not yet shown (display stage)"""
+        self.display_frame = frame
+
+    def show_frame(self):
+        """
+        Show the latest display frame; called from the main thread, where GUI
+        calls must run on some platforms. Returns False once the user presses 'q'.
+        """
+        frame, self.display_frame = self.display_frame, None
+        if frame is None or self.display_mode != "display":
+            return True
+        try:
+            cv2.imshow('Zero Latency Receiver', frame)
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'):
+                ZeroLatencyReceiver.log("User pressed 'q', stopping...")
+                return False
+        except cv2.error:
+            # No display available, switch to headless mode
+            ZeroLatencyReceiver.log("No display available, switching to headless mode")
+            self.display_mode = "headless"
+        return True
+
+    def record_frame(self, frame, info):
+        """Append a frame to the saved video, opening it on the first frame (recording stage)"""
+        if self.video_writer is None:
+            height, width = frame.shape[:2]
+            self.setup_video_writer(width, height)
+        if self.video_writer.isOpened():
+            self.video_writer.write(frame)
+
+    def setup_stages(self):
+        """
+        Register the processing stages for the display mode.
+
+        Further stages (analytics and the like) can be registered on
+        self.pipeline before start().
+        """
+        self.pipeline.register('latency', self.extract_publisher_timestamp_simple, budget_ms=5)
+        if self.display_mode in ("display", "save"):
+            self.pipeline.register('overlay', self.add_receiver_overlay, budget_ms=5)
+        if self.display_mode == "display":
+            self.pipeline.register('display', self.queue_display, budget_ms=1, source='overlay')
+        elif self.display_mode == "save":
+            # Gaps in a recording are worse than a late one: never shed, and queue more
+            self.pipeline.register('recording', self.record_frame, budget_ms=20, optional=False, source='overlay',
+                                   queue_size=8)
+
     def process_frame(self, frame):
-        """Process each received frame"""
+        """Receive-loop work on each frame: count it and hand it to the stages"""
+        started = time.perf_counter()
         self.frame_count += 1
-        
-        # Extract latency information
-        self.extract_publisher_timestamp_simple(frame)
-        
-        # Add receiver overlay
-        frame_with_overlay = self.add_receiver_overlay(frame)
+        received = time.monotonic()
+        interval = received - self.last_frame_time
+        self.last_frame_time = received
         
         # Calculate FPS
         self.calculate_fps()
         
-        # Handle different display modes
-        if self.display_mode == "display":
-            # Show frame (only if display is available)
-            try:
-                cv2.imshow('Zero Latency Receiver', frame_with_overlay)
-                key = cv2.waitKey(1) & 0xFF
-                if key == ord('q'):
-                    ZeroLatencyReceiver.log("User pressed 'q', stopping...")
-                    return False
-            except cv2.error:
-                # No display available, switch to headless mode
-                ZeroLatencyReceiver.log("No display available, switching to headless mode")
-                self.display_mode = "headless"
-                
-        elif self.display_mode == "save" and self.video_writer:
-            # Save frame to video file
-            self.video_writer.write(frame_with_overlay)
+        self.pipeline.submit(self.frame_count, frame, FrameInfo(self.frame_count, received, interval))
             
-        # In headless mode, just log progress occasionally
-        if self.display_mode == "headless" and self.frame_count % 150 == 0:  # Every 5 seconds at 30fps
-            ZeroLatencyReceiver.log(f"Processed {self.frame_count} frames, FPS: {self.current_fps:.1f}, Latency: {self.latency_ms:.1f}ms")
-            
-        return True
+        if self.frame_count % 150 == 0:  # Every 5 seconds at 30fps
+            # In headless mode, just log progress occasionally
+            if self.display_mode == "headless":
+                ZeroLatencyReceiver.log(f"Processed {self.frame_count} frames, FPS: {self.current_fps:.1f}, Latency: {self.latency_ms:.1f}ms")
+            ZeroLatencyReceiver.log(f"Stages: {self.pipeline.summary()}")
+
+        self.pipeline.record_core(time.perf_counter() - started)
+        return self.running
         
     def start(self):
         """Start the receiver"""
@@ -296,9 +346,12 @@ class ZeroLatencyReceiver:
         ZeroLatencyReceiver.log("Receiver started")
         ZeroLatencyReceiver.log(f"Display mode: {self.display_mode}")
         ZeroLatencyReceiver.log(f"Receiving from: {self.rtsp_url}")
-        
-        # Initialize video writer if needed
-        first_frame = True
+
+        self.setup_stages()
+        self.pipeline.start()
+        if self.metrics:
+            self.metrics.start()
+            ZeroLatencyReceiver.log(f"Reporting metrics to: {self.metrics.url.geturl()}")
         
         try:
             while self.running:
@@ -309,15 +362,12 @@ class ZeroLatencyReceiver:
                     time.sleep(0.1)
                     continue
                 
-                # Setup video writer on first frame
-                if first_frame and self.display_mode == "save":
-                    height, width = frame.shape[:2]
-                    self.setup_video_writer(width, height)
-                    first_frame = False
-                
                 # Process frame
                 if not self.process_frame(frame):
                     break
+                # Outside process_frame, so window updates do not count against the core budget
+                if not self.show_frame():
+                    break
                     
         except KeyboardInterrupt:
             ZeroLatencyReceiver.log("Interrupted by user")
@@ -332,6 +382,12 @@ class ZeroLatencyReceiver:
             return
             
         self.running = False
+
+        # Let the stages finish their queued frames before the writer and window go away
+        self.pipeline.stop()
+
+        if self.metrics:
+            self.metrics.stop()
         
         if self.cap:
             self.cap.release()
@@ -345,6 +401,7 @@ class ZeroLatencyReceiver:
             cv2.destroyAllWindows()
             
         ZeroLatencyReceiver.log(f"Stopped. Total frames processed: {self.frame_count}")
+        ZeroLatencyReceiver.log(f"Stages: {self.pipeline.summary()}")
 
 def main():
     parser = argparse.ArgumentParser(description='Zero Latency RTSP Receiver with IP Auto-Detection')
@@ -355,6 +412,12 @@ def main():
                        choices=['headless', 'display', 'save'],
                        default='headless',
                        help='Display mode: headless (no display), display (show window), save (save to file)')
+    parser.add_argument('--metrics-url',
+                       default=f'http://{NetworkConfig.PI_VPN_IP}:{NetworkConfig.WEBSOCKET_PORT}/api/metrics/receiver/',
+                       help='Django endpoint receiving batched FPS and latency samples')
+    parser.add_argument('--no-metrics',
+                       action='store_true',
+                       help='Do not report metrics to the server')
     parser.add_argument('--test-connection', '-t',
                        action='store_true',
                        help='Test connection to auto-detected IP and exit')
@@ -388,7 +451,8 @@ def main():
             print("Warning: No DISPLAY environment variable found. Switching to headless mode.")
             args.display_mode = 'headless'
     
-    receiver = ZeroLatencyReceiver(rtsp_url=args.rtsp_url, display_mode=args.display_mode)
+    receiver = ZeroLatencyReceiver(rtsp_url=args.rtsp_url, display_mode=args.display_mode,
+                                   metrics_url=None if args.no_metrics else args.metrics_url)
     receiver.start()
 
 if __name__ == "__main__":